@@ -40,13 +40,23 @@ logger = logging.getLogger('gecosws-config-assistant')
 
 from firstboot import serverconf
 from firstboot_lib.firstbootconfig import get_version
-from firstboot_lib import Window, firstbootconfig, FirstbootEntry
+from firstboot_lib import Window, firstbootconfig, FirstbootEntry, TaskExecutor
 import pages
 import dbus
 from dbus.mainloop.glib import DBusGMainLoop
 
 
 __DESKTOP_FILE__ = '/etc/xdg/autostart/gecos-config-assistant.desktop'
+# Seconds without output from chef-solo before warning the user.
+__CHEF_IDLE_WARNING__ = 60
+# Index page of every section of the configuration.
+__SECTION_PAGES__ = {
+    'ntp': 'dateSync',
+    'chef': 'linkToChef',
+    'gcc': 'linkToChef',
+    'auth': 'linkToServer',
+    'users': 'localUsers',
+}
 
 NM_DBUS_SERVICE = 'org.freedesktop.NetworkManager'
 NM_DBUS_OBJECT_PATH = '/org/freedesktop/NetworkManager'
@@ -72,7 +82,7 @@ class FirstbootWindow(Window):
     def finish_initializing(self, builder, options=None):   # pylint: disable=E1002
         """Set up the main window"""
         super(FirstbootWindow, self).finish_initializing(builder)
-#        self.connect("delete_event", self.on_delete_event)
+        self.connect("delete_event", self.on_delete_event)
 
         screen = Gdk.Screen.get_default()
         sw = math.floor(screen.width() - screen.width() / 6)
@@ -94,11 +104,19 @@ class FirstbootWindow(Window):
         self.pages = {}
         self.buttons = {}
         self.current_page = None
+        self.busy_state = None
+        self.busy_count = 0
         self.is_last_page = False
         self.fully_configured = False
+        self.closing = False
 
         self.translate()
         self.build_index()
+        self.build_chef_progress()
+        serverconf.add_chef_progress_listener(self.on_chef_progress)
+        self.journal = serverconf.get_server_conf(None).get_journal()
+        self.journal.subscribe(self.on_conf_changed)
+        self.update_pending()
 
         first_page = self.pages[pages.pages[0]]
         self.set_current_page(first_page['module'])
@@ -131,11 +149,38 @@ class FirstbootWindow(Window):
 
 
     def on_btnClose_Clicked(self, button):
-        self.destroy()
+        self.close_window()
+
+    def on_destroy(self, widget, data=None):
+        self.journal.unsubscribe(self.on_conf_changed)
+        serverconf.cancel_chef_solo()
+        super(FirstbootWindow, self).on_destroy(widget, data)
+
+    def on_delete_event(self, widget, data=None):
+        # The window is destroyed by close_window when it's done.
+        self.close_window()
+        return True
+
+    def close_window(self):
+        ''' Destroys the window, once the unlink operations that were
+        not applied are run if the user wants to.
+        '''
+        if self.closing:
+            return
+        if serverconf.get_chef_plan().is_empty() or not serverconf.message_box(_('Close'),
+                _('Some unlink operations were not applied yet. Apply them before closing?')):
+            self.destroy()
+            return
+        self.closing = True
+        self.run_task(serverconf.commit_chef_plan, (), self.on_close_commit_done,
+                      own_thread=True)
+
+    def on_close_commit_done(self, task):
+        self.closing = False
+        # The errors were already shown, the user can try again.
+        if task.exception() is None and task.result():
+            self.destroy()
 
-#    def on_delete_event(self, widget, data=None):
-#        return self.confirm_exit()
-#
     def confirm_exit(self):
 
         if self.fully_configured == True:
@@ -168,20 +213,208 @@ class FirstbootWindow(Window):
     def on_btnUpdate_Clicked(self, button):
         result = serverconf.message_box(_("Update GECOS Config Assistant"), _("Are you sure you want to update the GECOS Config Assistant?"))
         if result == 1:
-            retval = os.system("apt-get update && apt-get install gecosws-config-assistant --yes --force-yes")
-            if retval != 0:
-                serverconf.display_errors(_("Update Error"),[_("An error occurred during the upgrade")])
-            else:
-                serverconf.message_box(_("Update GECOS Config Assistant"), _("GECOS Config Assistant has been udpated. Please restart GCA"))
+            self.run_task(os.system, ("apt-get update && apt-get install gecosws-config-assistant --yes --force-yes",),
+                self.on_update_finished, own_thread=True)
+
+    def on_update_finished(self, task):
+        if task.exception() is not None or task.result() != 0:
+            serverconf.display_errors(_("Update Error"),[_("An error occurred during the upgrade")])
+        else:
+            serverconf.message_box(_("Update GECOS Config Assistant"), _("GECOS Config Assistant has been udpated. Please restart GCA"))
 
     def on_btnApply_Clicked(self, button):
-        self.current_page.next_page(self.set_current_page)
-        serverconf.apply_changes()
+        page = self.current_page
+        page.next_page(self.set_current_page)
+        force_full = self.cmd_options is not None and self.cmd_options.force_full
+        # A task of the window, it's not cancelled if the page is left.
+        self.run_task(self.plan_changes, (list(page.tasks), force_full),
+                      self.on_plan_done, own_thread=True)
+
+    def plan_changes(self, tasks, force_full):
+        ''' Waits for the tasks of the page, that store its values,
+        before planning them. Called out of the main loop.
+        '''
+        for task in tasks:
+            task.exception()
+        # Their callbacks were queued to the main loop before this one.
+        TaskExecutor.run_in_main_loop(lambda: None)
+        return serverconf.plan_changes(force_full)
+
+    def on_plan_done(self, task):
+        ''' Shows the changes the apply would make and applies them
+        if the user agrees.
+        '''
+        try:
+            (messages, changes) = task.result()
+        except Exception as e:
+            serverconf.display_errors(_('Configuration Error'), [str(e)])
+            return
+        if len(messages) > 0:
+            serverconf.display_errors(_('Configuration Error'), messages)
+            return
+        force_full = self.cmd_options is not None and self.cmd_options.force_full
+        if len(changes) == 0 and not force_full:
+            if not serverconf.message_box(_('Apply changes'),
+                    _('The system is already configured. Apply anyway?')):
+                return
+            force_full = True
+        elif len(changes) > 0 and not serverconf.confirm_changes(_('Apply changes'), changes):
+            return
+        self.run_task(serverconf.apply_changes, (force_full,), self.on_apply_done,
+                      own_thread=True)
+
+    def on_apply_done(self, task):
+        ''' Replaces the log tail with the summary of the chef-solo runs.
+        '''
+        messages = serverconf.get_chef_report_messages()
+        if len(messages) > 0:
+            self.chef_log.get_buffer().set_text(
+                '\n'.join([m['message'] for m in messages]))
+        self.update_pending()
+
+    def on_conf_changed(self, entry):
+        ''' Called from the thread that changed the configuration, only
+        the index button of the section is updated.
+        '''
+        if entry['section'] in __SECTION_PAGES__:
+            GObject.idle_add(self.update_pending, [entry['section']])
+
+    def update_pending(self, sections=None):
+        ''' Marks the index buttons of the sections with changes not
+        applied yet.
+        '''
+        if sections is None:
+            sections = __SECTION_PAGES__.keys()
+        dirty = self.journal.get_dirty()
+        for section in sections:
+            page_name = __SECTION_PAGES__[section]
+            if page_name not in self.buttons:
+                continue
+            pending = any(s in dirty for s, p in __SECTION_PAGES__.items() if p == page_name)
+            self.buttons[page_name].set_tooltip_text(
+                _('Changes pending to apply') if pending else None)
+        return False
+
+    def run_task(self, func, args=(), callback=None, own_thread=False):
+        ''' Runs func(*args) out of the main loop while the window
+        is busy. callback(task) is called from the main loop.
+        '''
+        def on_done(task):
+            self.set_busy(False)
+            if callback is not None:
+                callback(task)
+
+        self.set_busy(True)
+        task = self.submit_task(func, args, own_thread)
+        task.add_done_callback(on_done)
+        return task
+
+    def submit_task(self, func, args=(), own_thread=False):
+        ''' Submits func(*args) to the TaskExecutor, or runs it in a
+        thread of its own if it's long or waits for other tasks. It
+        runs in the ServerConf session of the caller, not in the
+        default one.
+        '''
+        if own_thread:
+            return TaskExecutor.spawn(serverconf.get_session().run, func, *args)
+        return TaskExecutor.submit(serverconf.get_session().run, func, *args)
+
+    def set_busy(self, busy):
+        ''' Shows a busy cursor and disables the navigation buttons
+        while a background task is running. The calls are counted,
+        the window is busy until every task called set_busy(False).
+        '''
+        buttons = [self.btnPrev, self.btnNext, self.btnApply, self.btnUpdate]
+        self.busy_count = max(0, self.busy_count + (1 if busy else -1))
+        if self.busy_count > 0:
+            if self.busy_state is None:
+                self.busy_state = [b.get_sensitive() for b in buttons]
+            for b in buttons:
+                b.set_sensitive(False)
+            cursor = Gdk.Cursor(Gdk.CursorType.WATCH)
+        else:
+            if self.busy_state is not None:
+                for b, sensitive in zip(buttons, self.busy_state):
+                    b.set_sensitive(sensitive)
+            self.busy_state = None
+            cursor = None
+        if self.get_window() is not None:
+            self.get_window().set_cursor(cursor)
+
+    def build_chef_progress(self):
+        ''' Progress bar and log tail shown while chef-solo runs.
+        '''
+        self.chef_progress = Gtk.ProgressBar()
+        self.chef_progress.set_show_text(True)
+        self.chef_progress.show()
+
+        self.chef_log = Gtk.TextView()
+        self.chef_log.set_editable(False)
+        self.chef_log.modify_font(Pango.FontDescription('monospace'))
+        self.chef_log.show()
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+        scroll.set_size_request(-1, 150)
+        scroll.add(self.chef_log)
+        scroll.show()
+        expander = Gtk.Expander(label=_('Details'))
+        expander.add(scroll)
+        expander.show()
+
+        self.chef_cancel = Gtk.Button(stock=Gtk.STOCK_CANCEL)
+        self.chef_cancel.connect('clicked', self.on_chef_cancel_clicked)
+        self.chef_cancel.show()
+        hbox = Gtk.HBox()
+        hbox.set_spacing(6)
+        hbox.pack_start(self.chef_progress, True, True, 0)
+        hbox.pack_start(self.chef_cancel, False, False, 0)
+        hbox.show()
+
+        self.chef_box = Gtk.VBox()
+        self.chef_box.pack_start(hbox, False, False, 0)
+        self.chef_box.pack_start(expander, False, False, 0)
+        self.ui.box1.pack_start(self.chef_box, False, False, 0)
+        self.ui.box1.reorder_child(self.chef_box, len(self.ui.box1.get_children()) - 2)
+
+    def on_chef_cancel_clicked(self, button):
+        if serverconf.message_box(_('Cancel'),
+                _('Are you sure you want to stop the configuration?')):
+            serverconf.cancel_chef_solo()
+
+    def on_chef_progress(self, progress):
+        self.chef_box.show()
+        self.chef_cancel.set_sensitive(not progress.finished)
+        fraction = progress.get_fraction()
+        if fraction is None:
+            self.chef_progress.pulse()
+        else:
+            self.chef_progress.set_fraction(fraction)
+
+        if progress.finished and progress.outcome == 'cancelled':
+            text = _('Configuration cancelled')
+        elif progress.finished and progress.outcome == 'timed out':
+            text = _('Configuration timed out')
+        elif progress.finished:
+            text = _('Configuration finished')
+        elif progress.resource is None:
+            text = _('Preparing the configuration')
+        else:
+            text = progress.resource
+        if progress.total:
+            text += '  %d/%d' % (min(progress.completed, progress.total), progress.total)
+        text += '  %ds' % (progress.get_elapsed(),)
+        idle = progress.get_idle()
+        if not progress.finished and idle >= __CHEF_IDLE_WARNING__:
+            text += '  ' + _('(no output for %d seconds)') % (idle,)
+        self.chef_progress.set_text(text)
+
+        if progress.tail is not None:
+            self.chef_log.get_buffer().set_text('\n'.join(progress.tail))
 
     def on_btnNext_Clicked(self, button):
         if self.is_last_page == True:
             #if not self.confirm_exit():
-            self.destroy()
+            self.close_window()
             return
         self.current_page.next_page(self.set_current_page)
 
@@ -246,6 +479,9 @@ class FirstbootWindow(Window):
 
     def set_current_page(self, module, params=None):
 
+        if self.current_page is not None:
+            self.current_page.cancel_tasks()
+
         self.ui.btnPrev.set_sensitive(True)
         self.ui.btnNext.set_sensitive(True)
         self.ui.btnUpdate.set_sensitive(True)
@@ -335,6 +571,20 @@ class FirstbootWindow(Window):
 
         self.emit('link-status', linked)
 
+        if linked:
+            self.start_prefetch()
+
+    def start_prefetch(self):
+        ''' Download the autoconf file and the GCC data while the user
+        is still on the first pages.
+        '''
+        url = None
+        if self.cmd_options is not None:
+            url = self.cmd_options.url
+        if url == None or len(url) == 0:
+            url = self.fbe.get_url()
+        serverconf.start_prefetch(url)
+
     def show_applications(self):
         pass
 
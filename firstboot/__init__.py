@@ -49,6 +49,10 @@ def parse_options():
         "-u", "--url", action="store", type="string", dest="url",
         help=_("Use this URL by default in the \"Link to Server\" page."))
 
+    parser.add_option(
+        "-f", "--force-full", action="store_true", dest="force_full", default=False,
+        help=_("Apply every setting, even those not changed since the last run"))
+
     (options, args) = parser.parse_args()
 
     set_up_logging(options)
@@ -72,6 +72,14 @@ class AutoConfigPage(PageWindow.PageWindow):
             self.ui.txtGCC.set_sensitive(False)
 #            content = serverconf.get_json_content()
             self.serverconf = serverconf.get_server_conf(None)
+            self.show_source()
+
+    def show_source(self):
+        source = serverconf.get_autoconf_source()
+        if source == serverconf.AutoConfCache.SOURCE_NETWORK:
+            self.set_status(0, _('The configuration file was downloaded from the Control Center.'))
+        elif source == serverconf.AutoConfCache.SOURCE_CACHE:
+            self.set_status(0, _('The configuration file has not changed, using the cached copy.'))
 
     def translate(self):
         desc = _('Parameters can be filled automatically if an autoconfiguration file is available in your GECOS Control Center')
@@ -108,13 +116,22 @@ class AutoConfigPage(PageWindow.PageWindow):
         if not serverconf.json_is_cached() or (serverconf.json_is_cached() and self.ui.chkAutoconf.get_active()):
            url = self.ui.txtGCC.get_text()
            if url != '' and url != None:
-               try:
-                   json = serverconf.get_json_autoconf(url)
-#                   content = serverconf.get_json_content()
-                   self.serverconf = serverconf.get_server_conf(json)
-
-               except Exception as e:
-                    self.set_status(1, str(e))
-                    return
-        
+               self.set_status(None)
+               self.run_task(serverconf.get_json_autoconf, (url,),
+                   lambda task: self.on_autoconf_downloaded(task, load_page_callback))
+               return
+
+        load_page_callback(firstboot.pages.dateSync)
+
+    def on_autoconf_downloaded(self, task, load_page_callback):
+        try:
+            json = task.result()
+#            content = serverconf.get_json_content()
+            self.serverconf = serverconf.get_server_conf(json)
+            self.show_source()
+
+        except Exception as e:
+            self.set_status(1, str(e))
+            return
+
         load_page_callback(firstboot.pages.dateSync)
@@ -30,7 +30,6 @@ from firstboot import serverconf
 import firstboot.validation as validation
 
 from gi.repository import Gtk
-import requests
 import hashlib
 import gettext
 from gettext import gettext as _
@@ -90,35 +89,17 @@ class LinkToChefConfEditorPage(PageWindow.PageWindow):
             self.interfaces = interface.localifs()
             self.interfaces.reverse()
             if len(self.gcc_conf.get_ou_username()) >= 2:
-                result = serverconf.select_ou(_('Select OU'), _('Select the OU to link into GCC Ui'), self.gcc_conf.get_ou_username()) 
+                ou_index = serverconf.get_node_index(self.gcc_conf.get_uri_gcc(),
+                    self.gcc_conf.get_gcc_username())
+                ou_index.update_ous(self.gcc_conf.get_ou_username())
+                result = serverconf.select_ou(_('Select OU'), _('Select the OU to link into GCC Ui'), self.gcc_conf.get_ou_username(),
+                    ou_index.search_ous)
                 self.gcc_conf.set_selected_ou(result)
             elif len(self.gcc_conf.get_ou_username()) == 1:
                 self.gcc_conf.set_selected_ou(self.gcc_conf.get_ou_username()[0][0])
             for inter in self.interfaces:
                 if not inter[1].startswith('127.0'):
                     break
-            if not serverconf.json_is_cached():
-                result = serverconf.url_chef(_('Url Chef Certificate Required'), _('You need to enter url with certificate file\n in protocol://domain/resource format'))
-                try:
-                    res = requests.get(result)
-                    if not res.ok:
-                        raise serverconf.LinkToChefException(_("Can not download pem file"))
-                    if hasattr(res,'text'):
-                        pem = res.text
-                    else:
-                        pem = res.content
-                    self.chef_conf.set_pem(pem.encode('base64'))
-                    self.chef_conf.set_url(self.gcc_conf.get_uri_gcc())
-                    self.chef_conf.set_admin_name(self.gcc_conf.get_gcc_username())
-
-                    #result = serverconf.entry_ou(_('Select OU'),_('Enter the correct OU to link into GCC Ui'))
-                    result = ''
-                    #if result:
-                    self.gcc_conf.set_selected_ou(result)
-                    #else:
-                    #    raise serverconf.LinkToChefException(_("You need enter a OU"))
-                except Exception as e:
-                    self.show_status(__STATUS_ERROR__, e)
 
             mac = interface.getHwAddr(inter[0])
             node_name = hashlib.md5(mac.encode()).hexdigest()
@@ -126,54 +107,69 @@ class LinkToChefConfEditorPage(PageWindow.PageWindow):
             self.chef_conf.set_node_name(node_name)
             self.chef_conf.set_chef_link(True)
             self.chef_conf.set_chef_link_existing(False)
-            result, messages = self.validate_conf()
-            load_page_callback(LinkToChefResultsPage, {
-                'result': result,
-                'messages': messages
-             })
+            self.download_pem(load_page_callback)
         else:
-            result = None
-            try:
-                hostnames = serverconf.get_hostnames(self.gcc_conf.get_uri_gcc(), self.gcc_conf.get_gcc_username(), self.gcc_conf.get_gcc_pwd_user())
-                result = serverconf.select_node(_('Select Workstation'), _('Select a workstation to link'), hostnames)
-                if result == None:
-                    raise serverconf.LinkToChefException(_("You need selected a workstation"))
-            except Exception as e:
-                self.show_status(__STATUS_ERROR__, e)
-            self.gcc_conf.set_run(False)
-            self.chef_conf.set_node_name(result)
-            self.gcc_conf.set_gcc_nodename(result)
-            self.chef_conf.set_chef_link_existing(True)
-            self.chef_conf.set_chef_link(True)
-
-            if not serverconf.json_is_cached():
-                result = serverconf.url_chef(_('Url Chef Certificate Required'), _('You need to enter url with certificate file\n in protocol://domain/resource format'))
-                try:
-                    res = requests.get(result)
-                    if not res.ok:
-                        raise serverconf.LinkToChefException(_("Can not download pem file"))
-                    if hasattr(res,'text'):
-                        pem = res.text
-                    else:
-                        pem = res.content
-                    self.chef_conf.set_pem(pem.encode('base64'))
-                    self.chef_conf.set_url(self.gcc_conf.get_uri_gcc())
-                    self.chef_conf.set_admin_name(self.gcc_conf.get_gcc_username())
-
-                    #result = serverconf.entry_ou(_('Select OU'),_('Enter the correct OU to link into GCC Ui'))
-                    result = ''
-                    #if result:
-                    self.gcc_conf.set_selected_ou(result)
-                    #else:
-                    #    raise serverconf.LinkToChefException(_("You need enter a OU"))
-                except Exception as e:
-                    self.show_status(__STATUS_ERROR__, e)
-
-            result, messages = self.validate_conf()
-            load_page_callback(LinkToChefResultsPage, {
-                'result': result,
-                'messages': messages
-             })
+            self.show_status(__STATUS_CONNECTING__)
+            self.run_task(serverconf.search_hostnames,
+                (self.gcc_conf.get_uri_gcc(), self.gcc_conf.get_gcc_username(), self.gcc_conf.get_gcc_pwd_user()),
+                lambda task: self.on_hostnames_downloaded(task, load_page_callback))
+
+    def on_hostnames_downloaded(self, task, load_page_callback):
+        result = None
+        try:
+            hostnames = task.result()
+            self.show_status()
+            result = serverconf.select_node(_('Select Workstation'), _('Select a workstation to link'), hostnames,
+                self.search_hostnames)
+            if result == None:
+                raise serverconf.LinkToChefException(_("You need selected a workstation"))
+        except Exception as e:
+            self.show_status(__STATUS_ERROR__, e)
+            return
+        self.gcc_conf.set_run(False)
+        self.chef_conf.set_node_name(result)
+        self.gcc_conf.set_gcc_nodename(result)
+        self.chef_conf.set_chef_link_existing(True)
+        self.chef_conf.set_chef_link(True)
+        self.download_pem(load_page_callback)
+
+    def search_hostnames(self, prefix):
+        return serverconf.search_hostnames(self.gcc_conf.get_uri_gcc(),
+            self.gcc_conf.get_gcc_username(), self.gcc_conf.get_gcc_pwd_user(), prefix)
+
+    def download_pem(self, load_page_callback):
+        if serverconf.json_is_cached():
+            self.show_results(load_page_callback)
+            return
+        url = serverconf.url_chef(_('Url Chef Certificate Required'), _('You need to enter url with certificate file\n in protocol://domain/resource format'))
+        self.show_status(__STATUS_CONNECTING__)
+        self.run_task(serverconf.download_pem, (url,),
+            lambda task: self.on_pem_downloaded(task, load_page_callback))
+
+    def on_pem_downloaded(self, task, load_page_callback):
+        try:
+            pem = task.result()
+            self.show_status()
+            self.chef_conf.set_pem(pem.encode('base64'))
+            self.chef_conf.set_url(self.gcc_conf.get_uri_gcc())
+            self.chef_conf.set_admin_name(self.gcc_conf.get_gcc_username())
+
+            #result = serverconf.entry_ou(_('Select OU'),_('Enter the correct OU to link into GCC Ui'))
+            result = ''
+            #if result:
+            self.gcc_conf.set_selected_ou(result)
+            #else:
+            #    raise serverconf.LinkToChefException(_("You need enter a OU"))
+        except Exception as e:
+            self.show_status(__STATUS_ERROR__, e)
+        self.show_results(load_page_callback)
+
+    def show_results(self, load_page_callback):
+        result, messages = self.validate_conf()
+        load_page_callback(LinkToChefResultsPage, {
+            'result': result,
+            'messages': messages
+         })
 
     def validate_conf(self):
 
@@ -26,11 +26,10 @@ from gi.repository import Gtk
 
 import firstboot.pages
 import LinkToChefConfEditorPage
+import LinkToChefResultsPage
 from firstboot_lib import PageWindow
 from firstboot import serverconf
-from firstboot.serverconf import GCCConf, ChefConf
 
-import requests
 import json
 import gettext
 from gettext import gettext as _
@@ -134,56 +133,64 @@ easily managed remotely.\n\n')
                 load_page_callback(LinkToChefConfEditorPage)
 
             elif self.ui.chkUnlinkChef.get_active():
-                server_conf = serverconf.get_server_conf(None)
-                ## TODO Implement unlink GCC an Chef into serverconf Class
-                gcc_flag = open(__GCC_FLAG__, 'r')
-                content = gcc_flag.read()
-                gcc_flag.close()
-                gcc_flag_json = json.loads(content)
-                server_conf.get_gcc_conf().set_uri_gcc(gcc_flag_json['uri_gcc'])
-                server_conf.get_gcc_conf().set_gcc_nodename(gcc_flag_json['gcc_nodename'])
-                server_conf.get_gcc_conf().set_gcc_link(False)
-                server_conf.get_gcc_conf().set_run(True)
-                json_server = serverconf.validate_credentials(gcc_flag_json['uri_gcc']+'/auth/config/')
-                json_server = json.loads(json_server)
-                pem = json_server['chef']['chef_validation']
-                server_conf.get_gcc_conf().set_gcc_username(json_server['gcc']['gcc_username'])
-                serverconf.create_pem(pem)
- 
-                chef_flag = open(__CHEF_FLAG__, 'r')
-                content = chef_flag.read()
-                chef_flag.close()
-                chef_flag_json = json.loads(content)
-                server_conf.get_chef_conf().set_url(chef_flag_json['chef_server_url'])
-                server_conf.get_chef_conf().set_node_name(chef_flag_json['chef_node_name'])
-                server_conf.get_chef_conf().set_admin_name(json_server['gcc']['gcc_username'])
-                server_conf.get_chef_conf().set_chef_link(False)
-                password = serverconf.ACTUAL_USER[1]
-                if password == None:
-                   raise Exception(_('Error in user and password'))
-                messages = []
-                messages += serverconf.unlink_from_gcc(password)
-                messages += serverconf.unlink_from_chef()
-                result = len(messages) == 0
-                if result:
-                    content = serverconf.get_json_content()
-                    if content != None:
-                        gcc_conf_cached = GCCConf.GCCConf()
-                        gcc_conf_cached.load_data(content['gcc'])
-                        chef_conf_cached = ChefConf.ChefConf()
-                        chef_conf_cached.load_data(content['chef'])
-                        server_conf.set_chef_conf(chef_conf_cached)
-                        server_conf.set_gcc_conf(gcc_conf_cached)
-                    else:
-                        server_conf.set_chef_conf(ChefConf.ChefConf())
-                        server_conf.set_gcc_conf(GCCConf.GCCConf())
-                load_page_callback(LinkToChefResultsPage, {
-                    'result': True,
-                    'messages': messages
-                })
+                self.show_status(__STATUS_CONNECTING__)
+                self.run_task(self.unlink, (),
+                    lambda task: self.on_unlinked(task, load_page_callback))
 
         except serverconf.ServerConfException as e:
             self.show_status(__STATUS_ERROR__, e)
 
         except Exception as e:
             self.show_status(__STATUS_ERROR__, e)
+
+    def unlink(self):
+        server_conf = serverconf.get_server_conf(None)
+        ## TODO Implement unlink GCC an Chef into serverconf Class
+        gcc_flag = open(__GCC_FLAG__, 'r')
+        content = gcc_flag.read()
+        gcc_flag.close()
+        gcc_flag_json = json.loads(content)
+        json_server = serverconf.validate_credentials(gcc_flag_json['uri_gcc']+'/auth/config/')
+        json_server = json.loads(json_server)
+        pem = json_server['chef']['chef_validation']
+        serverconf.create_pem(pem)
+
+        chef_flag = open(__CHEF_FLAG__, 'r')
+        content = chef_flag.read()
+        chef_flag.close()
+        chef_flag_json = json.loads(content)
+        user, password = serverconf.get_credential_resolver().get_credentials(gcc_flag_json['uri_gcc'])
+        if password == None:
+            raise Exception(_('Error in user and password'))
+        # The copies taken meanwhile see all the changes or none.
+        with server_conf.lock():
+            server_conf.get_gcc_conf().set_uri_gcc(gcc_flag_json['uri_gcc'])
+            server_conf.get_gcc_conf().set_gcc_nodename(gcc_flag_json['gcc_nodename'])
+            server_conf.get_gcc_conf().set_gcc_link(False)
+            server_conf.get_gcc_conf().set_run(True)
+            server_conf.get_gcc_conf().set_gcc_username(json_server['gcc']['gcc_username'])
+            server_conf.get_chef_conf().set_url(chef_flag_json['chef_server_url'])
+            server_conf.get_chef_conf().set_node_name(chef_flag_json['chef_node_name'])
+            server_conf.get_chef_conf().set_admin_name(json_server['gcc']['gcc_username'])
+            server_conf.get_chef_conf().set_chef_link(False)
+            messages = []
+            # chef-solo will run along with the next apply.
+            plan = serverconf.get_chef_plan()
+            messages += serverconf.unlink_from_gcc(password, plan)
+            messages += serverconf.unlink_from_chef(plan)
+            result = len(messages) == 0
+            if result:
+                server_conf.restore_snapshot(server_conf.AUTOCONF, ['chef', 'gcc'])
+        return messages
+
+    def on_unlinked(self, task, load_page_callback):
+        try:
+            messages = task.result()
+        except Exception as e:
+            self.show_status(__STATUS_ERROR__, e)
+            return
+        load_page_callback(LinkToChefResultsPage, {
+            'result': True,
+            'pending': not serverconf.get_chef_plan().is_empty(),
+            'messages': messages
+        })
@@ -22,6 +22,7 @@ __license__ = "GPL-2"
 
 
 from gi.repository import Gtk
+from firstboot import serverconf
 
 import firstboot.pages
 from firstboot_lib import PageWindow
@@ -45,6 +46,7 @@ class LinkToServerResultsPage(PageWindow.PageWindow):
 
     def finish_initializing(self):
         self.result = False
+        self.pending = False
 
     def translate(self):
         self.ui.lblDescription.set_text('')
@@ -53,17 +55,30 @@ class LinkToServerResultsPage(PageWindow.PageWindow):
 
         if 'result' in params:
             self.result = params['result']
+        # The unlink is run by chef-solo along with the next apply.
+        self.pending = params.get('pending', False)
 
+        messages = []
         if 'messages' in params:
-            for m in params['messages']:
-                if m['type'] == 'error':
-                    icon = Gtk.STOCK_DIALOG_ERROR
-                else:
-                    icon = Gtk.STOCK_YES
-                box = self.new_message(m['message'], icon)
-                self.ui.boxMessageContainer.pack_start(box, False, False, 0)
-
-        if self.result == True:
+            messages += params['messages'] or []
+        # Summary of the chef-solo runs that gave this result, if any,
+        # not of whatever ran before.
+        messages += serverconf.get_chef_report_messages(params.get('reports', []))
+        for m in messages:
+            if m['type'] == 'error':
+                icon = Gtk.STOCK_DIALOG_ERROR
+            elif m['type'] == 'info':
+                icon = Gtk.STOCK_DIALOG_INFO
+            else:
+                icon = Gtk.STOCK_YES
+            box = self.new_message(m['message'], icon)
+            self.ui.boxMessageContainer.pack_start(box, False, False, 0)
+
+        if self.result == True and self.pending:
+            self.ui.lblDescription.set_text(_('The changes will be made \
+when you apply the configuration.'))
+
+        elif self.result == True:
             self.ui.lblDescription.set_text(_('The configuration was \
 updated successfully.'))
             self.emit('status-changed', 'linkToServer', True)
@@ -26,6 +26,7 @@ from gi.repository import Gtk
 
 import firstboot.pages
 import LinkToServerConfEditorPage
+import LinkToServerResultsPage
 from firstboot_lib import PageWindow
 from firstboot import serverconf
 from firstboot.serverconf import AuthConf
@@ -156,36 +157,9 @@ class LinkToServerPage(PageWindow.PageWindow):
 
     def next_page(self, load_page_callback):
         if self.unlink_ldap == True or self.unlink_ad == True:
-            messages = []
 # TODO Implements unlink from ldap or ad into serverconf class
-            if self.unlink_ldap:
-                messages += serverconf.unlink_from_sssd()
-            else:
-                messages += serverconf.unlink_from_sssd()
-            result = len(messages) == 0
-            if result:
-                server_conf = serverconf.get_server_conf(None)
-                auth_conf = server_conf.get_auth_conf()
-                content = serverconf.get_json_content()
-                if content != None:
-                    auth_conf_cached = AuthConf.AuthConf()
-                    auth_conf_cached.load_data(content['auth'])
-                    server_conf.set_auth_conf(auth_conf_cached)
-                else:
-                    server_conf.set_auth_conf(AuthConf.AuthConf())
-
-                if self.unlink_ldap:
-                    auth_conf.set_auth_type('ldap')
-                    #os.remove(__LDAP_FLAG__)
-                else:
-                    auth_conf.set_auth_type('ad')
-                    #os.remove(__AD_FLAG__)
-
-            auth_conf.set_auth_link(False)
-            load_page_callback(LinkToServerResultsPage, {
-                'result': True,
-                'messages': None
-            })
+            self.run_task(serverconf.unlink_from_sssd, (serverconf.get_chef_plan(),),
+                lambda task: self.on_unlinked(task, load_page_callback))
             return
         
         if self.ui.radioNone.get_active() or (self.ldap_is_configured or self.ad_is_configured):
@@ -212,3 +186,29 @@ class LinkToServerPage(PageWindow.PageWindow):
 
         except Exception as e:
             self.show_status(__STATUS_ERROR__, e)
+
+    def on_unlinked(self, task, load_page_callback):
+        try:
+            messages = task.result()
+        except Exception as e:
+            self.show_status(__STATUS_ERROR__, e)
+            return
+        result = len(messages) == 0
+        server_conf = serverconf.get_server_conf(None)
+        auth_conf = server_conf.get_auth_conf()
+        if result:
+            server_conf.restore_snapshot(server_conf.AUTOCONF, ['auth'])
+
+            if self.unlink_ldap:
+                auth_conf.set_auth_type('ldap')
+                #os.remove(__LDAP_FLAG__)
+            else:
+                auth_conf.set_auth_type('ad')
+                #os.remove(__AD_FLAG__)
+
+        auth_conf.set_auth_link(False)
+        load_page_callback(LinkToServerResultsPage, {
+            'result': True,
+            'pending': not serverconf.get_chef_plan().is_empty(),
+            'messages': None
+        })
@@ -0,0 +1,168 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class AppliedState():
+    """
+    Fingerprints of the gecos_ws_mgmt resources applied by the last
+    successful chef-solo runs, stored in `path`.
+
+    A fingerprint is the hash of the resource attributes. Local files
+    referenced by the attributes (file:// URLs and the validation PEM)
+    are hashed by content, since their paths change on every run. The
+    dry runs, which don't write the files, give the hash_content() of
+    what they would write instead, so both fingerprint the same.
+    """
+
+    ROOT = 'gecos_ws_mgmt'
+
+    # Attributes holding the path of a local file.
+    FILE_ATTRIBUTES = ['chef_validation_pem']
+    CONTENT_PREFIX = 'sha256:'
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._fingerprints = None
+
+    def _load(self):
+        if self._fingerprints is not None:
+            return self._fingerprints
+        self._fingerprints = {}
+        if os.path.exists(self._path):
+            try:
+                fp = open(self._path, 'r')
+                self._fingerprints = json.loads(fp.read())
+                fp.close()
+            except (IOError, ValueError) as e:
+                logger.warning('Can not read %s: %s' % (self._path, e))
+        return self._fingerprints
+
+    def _save(self):
+        try:
+            state_dir = os.path.dirname(self._path)
+            if not os.path.exists(state_dir):
+                os.makedirs(state_dir)
+            (fd, tmppath) = tempfile.mkstemp(dir=state_dir)
+            fp = os.fdopen(fd, 'w')
+            fp.write(json.dumps(self._fingerprints, indent=2, sort_keys=True))
+            fp.close()
+            os.rename(tmppath, self._path)
+        except (IOError, OSError) as e:
+            # Without the record the next run will be a full one.
+            logger.warning('Can not write %s: %s' % (self._path, e))
+
+    def hash_content(self, content):
+        return self.CONTENT_PREFIX + hashlib.sha256(content).hexdigest()
+
+    def _hash_file(self, path):
+        try:
+            fp = open(path, 'rb')
+            content = fp.read()
+            fp.close()
+        except IOError:
+            return 'missing:' + path
+        return self.hash_content(content)
+
+    def _normalize(self, value, key=None):
+        if isinstance(value, dict):
+            return dict((k, self._normalize(v, k)) for k, v in value.items())
+        if isinstance(value, list):
+            return [self._normalize(v) for v in value]
+        if isinstance(value, basestring):
+            if value.startswith(self.CONTENT_PREFIX):
+                return value
+            if value.startswith('file://'):
+                return self._hash_file(value[len('file://'):])
+            if key in self.FILE_ATTRIBUTES:
+                return self._hash_file(value)
+        return value
+
+    def fingerprint(self, value):
+        data = json.dumps(self._normalize(value), sort_keys=True)
+        return hashlib.sha256(data).hexdigest()
+
+    def _iter_resources(self, json_solo):
+        for section, resources in json_solo.get(self.ROOT, {}).items():
+            for name, value in resources.items():
+                yield ('%s/%s' % (section, name), section, name, value)
+
+    def get_changed(self, json_solo):
+        """
+        Returns the keys ("section/resource") of the resources of
+        json_solo that differ from the last applied ones.
+        """
+        with self._lock:
+            fingerprints = self._load()
+            return [key for key, section, name, value in self._iter_resources(json_solo)
+                    if fingerprints.get(key) != self.fingerprint(value)]
+
+    def filter(self, json_solo):
+        """
+        Returns a copy of json_solo without the resources that were
+        already applied.
+        """
+        changed = self.get_changed(json_solo)
+        result = copy.deepcopy(json_solo)
+        for key, section, name, value in self._iter_resources(json_solo):
+            if key not in changed:
+                del result[self.ROOT][section][name]
+        return result
+
+    def has_resources(self, json_solo):
+        return any(True for resource in self._iter_resources(json_solo))
+
+    def record(self, json_solo):
+        """
+        Records the resources of json_solo as applied.
+        """
+        with self._lock:
+            fingerprints = self._load()
+            for key, section, name, value in self._iter_resources(json_solo):
+                fingerprints[key] = self.fingerprint(value)
+            self._save()
+
+    def forget(self, json_solo):
+        """
+        Forgets the resources of json_solo, so they are applied again
+        by the next run.
+        """
+        with self._lock:
+            fingerprints = self._load()
+            for key, section, name, value in self._iter_resources(json_solo):
+                fingerprints.pop(key, None)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._fingerprints = {}
+            self._save()
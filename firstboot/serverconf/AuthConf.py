@@ -21,61 +21,49 @@ __copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING, RAW, RECORD
 from LdapConf import LdapConf
 from ActiveDirectoryConf import ActiveDirectoryConf
-from LdapConf import LdapConf
-
-class AuthConf():
-
-    def __init__(self):
-        self._data = {}
-        self._data['auth_type'] = ''
-        self._data['auth_properties'] = ''
-        self._data['auth_link'] = True
-        self._ad_conf = ActiveDirectoryConf()
-        self._ldap_conf = LdapConf()
 
-    def load_data(self, conf):
-        msg = 'ServerConf: Key "%s" not found in the configuration file.'
-        try:
-            self.set_auth_type(conf['auth_type'].lower())
-        except KeyError as e:
-            print msg % ('auth_type',)
-        try:
-            if conf['auth_type'].lower() == 'ldap':
-                self._ldap_conf.load_data(conf['auth_properties'])
-            else:
-                self._ad_conf.load_data(conf['auth_properties'])
+class AuthConf(ConfRecord):
 
-        except KeyError as e:
-            print msg % ('auth_properties',)
+    FIELDS = (
+        ('auth_type', STRING, ''),
+        ('auth_properties', RAW, ''),
+        ('auth_link', RAW, True),
+        ('ad_conf', RECORD, ActiveDirectoryConf),
+        ('ldap_conf', RECORD, LdapConf),
+    )
 
     def validate(self):
-        valid = validation.is_auth_type(self._data['auth_type']) 
+        valid = validation.is_auth_type(self._auth_type) 
         valid_prop = False
-        if self._data['auth_type'].lower() == 'ldap':
+        if self._auth_type.lower() == 'ldap':
             valid_prop = self._ldap_conf.validate()
         else:
             valid_prop = self._ad_conf.validate()
         return valid and valid_prop
 
     def get_auth_type(self):
-        return self._data['auth_type'].encode('utf-8')
+        return self._auth_type
 
     def set_auth_type(self, auth_type):
-        self._data['auth_type'] = auth_type
-        return self
+        return self._set('auth_type', auth_type)
 
     def set_auth_link(self, auth_link):
-        self._data['auth_link'] = auth_link
-        return self
+        return self._set('auth_link', auth_link)
 
     def get_auth_link(self):
-        return self._data['auth_link']
+        return self._auth_link
+
+    def get_ldap_conf(self):
+        return self._ldap_conf
+
+    def get_ad_conf(self):
+        return self._ad_conf
 
     def get_auth_properties(self):
-        if self._data['auth_type'] == 'ldap':
+        if self._auth_type == 'ldap':
             return self._ldap_conf
         else:
             return self._ad_conf
-
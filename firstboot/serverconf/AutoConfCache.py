@@ -0,0 +1,143 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+
+
+class AutoConfCache():
+    """
+    On-disk cache of the autoconfiguration document.
+
+    The body is kept in `path` (so it can still be read by anybody
+    expecting the plain JSON file) and the HTTP validators, the source
+    URL and the SHA-256 of the body are kept in `path`.meta. The parsed
+    document is kept in memory while the file doesn't change.
+    """
+
+    SOURCE_NETWORK = 'network'
+    SOURCE_CACHE = 'cache'
+
+    def __init__(self, path):
+        self._path = path
+        self._meta_path = path + '.meta'
+        self._parsed = None
+        self._parsed_stat = None
+        self.last_source = None
+
+    def get_path(self):
+        return self._path
+
+    def exists(self):
+        return os.path.exists(self._path)
+
+    def clean(self):
+        for path in (self._path, self._meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._parsed = None
+        self._parsed_stat = None
+
+    def get_meta(self):
+        if not os.path.exists(self._meta_path):
+            return {}
+        try:
+            fp = open(self._meta_path, 'r')
+            meta = json.loads(fp.read())
+            fp.close()
+            return meta
+        except (IOError, ValueError):
+            return {}
+
+    def get_validators(self, url):
+        """
+        Returns the conditional request headers for url, or an empty
+        dict if the cached document didn't come from that URL.
+        """
+        headers = {}
+        meta = self.get_meta()
+        if not self.exists() or meta.get('url') != url:
+            return headers
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def _write(self, path, content):
+        (fd, tmppath) = tempfile.mkstemp(dir=os.path.dirname(path))
+        fp = os.fdopen(fd, 'wb')
+        fp.write(content)
+        fp.close()
+        os.rename(tmppath, path)
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """
+        Stores a document downloaded from url. The body is only
+        rewritten when its content changed.
+        """
+        sha = hashlib.sha256(content).hexdigest()
+        meta = self.get_meta()
+        if not self.exists() or meta.get('sha256') != sha:
+            self._write(self._path, content)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'sha256': sha
+        }
+        self._write(self._meta_path, json.dumps(meta))
+        self.last_source = self.SOURCE_NETWORK
+
+    def store_from(self, other):
+        """
+        Stores the document cached in other, as not modified.
+        """
+        meta = other.get_meta()
+        fp = open(other.get_path(), 'rb')
+        content = fp.read()
+        fp.close()
+        self.store(meta.get('url'), content, meta.get('etag'), meta.get('last_modified'))
+        self.last_source = self.SOURCE_CACHE
+
+    def set_not_modified(self):
+        self.last_source = self.SOURCE_CACHE
+
+    def load(self):
+        """
+        Returns a copy of the parsed document, or None if there is not
+        any cached. The file is only parsed again if it changed on disk.
+        """
+        if not self.exists():
+            return None
+        st = os.stat(self._path)
+        stat = (st.st_mtime, st.st_size, st.st_ino)
+        if self._parsed is None or self._parsed_stat != stat:
+            fp = open(self._path, 'r')
+            content = fp.read()
+            fp.close()
+            self._parsed = json.loads(content)
+            self._parsed_stat = stat
+        return copy.deepcopy(self._parsed)
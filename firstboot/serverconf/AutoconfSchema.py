@@ -0,0 +1,239 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+
+# Kinds of error
+MISSING = 'missing'
+INVALID = 'invalid'
+UNKNOWN = 'unknown'
+
+TYPE_NAMES = {basestring: 'string', bool: 'boolean', list: 'array',
+              dict: 'object', int: 'integer', long: 'integer'}
+
+
+class Value():
+    """
+    A value of the document, given to setter of the target record, or
+    of the record returned by its getter. A value with no setter is
+    only checked. check(value) returns what is wrong with the value,
+    if anything.
+    """
+
+    def __init__(self, key, types, setter=None, convert=None, check=None,
+                 required=True, getter=None):
+        self.key = key
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.setter = setter
+        self.getter = getter
+        self.convert = convert
+        self.check = check
+        self.required = required
+
+
+class Section():
+    """
+    An object of the document. Its values are loaded into the record
+    returned by the getter of the target, or into the target itself.
+    """
+
+    def __init__(self, key, children, getter=None, required=True):
+        self.key = key
+        self.children = children
+        self.getter = getter
+        self.required = required
+
+
+class Choice():
+    """
+    An object of the document whose schema depends on the value of a
+    sibling: choices[convert(sibling)], or choices[None] if there is
+    no such choice.
+    """
+
+    def __init__(self, key, on, choices, convert=None, required=True):
+        self.key = key
+        self.on = on
+        self.choices = choices
+        self.convert = convert
+        self.required = required
+
+
+class AutoconfSchema():
+    """
+    Loader of the autoconf JSON compiled from its schema.
+
+    Every node of the schema is turned once into a function, so a
+    document is loaded in a single walk that sets the records and
+    collects what is wrong with it:
+
+        {'path': 'gcc.gcc_link', 'error': 'invalid',
+         'message': 'gcc.gcc_link: "yes" is not a boolean'}
+
+    Missing and invalid values are left as they were in the records.
+    Unknown keys are reported and ignored.
+    """
+
+    def __init__(self, schema):
+        self._load = self._compile(schema)
+
+    def load(self, document, target):
+        """
+        Loads document into target, a ServerConf, and returns the
+        list of errors found.
+        """
+        errors = []
+        self._load(document, target, '', errors, None)
+        return errors
+
+    def _compile(self, node):
+        if isinstance(node, Section):
+            return self._compile_section(node)
+        if isinstance(node, Choice):
+            return self._compile_choice(node)
+        return self._compile_value(node)
+
+    def _compile_value(self, node):
+        types = node.types
+        expected = ' or '.join(sorted(set(TYPE_NAMES[t] for t in types)))
+
+        def load(value, target, path, errors, parent):
+            if not isinstance(value, types):
+                _error(errors, path, INVALID, '%r is not a %s' % (value, expected))
+                return
+            if node.check is not None:
+                problem = node.check(value)
+                if problem:
+                    _error(errors, path, INVALID, problem)
+                    return
+            if node.convert is not None:
+                value = node.convert(value)
+            if node.getter is not None:
+                target = getattr(target, node.getter)()
+            if node.setter is not None:
+                getattr(target, node.setter)(value)
+        return load
+
+    def _compile_section(self, node):
+        children = [(child.key, child.required, self._compile(child))
+                    for child in node.children]
+        keys = set(child.key for child in node.children)
+
+        def load(value, target, path, errors, parent):
+            if not isinstance(value, dict):
+                _error(errors, path, INVALID, '%r is not an object' % (value,))
+                return
+            if node.getter is not None:
+                target = getattr(target, node.getter)()
+            prefix = path + '.' if path else ''
+            for key, required, load_child in children:
+                if key in value:
+                    load_child(value[key], target, prefix + key, errors, value)
+                elif required:
+                    _error(errors, prefix + key, MISSING, 'not found')
+            for key in sorted(set(value) - keys):
+                _error(errors, prefix + key, UNKNOWN, 'unknown key')
+        return load
+
+    def _compile_choice(self, node):
+        choices = dict((key, self._compile(choice))
+                       for key, choice in node.choices.items())
+
+        def load(value, target, path, errors, parent):
+            selected = parent.get(node.on)
+            if node.convert is not None and isinstance(selected, basestring):
+                selected = node.convert(selected)
+            load_choice = choices.get(selected, choices.get(None))
+            if load_choice is not None:
+                load_choice(value, target, path, errors, parent)
+        return load
+
+
+def _error(errors, path, error, message):
+    if path:
+        message = '%s: %s' % (path, message)
+    errors.append({'path': path, 'error': error, 'message': message})
+
+
+def _lower(value):
+    return value.lower()
+
+
+# Version of the autoconf JSON
+VERSION = '0.2.0'
+
+
+def _check_version(version):
+    if version != VERSION:
+        return 'version %s is not supported, %s expected' % (version, VERSION)
+
+
+LDAP_PROPERTIES = Section('auth_properties', [
+    Value('uri', basestring, 'set_url'),
+    Value('base', basestring, 'set_basedn'),
+    Value('basegroup', basestring, 'set_basedngroup'),
+    Value('binddn', basestring, 'set_binddn'),
+    Value('bindpwd', basestring, 'set_password'),
+], getter='get_ldap_conf')
+
+AD_PROPERTIES = Section('auth_properties', [
+    Value('specific_conf', bool, 'set_specific_conf'),
+    Choice('ad_properties', 'specific_conf', {
+        # The workstation joins the domain by itself.
+        None: Section('ad_properties', [
+            Value('fqdn', basestring, 'set_domain'),
+            Value('workgroup', basestring, 'set_workgroup'),
+        ], getter='get_ad_properties'),
+        # The configuration files are given, base64 encoded.
+        True: Section('ad_properties', [
+            Value('sssd_conf', basestring, 'set_sssd_conf'),
+            Value('krb5_conf', basestring, 'set_krb5_conf'),
+            Value('smb_conf', basestring, 'set_smb_conf'),
+            Value('pam_conf', basestring, 'set_pam_conf'),
+        ], getter='get_ad_properties'),
+    }),
+], getter='get_ad_conf')
+
+SCHEMA = Section(None, [
+    Value('version', basestring, check=_check_version),
+    Value('organization', basestring, 'set_organization'),
+    Value('uri_ntp', basestring, 'set_uri_ntp', getter='get_ntp_conf'),
+    Section('chef', [
+        Value('chef_server_uri', basestring, 'set_url'),
+        Value('chef_validation', basestring, 'set_pem'),
+        Value('chef_link', bool, 'set_chef_link', required=False),
+    ], getter='get_chef_conf'),
+    Section('gcc', [
+        Value('uri_gcc', basestring, 'set_uri_gcc'),
+        Value('gcc_username', basestring, 'set_gcc_username'),
+        Value('ou_username', (basestring, list), 'set_ou_username'),
+        Value('gcc_link', bool, 'set_gcc_link'),
+    ], getter='get_gcc_conf'),
+    Section('auth', [
+        Value('auth_type', basestring, 'set_auth_type', convert=_lower),
+        Choice('auth_properties', 'auth_type', {
+            'ldap': LDAP_PROPERTIES,
+            None: AD_PROPERTIES,
+        }, convert=_lower),
+    ], getter='get_auth_conf'),
+])
+
+AUTOCONF_LOADER = AutoconfSchema(SCHEMA)
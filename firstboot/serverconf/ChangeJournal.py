@@ -0,0 +1,135 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import collections
+import threading
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class ChangeJournal():
+    """
+    Journal of the changes made to the ServerConf sections.
+
+    Every change is an entry:
+
+        {'version': 12, 'section': 'gcc', 'field': 'uri_gcc',
+         'old': 'http://a/', 'new': 'http://b/'}
+
+    where version grows with every change. A changed section stays
+    dirty until clear_dirty() is called with its last version. The
+    subscribers of a section, or of all of them, are called with every
+    entry in the thread that made the change.
+
+    The records attached to the journal change their fields holding
+    writing(), so they can be copied from any thread.
+    """
+
+    ALL = None
+    MAX_ENTRIES = 1000
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._entries = collections.deque(maxlen=max_entries)
+        self._version = 0
+        # section -> version of its last change
+        self._versions = {}
+        # section -> version of its last change not applied
+        self._dirty = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._writing = threading.RLock()
+
+    def writing(self):
+        """
+        Lock held while the records attached to the journal change.
+        """
+        return self._writing
+
+    def record(self, section, field, old, new):
+        with self._lock:
+            self._version += 1
+            entry = {'version': self._version, 'section': section,
+                     'field': field, 'old': old, 'new': new}
+            self._entries.append(entry)
+            self._versions[section] = self._version
+            self._dirty[section] = self._version
+            callbacks = self._subscribers.get(section, []) + \
+                self._subscribers.get(self.ALL, [])
+        for callback in callbacks:
+            try:
+                callback(entry)
+            except Exception as e:
+                logger.exception(e)
+        return entry
+
+    def get_version(self, section=ALL):
+        """
+        Returns the version of the last change, of section or of any.
+        """
+        if section is self.ALL:
+            return self._version
+        return self._versions.get(section, 0)
+
+    def get_changes(self, since=0, section=ALL):
+        """
+        Returns the entries after version since, of section or of all
+        of them. Only the last MAX_ENTRIES are kept.
+        """
+        with self._lock:
+            return [entry for entry in self._entries
+                    if entry['version'] > since and
+                    (section is self.ALL or entry['section'] == section)]
+
+    def is_dirty(self, section):
+        return section in self._dirty
+
+    def get_dirty(self):
+        with self._lock:
+            return set(self._dirty)
+
+    def clear_dirty(self, sections=None, version=None):
+        """
+        Cleans sections, or all of them, unless they changed after
+        version, e.g. while the configuration taken at that version
+        was applied.
+        """
+        with self._lock:
+            if sections is None:
+                sections = self._dirty.keys()
+            for section in list(sections):
+                if version is None or self._dirty.get(section, 0) <= version:
+                    self._dirty.pop(section, None)
+
+    def subscribe(self, callback, section=ALL):
+        """
+        callback(entry) is called on every change of section, or of
+        any section by default.
+        """
+        with self._lock:
+            self._subscribers.setdefault(section, []).append(callback)
+        return callback
+
+    def unsubscribe(self, callback, section=ALL):
+        with self._lock:
+            if callback in self._subscribers.get(section, []):
+                self._subscribers[section].remove(callback)
@@ -0,0 +1,204 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import json
+import os
+import pwd
+import re
+
+
+class ChangePlanner():
+    """
+    Computes what a chef-solo run of the gecos_ws_mgmt resources would
+    change in the system, without running it.
+
+    plan() returns a list of changes as dicts:
+
+        {'action': 'create' | 'modify' | 'remove',
+         'type': 'flag' | 'pem' | 'sssd' | 'user' | 'ntp' | 'file',
+         'resource': 'gcc_res', 'target': '/etc/gcc.control',
+         'detail': '...'}
+
+    The expected state is taken from what the gecos_ws_mgmt providers
+    write. root is prepended to every path.
+    """
+
+    CREATE = 'create'
+    MODIFY = 'modify'
+    REMOVE = 'remove'
+
+    NTPDATE = '/etc/default/ntpdate'
+    GCC_FLAG = '/etc/gcc.control'
+    CHEF_FLAG = '/etc/chef.control'
+    CHEF_CLIENT_RB = '/etc/chef/client.rb'
+    CHEF_CLIENT_PEM = '/etc/chef/client.pem'
+    CHEF_KNIFE_RB = '/etc/chef/knife.rb'
+    CHEF_PEM = '/etc/chef/validation.pem'
+    SSSD_FLAG = '/etc/gca-sssd.control'
+    SSSD_CONF = '/etc/sssd/sssd.conf'
+    AD_FILES = [('krb5_url', '/etc/krb5.conf'), ('smb_url', '/etc/samba/smb.conf')]
+
+    def __init__(self, root=''):
+        self._root = root
+        self._changes = []
+
+    def _path(self, path):
+        return self._root + path
+
+    def _exists(self, path):
+        return os.path.exists(self._path(path))
+
+    def _read(self, path):
+        try:
+            fp = open(self._path(path), 'r')
+            content = fp.read()
+            fp.close()
+            return content
+        except IOError:
+            return None
+
+    def _read_json(self, path):
+        content = self._read(path)
+        try:
+            return json.loads(content)
+        except (TypeError, ValueError):
+            return None
+
+    def _add(self, action, type, resource, target, detail=''):
+        self._changes.append({'action': action, 'type': type,
+            'resource': resource, 'target': target, 'detail': detail})
+
+    def _write_file(self, type, resource, path, expected=None, detail=''):
+        # The file will be written, with expected content if known.
+        current = self._read(path)
+        if current is None:
+            self._add(self.CREATE, type, resource, path, detail)
+        elif expected is None or current != expected:
+            self._add(self.MODIFY, type, resource, path, detail)
+
+    def _write_flag(self, resource, path, expected):
+        current = self._read_json(path)
+        if not self._exists(path):
+            self._add(self.CREATE, 'flag', resource, path)
+        elif current != expected:
+            self._add(self.MODIFY, 'flag', resource, path)
+
+    def _remove_file(self, type, resource, path, detail=''):
+        if self._exists(path):
+            self._add(self.REMOVE, type, resource, path, detail)
+
+    def plan_tz_date(self, res):
+        server = res.get('server')
+        if not server:
+            return
+        current = re.search(r'^NTPSERVERS="(.*)"', self._read(self.NTPDATE) or '', re.M)
+        if current is None:
+            self._add(self.CREATE, 'ntp', 'tz_date_res', self.NTPDATE, server)
+        elif current.group(1) != server:
+            self._add(self.MODIFY, 'ntp', 'tz_date_res', self.NTPDATE,
+                      '%s -> %s' % (current.group(1), server))
+
+    def plan_gcc(self, res):
+        flag = {'uri_gcc': res.get('uri_gcc'), 'gcc_username': res.get('gcc_username'),
+                'gcc_nodename': res.get('gcc_nodename')}
+        if not res.get('run_attr', True) or res.get('gcc_link'):
+            self._write_flag('gcc_res', self.GCC_FLAG, flag)
+        else:
+            self._remove_file('flag', 'gcc_res', self.GCC_FLAG, res.get('uri_gcc'))
+
+    def plan_chef(self, res, pem=None):
+        flag = {'chef_server_url': res.get('chef_server_url'),
+                'chef_node_name': res.get('chef_node_name'),
+                'chef_admin_name': res.get('chef_admin_name')}
+        url = res.get('chef_server_url')
+        if res.get('chef_link_existing'):
+            self._write_file('file', 'chef_conf_res', self.CHEF_KNIFE_RB, detail=url)
+            self._write_file('file', 'chef_conf_res', self.CHEF_CLIENT_RB, detail=url)
+            self._write_flag('chef_conf_res', self.CHEF_FLAG, flag)
+            self._write_file('pem', 'chef_conf_res', self.CHEF_CLIENT_PEM,
+                             detail=res.get('chef_node_name'))
+        elif res.get('chef_link'):
+            self._write_file('file', 'chef_conf_res', self.CHEF_CLIENT_RB, detail=url)
+            # The validation PEM is only used to register the client.
+            self._write_file('pem', 'chef_conf_res', self.CHEF_PEM, pem)
+            self._write_flag('chef_conf_res', self.CHEF_FLAG, flag)
+        else:
+            for type, path in [('flag', self.CHEF_FLAG), ('pem', self.CHEF_CLIENT_PEM),
+                               ('pem', self.CHEF_PEM), ('file', self.CHEF_KNIFE_RB)]:
+                self._remove_file(type, 'chef_conf_res', path, url)
+
+    def plan_sssd(self, res, files=None):
+        domain = res.get('domain', {}).get('name', '')
+        if res.get('enabled'):
+            self._write_file('sssd', 'sssd_res', self.SSSD_CONF, detail=domain)
+            for key, path in self.AD_FILES:
+                if res.get('domain', {}).get('type') == 'ad':
+                    self._write_file('file', 'sssd_res', path,
+                                     (files or {}).get(key), domain)
+            if not self._exists(self.SSSD_FLAG):
+                self._add(self.CREATE, 'flag', 'sssd_res', self.SSSD_FLAG, domain)
+        else:
+            self._remove_file('flag', 'sssd_res', self.SSSD_FLAG, domain)
+
+    def _user_exists(self, name):
+        try:
+            pwd.getpwnam(name)
+            return True
+        except KeyError:
+            return False
+
+    def plan_users(self, res):
+        for user in res.get('users_list', []):
+            name = user.get('user')
+            exists = self._user_exists(name)
+            if user.get('actiontorun') == 'delete':
+                if exists:
+                    self._add(self.REMOVE, 'user', 'local_users_res', name)
+            elif exists:
+                self._add(self.MODIFY, 'user', 'local_users_res', name,
+                          ', '.join(user.get('groups', [])))
+            else:
+                self._add(self.CREATE, 'user', 'local_users_res', name,
+                          ', '.join(user.get('groups', [])))
+
+    def plan(self, json_solos, pem=None, files=None):
+        """
+        Returns the changes of running json_solos in order. pem is the
+        validation certificate to install and files the content of the
+        AD configuration files, indexed by attribute (krb5_url...).
+        """
+        self._changes = []
+        for json_solo in json_solos:
+            root = json_solo.get('gecos_ws_mgmt', {})
+            misc = root.get('misc_mgmt', {})
+            network = root.get('network_mgmt', {})
+            if 'tz_date_res' in misc:
+                self.plan_tz_date(misc['tz_date_res'])
+            if 'chef_conf_res' in misc:
+                self.plan_chef(misc['chef_conf_res'], pem)
+            if 'gcc_res' in misc:
+                self.plan_gcc(misc['gcc_res'])
+            if 'sssd_res' in network:
+                self.plan_sssd(network['sssd_res'], files)
+            if 'local_users_res' in misc:
+                self.plan_users(misc['local_users_res'])
+        return self._changes
@@ -21,82 +21,59 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING, RAW
 
 
-class ChefConf():
+class ChefConf(ConfRecord):
 
-    def __init__(self):
-        self._data = {}
-        self._data['chef_server_uri'] = ''
-        self._data['chef_validation'] = ''
-        self._data['chef_link'] = False
-        self._data['chef_link_existing'] = False
-
-
-    def load_data(self, conf):
-        msg = 'ServerConf: Key "%s" not found in the configuration file.'
-        try:
-            self.set_url(conf['chef_server_uri'])
-        except KeyError as e:
-            print msg % ('chef_server_uri',)
-        try:
-            self.set_pem(conf['chef_validation'])
-        except KeyError as e:
-            print msg % ('chef_validation',)
-        try:
-            self.set_chef_link(conf['chef_link'])
-        except KeyError as e:
-            print msg % ('chef_link',)
+    FIELDS = (
+        ('chef_server_uri', STRING, ''),
+        ('chef_validation', STRING, ''),
+        ('chef_link', RAW, False),
+        ('chef_link_existing', RAW, False),
+        ('node_name', STRING, ''),
+        ('chef_admin_name', STRING, ''),
+    )
 
     def validate(self):
-        valid = validation.is_url(self._data['chef_server_uri']) and self._data['chef_validation'] != '' and self._data['chef_link'] != None and self._data['chef_link_existing'] != None
+        valid = validation.is_url(self._chef_server_uri) and self._chef_validation != '' and self._chef_link != None and self._chef_link_existing != None
         return valid
 
     def get_url(self):
-        return self._data['chef_server_uri'].encode('utf-8')
+        return self._chef_server_uri
 
     def set_url(self, url):
-        self._data['chef_server_uri'] = url
-        return self
+        return self._set('chef_server_uri', url)
 
     def get_pem(self):
-        return self._data['chef_validation'].encode('utf-8')
+        return self._chef_validation
 
     def set_pem(self, pem):
-        self._data['chef_validation'] = pem
-        return self
+        return self._set('chef_validation', pem)
 
 
     # --- Next fields are not present in the JSON file but are
     # setted on runtime by Firstboot ---
     def set_chef_link_existing(self, link_existing):
-        self._data['chef_link_existing'] = link_existing
-        return self
+        return self._set('chef_link_existing', link_existing)
 
     def get_chef_link_existing(self):
-        return self._data['chef_link_existing']
+        return self._chef_link_existing
 
     def set_chef_link(self, chef_link):
-        self._data['chef_link'] = chef_link
-        return self
+        return self._set('chef_link', chef_link)
 
     def get_chef_link(self):
-        return self._data['chef_link']
+        return self._chef_link
         
     def get_node_name(self):
-        if not 'node_name' in self._data:
-            self._data['node_name'] = ''
-        return self._data['node_name'].encode('utf-8')
+        return self._node_name
 
     def set_node_name(self, node_name):
-        self._data['node_name'] = node_name
-        return self
+        return self._set('node_name', node_name)
 
     def get_admin_name(self):
-        if not 'chef_admin_name' in self._data:
-            self._data['chef_admin_name'] = ''
-        return self._data['chef_admin_name'].encode('utf-8')
+        return self._chef_admin_name
 
     def set_admin_name(self, admin_name):
-        self._data['chef_admin_name'] = admin_name
-        return self
+        return self._set('chef_admin_name', admin_name)
@@ -0,0 +1,177 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import copy
+import threading
+
+
+class ChefSoloPlan():
+    """
+    Collects the chef-solo work requested by several operations (unlink,
+    link, apply...) so it can be done in as few chef-solo runs as
+    possible.
+
+    Every operation is a solo JSON document. On commit the operations
+    are sorted by their order (unlinks first) and merged into phases,
+    one chef-solo run each. An operation joins the current phase only
+    if every recipe of the phase and of the operation would still see
+    the same gecos_ws_mgmt resources it would see alone; otherwise it
+    starts a new phase.
+    """
+
+    UNLINK = 0
+    LINK = 1
+    APPLY = 2
+
+    ROOT = 'gecos_ws_mgmt'
+    SECTIONS = ['misc_mgmt', 'network_mgmt']
+
+    # gecos_ws_mgmt resources read by every recipe, None meaning all of
+    # them. Recipes not listed here don't read any.
+    RECIPE_RESOURCES = {
+        'recipe[gecos_ws_mgmt::local]': None,
+        'recipe[gecos_ws_mgmt::unlink_from_gcc]': [('misc_mgmt', 'gcc_res')],
+        'recipe[gecos_ws_mgmt::unlink_from_chef]': [('misc_mgmt', 'chef_conf_res')],
+        'recipe[gecos_ws_mgmt::unlink_from_sssd]': [('network_mgmt', 'sssd_res')],
+    }
+
+    def __init__(self):
+        self._operations = []
+        self._lock = threading.Lock()
+
+    def add(self, order, json_solo):
+        with self._lock:
+            self._operations.append((order, len(self._operations),
+                                     copy.deepcopy(json_solo)))
+        return self
+
+    def is_empty(self):
+        return len(self._operations) == 0
+
+    def clear(self):
+        with self._lock:
+            self._operations = []
+        return self
+
+    def discard(self, order):
+        """
+        Removes the operations of the given order, e.g. an apply that
+        failed before a new one is added.
+        """
+        with self._lock:
+            self._operations = [op for op in self._operations if op[0] != order]
+        return self
+
+    def _get_resources(self, json_solo):
+        resources = {}
+        for section, values in json_solo.get(self.ROOT, {}).items():
+            for name, value in values.items():
+                resources[(section, name)] = value
+        return resources
+
+    def _get_reads(self, run_list):
+        reads = set()
+        for recipe in run_list:
+            if recipe not in self.RECIPE_RESOURCES:
+                continue
+            if self.RECIPE_RESOURCES[recipe] is None:
+                return None
+            reads.update(self.RECIPE_RESOURCES[recipe])
+        return reads
+
+    def _sees_same(self, reads, own, other):
+        # The recipes reading `reads` must see in `other` the same
+        # resources they have in `own`.
+        if reads is None:
+            reads = set(own.keys()) | set(other.keys())
+        for key in reads:
+            if key in other and (key not in own or own[key] != other[key]):
+                return False
+        return True
+
+    def _new_phase(self):
+        return {'run_list': [], 'resources': {}, 'reads': set(), 'extra': {},
+                'operations': []}
+
+    def get_phases(self):
+        """
+        Returns the solo JSON documents to run, in order.
+        """
+        with self._lock:
+            operations = list(self._operations)
+        return self._merge(operations)
+
+    def _merge(self, operations):
+        return [self._to_json(phase) for phase in self._merge_phases(operations)]
+
+    def _merge_phases(self, operations):
+        phases = []
+        phase = self._new_phase()
+        for operation in sorted(operations):
+            (order, index, json_solo) = operation
+            run_list = json_solo.get('run_list', [])
+            resources = self._get_resources(json_solo)
+            reads = self._get_reads(run_list)
+            if len(phase['run_list']) > 0 and not (
+                    self._sees_same(reads, resources, phase['resources']) and
+                    self._sees_same(phase['reads'], phase['resources'], resources)):
+                phases.append(phase)
+                phase = self._new_phase()
+            for recipe in run_list:
+                if recipe not in phase['run_list']:
+                    phase['run_list'].append(recipe)
+            phase['resources'].update(resources)
+            if reads is None or phase['reads'] is None:
+                phase['reads'] = None
+            else:
+                phase['reads'].update(reads)
+            for key, value in json_solo.items():
+                if key not in ('run_list', self.ROOT):
+                    phase['extra'][key] = value
+            phase['operations'].append(operation)
+        if len(phase['run_list']) > 0:
+            phases.append(phase)
+        return phases
+
+    def _to_json(self, phase):
+        json_solo = dict(phase['extra'])
+        json_solo['run_list'] = phase['run_list']
+        # The recipes expect every section to exist, even if empty.
+        json_solo[self.ROOT] = dict((section, {}) for section in self.SECTIONS)
+        for (section, name), value in phase['resources'].items():
+            json_solo[self.ROOT].setdefault(section, {})[name] = value
+        return json_solo
+
+    def commit(self):
+        """
+        Yields the phases to run, in order. The operations of a phase
+        are removed from the plan when the next one is asked for, so
+        if the caller stops at a phase that failed, it and the ones
+        not run yet stay in the plan.
+        """
+        with self._lock:
+            operations = list(self._operations)
+        for phase in self._merge_phases(operations):
+            yield self._to_json(phase)
+            with self._lock:
+                self._operations = [op for op in self._operations
+                                    if not any(op is done for done in phase['operations'])]
@@ -0,0 +1,212 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import re
+import time
+
+
+class ChefSoloReport():
+    """
+    Report of a chef-solo run built from its doc formatter output.
+
+    Lines are fed as they are written, with the time they were read,
+    so the time of every resource is the one until the next resource
+    starts. The report holds the resources in the order they ran:
+
+        {'resource': 'template[/etc/gcc.control]', 'action': 'create',
+         'recipe': 'gecos_ws_mgmt::local', 'duration': 0.2,
+         'status': 'updated' | 'up to date' | 'skipped' | 'failed'}
+
+    and the failed resource with an excerpt of its error, if any.
+    """
+
+    EXCERPT_LINES = 15
+
+    RE_RECIPE = re.compile(r'^Recipe: (\S+)')
+    RE_RESOURCE = re.compile(r'^\s*\* (\S+\[.*?\]) action (\w+)(?: \((.*)\))?')
+    RE_CHANGE = re.compile(r'^\s+- ')
+    RE_ERROR = re.compile(r"Error executing action `(\w+)` on resource '(.*)'")
+    RE_COMPILE_ERROR = re.compile(r'^Recipe Compile Error in (\S+)')
+    RE_END_EXCERPT = re.compile(r'^(Resource Declaration:|Compiled Resource:|'
+                                r'Cookbook Trace:|Relevant File Content:|Running handlers)')
+    RE_FINISHED = re.compile(r'Chef Client (finished|failed)')
+    SEPARATOR = '=' * 20
+
+    def __init__(self):
+        self.started = None
+        self.finished = None
+        self.success = None
+        # Set by the runner: completed, timed out or cancelled.
+        self.outcome = None
+        self.resources = []
+        self.failed_resource = None
+        self.error = []
+        # What the log said about the run, the exit status wins.
+        self._logged_success = None
+        self._recipe = None
+        self._current = None
+        self._in_error = False
+
+    def feed(self, line, now=None):
+        if now is None:
+            now = time.time()
+        if self.started is None:
+            self.started = now
+        line = line.rstrip('\r\n')
+
+        if self._in_error:
+            self._feed_error(line)
+            if self._in_error:
+                return
+
+        match = self.RE_RECIPE.match(line)
+        if match:
+            self._recipe = match.group(1)
+            return
+        match = self.RE_RESOURCE.match(line)
+        if match:
+            self._end_resource(now)
+            status = match.group(3) or 'up to date'
+            if status.startswith('skipped'):
+                status = 'skipped'
+            self._current = {'resource': match.group(1), 'action': match.group(2),
+                             'recipe': self._recipe, 'status': status,
+                             'started': now, 'duration': None}
+            self.resources.append(self._current)
+            return
+        if self._current is not None and self.RE_CHANGE.match(line):
+            self._current['status'] = 'updated'
+            return
+        match = self.RE_ERROR.search(line)
+        if match:
+            self.failed_resource = match.group(2)
+            self._mark_failed(match.group(2))
+            self._start_error(now)
+            return
+        match = self.RE_COMPILE_ERROR.match(line)
+        if match:
+            self.failed_resource = match.group(1)
+            self._start_error(now)
+            return
+        match = self.RE_FINISHED.search(line)
+        if match:
+            self._logged_success = match.group(1) == 'finished'
+            self.finish(now=now)
+
+    def _start_error(self, now):
+        self._end_resource(now)
+        self._in_error = True
+        self.error = []
+
+    def _feed_error(self, line):
+        # The excerpt is the exception class and message, up to the
+        # resource dump.
+        if self.RE_END_EXCERPT.match(line):
+            self._in_error = False
+            return
+        if line.startswith(self.SEPARATOR) or (not line.strip() and not self.error):
+            return
+        if len(self.error) < self.EXCERPT_LINES:
+            self.error.append(line)
+
+    def _mark_failed(self, resource):
+        for entry in reversed(self.resources):
+            if entry['resource'] == resource:
+                entry['status'] = 'failed'
+                return
+
+    def _end_resource(self, now):
+        if self._current is not None:
+            self._current['duration'] = now - self._current['started']
+            self._current = None
+
+    def finish(self, success=None, now=None):
+        """
+        Ends the report, success being the result of the run if known.
+        It overrides what the log said, even once the report is ended.
+        """
+        if success is not None:
+            self.success = success
+        if self.finished is not None:
+            return
+        if now is None:
+            now = time.time()
+        self._end_resource(now)
+        self._in_error = False
+        self.finished = now
+        if self.success is None and self._logged_success is not None:
+            self.success = self._logged_success
+        elif self.success is None:
+            self.success = self.failed_resource is None
+        while self.error and not self.error[-1].strip():
+            self.error.pop()
+
+    def get_total_time(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def get_changed(self):
+        return [entry for entry in self.resources if entry['status'] == 'updated']
+
+    def get_recipe_times(self):
+        """
+        Returns (recipe, seconds) pairs, slowest first.
+        """
+        times = {}
+        for entry in self.resources:
+            times[entry['recipe']] = times.get(entry['recipe'], 0.0) + (entry['duration'] or 0.0)
+        return sorted(times.items(), key=lambda item: item[1], reverse=True)
+
+    def get_slowest(self, count=5):
+        return sorted(self.resources, key=lambda entry: entry['duration'] or 0.0,
+                      reverse=True)[:count]
+
+    def get_error_excerpt(self):
+        return '\n'.join(self.error)
+
+    def to_dict(self):
+        return {
+            'success': self.success,
+            'outcome': self.outcome,
+            'total_time': self.get_total_time(),
+            'recipes': [{'recipe': recipe, 'duration': duration}
+                        for recipe, duration in self.get_recipe_times()],
+            'resources': [dict((k, v) for k, v in entry.items() if k != 'started')
+                          for entry in self.resources],
+            'changed': [entry['resource'] for entry in self.get_changed()],
+            'failed_resource': self.failed_resource,
+            'error': self.get_error_excerpt(),
+        }
+
+    @classmethod
+    def parse(cls, lines):
+        """
+        Builds the report of a finished run, e.g. from its log file.
+        Without the time of every line the durations are all zero.
+        """
+        report = cls()
+        now = time.time()
+        for line in lines:
+            report.feed(line, now)
+        report.finish(now=now)
+        return report
@@ -0,0 +1,331 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import atexit
+import collections
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from gi.repository import GLib
+from firstboot_lib import TaskExecutor
+from ChefSoloReport import ChefSoloReport
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+# Runners whose process group is alive, killed on exit.
+ACTIVE_RUNNERS = set()
+
+
+def kill_active_runners():
+    for runner in list(ACTIVE_RUNNERS):
+        runner._signal(signal.SIGTERM)
+
+atexit.register(kill_active_runners)
+
+# prctl(2) option to get a signal when the parent dies.
+PR_SET_PDEATHSIG = 1
+
+try:
+    # Loaded here, it's not safe to do it between fork and exec.
+    LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+except OSError:
+    LIBC = None
+
+
+def _make_preexec():
+    parent = os.getpid()
+
+    def preexec():
+        # A process group of its own, so the whole run can be stopped.
+        os.setsid()
+        # atexit is not run if the assistant is killed, chef-solo must
+        # not keep changing the system on its own.
+        if LIBC is not None:
+            LIBC.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+        if os.getppid() != parent:
+            os._exit(1)
+    return preexec
+
+
+class ChefSoloProgress():
+    """
+    State of a chef-solo run as published to the listeners.
+    """
+
+    def __init__(self, tail=None):
+        # Last lines of the output, shared with the runner.
+        self.tail = tail
+        self.resource = None
+        self.completed = 0
+        self.total = None
+        self.started = time.time()
+        self.last_output = self.started
+        self.finished = False
+        self.returncode = None
+        # How the run ended: completed, timed out or cancelled.
+        self.outcome = None
+
+    def get_elapsed(self):
+        return time.time() - self.started
+
+    def get_idle(self):
+        # Seconds since chef-solo wrote anything, to tell if it's stuck.
+        return time.time() - self.last_output
+
+    def get_fraction(self):
+        if self.finished:
+            return 1.0
+        if not self.total:
+            return None
+        return min(float(self.completed) / self.total, 1.0)
+
+
+class ChefSoloRunner():
+    """
+    Runs chef-solo without blocking the GTK main loop.
+
+    The output of the child is read through GLib IO watches as it is
+    written, saved to the log file and kept in a bounded tail. The
+    resource lines are parsed to publish ChefSoloProgress events to the
+    listeners, which are called in the main loop on every resource and
+    once a second while the run goes on. The lines are also fed to a
+    ChefSoloReport.
+
+    chef-solo runs in its own process group, so it can be stopped with
+    everything it started: on cancel(), when the run goes past the
+    deadline, or when it writes nothing for stall_timeout seconds. The
+    group gets SIGTERM and, KILL_GRACE seconds later, SIGKILL.
+    """
+
+    TAIL_LINES = 200
+    KILL_GRACE = 10
+
+    COMPLETED = 'completed'
+    TIMED_OUT = 'timed out'
+    CANCELLED = 'cancelled'
+
+    # Doc formatter: "Converging 12 resources"
+    RE_TOTAL = re.compile(r'Converging (\d+) resources')
+    # Doc formatter: "  * template[/etc/gcc.control] action create"
+    # Info log: "INFO: Processing template[/etc/gcc.control] action create (...)"
+    RE_RESOURCE = re.compile(r'^\s*(?:\* |.*INFO: Processing )(\S+\[.*?\]) action (\w+)')
+    RE_FINISHED = re.compile(r'Chef Client finished|Chef Run complete')
+
+    def __init__(self, args, env=None, log_path=None, tail_lines=TAIL_LINES,
+                 deadline=None, stall_timeout=None):
+        self._args = args
+        self._deadline = deadline
+        self._stall_timeout = stall_timeout
+        self._outcome = None
+        self._env = env
+        self._log_path = log_path
+        self._log = None
+        self._process = None
+        self._buffer = ''
+        self._tail = collections.deque(maxlen=tail_lines)
+        self._listeners = []
+        self._progress = ChefSoloProgress(self._tail)
+        self._report = ChefSoloReport()
+        self._done = threading.Event()
+        self._timer = None
+
+    def add_listener(self, callback):
+        """
+        callback(progress) is called in the main loop.
+        """
+        self._listeners.append(callback)
+        return self
+
+    def get_progress(self):
+        return self._progress
+
+    def get_report(self):
+        return self._report
+
+    def get_tail(self):
+        return list(self._tail)
+
+    def get_pid(self):
+        return self._process.pid
+
+    def get_returncode(self):
+        return self._progress.returncode
+
+    def start(self):
+        if self._log_path is not None:
+            self._log = open(self._log_path, 'w', 1)
+        self._progress = ChefSoloProgress(self._tail)
+        self._report = ChefSoloReport()
+        self._process = subprocess.Popen(self._args, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, env=self._env, close_fds=True,
+            preexec_fn=_make_preexec())
+        ACTIVE_RUNNERS.add(self)
+        fd = self._process.stdout.fileno()
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self._on_output)
+        self._timer = GLib.timeout_add_seconds(1, self._on_timer)
+        return self
+
+    def _on_output(self, fd, condition):
+        if condition & GLib.IO_IN:
+            try:
+                data = os.read(fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return True
+                data = ''
+            if data:
+                if self._log is not None:
+                    self._log.write(data)
+                self._progress.last_output = time.time()
+                lines = (self._buffer + data).split('\n')
+                self._buffer = lines.pop()
+                for line in lines:
+                    self._parse(line)
+                return True
+
+        # End of file, hang up or error: the child is exiting.
+        if self._buffer:
+            self._parse(self._buffer)
+            self._buffer = ''
+        self._process.stdout.close()
+        GLib.timeout_add(50, self._poll_exit)
+        return False
+
+    def _parse(self, line):
+        self._tail.append(line)
+        self._report.feed(line)
+        progress = self._progress
+        match = self.RE_TOTAL.search(line)
+        if match:
+            progress.total = int(match.group(1))
+            return
+        match = self.RE_RESOURCE.match(line)
+        if match:
+            if progress.resource is not None:
+                progress.completed += 1
+            progress.resource = '%s (%s)' % (match.group(1), match.group(2))
+            self._notify()
+            return
+        if self.RE_FINISHED.search(line) and progress.resource is not None:
+            progress.completed += 1
+            progress.resource = None
+            self._notify()
+
+    def _poll_exit(self):
+        returncode = self._process.poll()
+        if returncode is None:
+            return True
+        if self._log is not None:
+            self._log.close()
+        if self._timer is not None:
+            GLib.source_remove(self._timer)
+            self._timer = None
+        ACTIVE_RUNNERS.discard(self)
+        self._progress.returncode = returncode
+        self._progress.outcome = self._outcome or self.COMPLETED
+        self._progress.finished = True
+        self._report.finish(returncode == 0)
+        self._report.outcome = self._progress.outcome
+        logger.info('chef-solo %s with exit code %s' % (self._progress.outcome, returncode))
+        self._notify()
+        self._done.set()
+        return False
+
+    def _on_timer(self):
+        progress = self._progress
+        if self._outcome is None:
+            if self._deadline is not None and progress.get_elapsed() > self._deadline:
+                logger.warning('chef-solo took more than %d seconds' % (self._deadline,))
+                self._stop(self.TIMED_OUT)
+            elif self._stall_timeout is not None and progress.get_idle() > self._stall_timeout:
+                logger.warning('chef-solo stalled in %s for %d seconds' % (
+                    progress.resource, self._stall_timeout))
+                self._stop(self.TIMED_OUT)
+        self._notify()
+        return True
+
+    def cancel(self):
+        """
+        Stops the run. Can be called from any thread.
+        """
+        GLib.idle_add(self._stop, self.CANCELLED)
+
+    def is_running(self):
+        return self._process is not None and not self._done.is_set()
+
+    def _stop(self, outcome):
+        if not self.is_running() or self._outcome is not None:
+            return False
+        self._outcome = outcome
+        self._signal(signal.SIGTERM)
+        GLib.timeout_add_seconds(self.KILL_GRACE, self._kill)
+        return False
+
+    def _kill(self):
+        if self.is_running():
+            logger.warning('chef-solo did not stop, killing it')
+            self._signal(signal.SIGKILL)
+        return False
+
+    def _signal(self, signum):
+        try:
+            os.killpg(self._process.pid, signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self._progress)
+            except Exception as e:
+                logger.exception(e)
+
+    def wait(self, timeout=None):
+        """
+        Waits for chef-solo to finish and returns its exit code. When
+        called from the main thread the main loop is run meanwhile,
+        since it is the one reading the output.
+        """
+        if TaskExecutor.is_main_thread():
+            context = GLib.MainContext.default()
+            deadline = None if timeout is None else time.time() + timeout
+            while not self._done.is_set():
+                if deadline is not None and time.time() >= deadline:
+                    break
+                context.iteration(True)
+        else:
+            self._done.wait(timeout)
+        return self._progress.returncode
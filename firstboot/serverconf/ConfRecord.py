@@ -0,0 +1,273 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import collections
+
+
+# Kinds of field
+STRING = 'string'   # text, kept UTF-8 encoded
+RAW = 'raw'         # kept as given
+LIST = 'list'       # list, of records or plain values
+RECORD = 'record'   # nested ConfRecord
+
+
+class ConfRecordType(type):
+    """
+    Gives every ConfRecord class a slot per field declared in FIELDS.
+    """
+
+    def __new__(cls, name, bases, attrs):
+        fields = attrs.get('FIELDS', ())
+        attrs['__slots__'] = tuple(attrs.get('__slots__', ())) + \
+            tuple('_' + field for field, kind, default in fields)
+        attrs['_KINDS'] = dict((field, kind) for field, kind, default in fields)
+        return type.__new__(cls, name, bases, attrs)
+
+
+class ConfRecord(object):
+    """
+    Base of the configuration classes.
+
+    Subclasses declare their fields in FIELDS as (name, kind, default)
+    tuples, a callable default being called for every new record. The
+    values are converted once, when they are set, so the getters just
+    return them. Records can be copied, compared and hashed by value,
+    and to_dict() returns their fields as plain values.
+
+    Once attached to a ChangeJournal every change of a field is
+    recorded under the section of the record, and made holding the
+    writing() lock of the journal. Copies are not attached.
+
+    snapshot() returns the state of a record as immutable values that
+    share the strings of the record, and restore() brings a record
+    back to it setting only the fields that differ.
+    """
+
+    __metaclass__ = ConfRecordType
+    __slots__ = ('_journal', '_section')
+
+    FIELDS = ()
+
+    def __init__(self):
+        for name, kind, default in self.FIELDS:
+            if callable(default):
+                default = default()
+            self._set(name, default)
+
+    def _set(self, name, value):
+        if self._KINDS[name] == STRING and isinstance(value, unicode):
+            value = value.encode('utf-8')
+        with self._writing():
+            old = getattr(self, '_' + name, None)
+            setattr(self, '_' + name, value)
+            if self._KINDS[name] in (RECORD, LIST):
+                _attach(value, self.get_journal(), self.get_section())
+            if old != value:
+                self._changed(name, old, value)
+        return self
+
+    def _writing(self):
+        """
+        Lock to hold while the record changes, also in place.
+        """
+        journal = self.get_journal()
+        if journal is None:
+            return _NOT_ATTACHED
+        return journal.writing()
+
+    def _changed(self, name, old, new):
+        """
+        Records a change of field name, also the ones made in place on
+        a list.
+        """
+        journal = self.get_journal()
+        if journal is not None:
+            journal.record(self.get_section(), name, _plain(old), _plain(new))
+
+    def attach(self, journal, section):
+        """
+        Records the changes of this record, and the ones it holds, in
+        journal under section. A journal of None detaches it.
+        """
+        self._journal = journal
+        self._section = section
+        for name, value in self._values():
+            _attach(value, journal, section)
+        return self
+
+    def get_journal(self):
+        return getattr(self, '_journal', None)
+
+    def get_section(self):
+        return getattr(self, '_section', None)
+
+    def _get(self, name):
+        return getattr(self, '_' + name)
+
+    def _values(self):
+        return [(name, self._get(name)) for name, kind, default in self.FIELDS]
+
+    def to_dict(self, names=None):
+        """
+        Returns the fields (only the given names if any) as a dict of
+        plain values.
+        """
+        if names is None:
+            return dict((name, _plain(value)) for name, value in self._values())
+        return dict((name, _plain(self._get(name))) for name in names)
+
+    def copy(self):
+        record = self.__class__.__new__(self.__class__)
+        for name, value in self._values():
+            setattr(record, '_' + name, _copy(value))
+        return record
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def snapshot(self):
+        return ConfState(self.__class__,
+                         tuple(_snapshot(value) for name, value in self._values()))
+
+    def restore(self, state):
+        """
+        Sets the fields that differ from state, a snapshot() of a
+        record of the same class. Nested records are restored in place.
+        """
+        if state.cls is not self.__class__:
+            raise TypeError('Can not restore a %s from a %s snapshot' % (
+                self.__class__.__name__, state.cls.__name__))
+        for (name, kind, default), value in zip(self.FIELDS, state.values):
+            current = self._get(name)
+            if isinstance(current, ConfRecord) and isinstance(value, ConfState) \
+                    and value.cls is current.__class__:
+                current.restore(value)
+            elif current is not value and _snapshot(current) != value:
+                self._set(name, _thaw(value))
+        return self
+
+    @classmethod
+    def from_snapshot(cls, state):
+        record = cls.__new__(cls)
+        for (name, kind, default), value in zip(cls.FIELDS, state.values):
+            setattr(record, '_' + name, _thaw(value))
+        return record
+
+    def _key(self):
+        return tuple(_freeze(value) for name, value in self._values())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.__class__.__name__, self._key()))
+
+    def __str__(self):
+        return str(self.to_dict())
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.to_dict())
+
+
+class _NotAttached():
+    # Nobody else sees a record that is not attached.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOT_ATTACHED = _NotAttached()
+
+
+# Snapshot of a record
+ConfState = collections.namedtuple('ConfState', ['cls', 'values'])
+
+
+class _ListState(tuple):
+    pass
+
+
+class _DictState(tuple):
+    pass
+
+
+def _snapshot(value):
+    if isinstance(value, ConfRecord):
+        return value.snapshot()
+    if isinstance(value, list):
+        return _ListState(_snapshot(item) for item in value)
+    if isinstance(value, dict):
+        return _DictState(sorted((k, _snapshot(v)) for k, v in value.items()))
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, ConfState):
+        return value.cls.from_snapshot(value)
+    if isinstance(value, _ListState):
+        return [_thaw(item) for item in value]
+    if isinstance(value, _DictState):
+        return dict((k, _thaw(v)) for k, v in value)
+    return value
+
+
+def _attach(value, journal, section):
+    if isinstance(value, ConfRecord):
+        value.attach(journal, section)
+    elif isinstance(value, list):
+        for item in value:
+            _attach(item, journal, section)
+
+
+def _plain(value):
+    if isinstance(value, ConfRecord):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _copy(value):
+    if isinstance(value, ConfRecord):
+        return value.copy()
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _freeze(value):
+    if isinstance(value, ConfRecord):
+        return value._key()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
@@ -0,0 +1,207 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class CookbookBundle():
+    """
+    Stages the cookbooks a run_list needs out of the shared cookbook
+    path.
+
+    The cookbooks are the ones named by the run_list plus their
+    dependencies, as declared in their metadata. Only the files chef
+    loads (metadata and cookbook segments) are copied. Bundles are
+    cached in cache_dir by the checksum of their content, so the same
+    run_list reuses the bundle until the cookbooks are updated.
+    """
+
+    # Directories loaded by chef-solo, the rest (tests, specs...) is
+    # left out of the bundle.
+    SEGMENTS = ['attributes', 'definitions', 'files', 'libraries',
+                'providers', 'recipes', 'resources', 'templates']
+    METADATA = ['metadata.json', 'metadata.rb']
+
+    # Bundles kept in the cache.
+    KEEP = 3
+
+    RE_NAME = re.compile(r'^\s*name\s+[\'"]([^\'"]+)[\'"]', re.M)
+    RE_DEPENDS = re.compile(r'^\s*depends\s+[\'"]([^\'"]+)[\'"]', re.M)
+    RE_COOKBOOK_PATH = re.compile(r'^\s*cookbook_path\s+.*$', re.M)
+
+    def __init__(self, cookbook_path, cache_dir):
+        self._cookbook_path = cookbook_path
+        self._cache_dir = cache_dir
+        self._metadata = None
+        self._lock = threading.Lock()
+
+    def _read(self, path):
+        fp = open(path, 'r')
+        content = fp.read()
+        fp.close()
+        return content
+
+    def _read_metadata(self, directory):
+        # metadata.json is the compiled form of metadata.rb.
+        path = os.path.join(directory, 'metadata.json')
+        if os.path.exists(path):
+            try:
+                metadata = json.loads(self._read(path))
+                return (metadata.get('name'),
+                        list(metadata.get('dependencies', {}).keys()))
+            except ValueError:
+                logger.warning('Can not parse %s' % (path,))
+        path = os.path.join(directory, 'metadata.rb')
+        if os.path.exists(path):
+            content = self._read(path)
+            name = self.RE_NAME.search(content)
+            return (name and name.group(1), self.RE_DEPENDS.findall(content))
+        return (None, [])
+
+    def get_metadata(self):
+        """
+        Returns the cookbooks of the cookbook path as a dict of
+        name: (directory, dependencies).
+        """
+        if self._metadata is None:
+            metadata = {}
+            for entry in sorted(os.listdir(self._cookbook_path)):
+                directory = os.path.join(self._cookbook_path, entry)
+                if not os.path.isdir(directory):
+                    continue
+                (name, depends) = self._read_metadata(directory)
+                metadata[name or entry] = (directory, depends)
+            self._metadata = metadata
+        return self._metadata
+
+    def get_cookbook(self, item):
+        # "recipe[gecos_ws_mgmt::local]", "gecos_ws_mgmt::local" or
+        # "recipe[apt]"
+        match = re.match(r'^(?:recipe\[)?([^:\]]+)', item)
+        return match.group(1)
+
+    def get_closure(self, run_list):
+        """
+        Returns the sorted names of the cookbooks needed by run_list.
+        """
+        metadata = self.get_metadata()
+        pending = [self.get_cookbook(item) for item in run_list]
+        closure = set()
+        while pending:
+            name = pending.pop()
+            if name in closure:
+                continue
+            if name not in metadata:
+                raise ValueError('Cookbook not found: %s' % (name,))
+            closure.add(name)
+            pending.extend(metadata[name][1])
+        return sorted(closure)
+
+    def _get_files(self, name):
+        # (relative path, absolute path) of the files to stage.
+        directory = self.get_metadata()[name][0]
+        files = []
+        for filename in self.METADATA:
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                files.append((os.path.join(name, filename), path))
+        for segment in self.SEGMENTS:
+            top = os.path.join(directory, segment)
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    relpath = os.path.join(name, os.path.relpath(path, directory))
+                    files.append((relpath, path))
+        return files
+
+    def get_checksum(self, names):
+        sha = hashlib.sha256()
+        for name in names:
+            for relpath, path in self._get_files(name):
+                sha.update(relpath + '\0')
+                sha.update(hashlib.sha256(self._read(path)).hexdigest())
+        return sha.hexdigest()
+
+    def get_bundle(self, run_list):
+        """
+        Returns the cookbook path of the bundle for run_list, staging
+        it if it is not in the cache yet.
+        """
+        names = self.get_closure(run_list)
+        checksum = self.get_checksum(names)
+        bundle = os.path.join(self._cache_dir, checksum)
+        with self._lock:
+            if not os.path.isdir(bundle):
+                self._stage(names, bundle)
+                self._prune(bundle)
+            else:
+                # Keep the bundles in use out of the pruning.
+                os.utime(bundle, None)
+        return os.path.join(bundle, 'cookbooks')
+
+    def _stage(self, names, bundle):
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        # Staged aside and renamed, so a bundle is never seen half done.
+        tmpdir = tempfile.mkdtemp(dir=self._cache_dir, prefix='.staging-')
+        try:
+            for name in names:
+                for relpath, path in self._get_files(name):
+                    target = os.path.join(tmpdir, 'cookbooks', relpath)
+                    if not os.path.exists(os.path.dirname(target)):
+                        os.makedirs(os.path.dirname(target))
+                    shutil.copy2(path, target)
+            os.rename(tmpdir, bundle)
+        except Exception:
+            shutil.rmtree(tmpdir, True)
+            raise
+
+    def _prune(self, current):
+        bundles = [os.path.join(self._cache_dir, entry)
+                   for entry in os.listdir(self._cache_dir)
+                   if not entry.startswith('.')]
+        bundles.sort(key=os.path.getmtime, reverse=True)
+        for bundle in bundles[self.KEEP:]:
+            if bundle != current:
+                shutil.rmtree(bundle, True)
+
+    def get_solo_rb(self, solo_rb, cookbook_path):
+        """
+        Returns a copy of the solo_rb configuration using cookbook_path.
+        """
+        line = 'cookbook_path "%s"' % (cookbook_path,)
+        content = ''
+        if os.path.exists(solo_rb):
+            content = self._read(solo_rb)
+        if self.RE_COOKBOOK_PATH.search(content):
+            return self.RE_COOKBOOK_PATH.sub(lambda m: line, content)
+        return line + '\n' + content
@@ -0,0 +1,139 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import hashlib
+import threading
+import urlparse
+
+from ServerConf import Singleton
+from GCCClient import GCCClient
+
+
+@Singleton
+class CredentialResolver():
+    """
+    Keeps the GCC credentials known for every host.
+
+    The last credential accepted by a host is always tried first, so an
+    authenticated request costs a single round-trip once the user has
+    been validated. Credentials rejected by a host are remembered and
+    never sent to it again.
+    """
+
+    # HTTP status codes that mean the credential was rejected. A 403
+    # is an accepted credential without access to the resource.
+    REJECTED_STATUS = (401,)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._last_good = {}
+        self._rejected = {}
+
+    def _hostname(self, url):
+        return urlparse.urlparse(url).hostname
+
+    def _fingerprint(self, credential):
+        # GTK gives UTF-8 byte strings, the JSON documents unicode ones.
+        user, password = [value.encode('utf-8') if isinstance(value, unicode) else value
+                          for value in credential]
+        return hashlib.sha1('%s\0%s' % (user, password)).hexdigest()
+
+    def is_rejected(self, url, credential):
+        host = self._hostname(url)
+        with self._lock:
+            rejected = self._rejected.get(host, set())
+            return self._fingerprint(credential) in rejected
+
+    def get_credentials(self, url):
+        """
+        Returns the last (user, password) accepted by the host of url,
+        or (None, None) if there is not any.
+        """
+        with self._lock:
+            return self._last_good.get(self._hostname(url), (None, None))
+
+    def set_valid(self, url, credential):
+        host = self._hostname(url)
+        with self._lock:
+            self._last_good[host] = tuple(credential)
+            self._rejected.get(host, set()).discard(
+                self._fingerprint(credential))
+
+    def set_rejected(self, url, credential):
+        host = self._hostname(url)
+        with self._lock:
+            if self._last_good.get(host) == tuple(credential):
+                del self._last_good[host]
+            self._rejected.setdefault(host, set()).add(
+                self._fingerprint(credential))
+
+    def clear(self):
+        with self._lock:
+            self._last_good = {}
+            self._rejected = {}
+
+    def _try_credential(self, url, credential, **kwargs):
+        r = GCCClient.Instance().get(url, auth=tuple(credential), **kwargs)
+        if r.status_code in self.REJECTED_STATUS:
+            self.set_rejected(url, credential)
+            r.close()
+            return None
+        if r.ok:
+            self.set_valid(url, credential)
+        return r
+
+    def authenticated_get(self, url, credentials=None, prompt=None, **kwargs):
+        """
+        Does an authenticated GET request against url.
+
+        The last credential accepted by the host is tried first, then
+        the ones passed in `credentials` and finally, if a `prompt`
+        callable is given, the one it returns. Rejected credentials are
+        skipped without contacting the server.
+
+        Returns the response of the first request that was not rejected
+        because of the credentials (it could still be a server error,
+        check `ok`), or None if no credential was accepted.
+        """
+        candidates = []
+        last_good = self.get_credentials(url)
+        if last_good != (None, None):
+            candidates.append(last_good)
+        for credential in credentials or []:
+            credential = tuple(credential)
+            if credential not in candidates:
+                candidates.append(credential)
+
+        for credential in candidates:
+            if self.is_rejected(url, credential):
+                continue
+            r = self._try_credential(url, credential, **kwargs)
+            if r is not None:
+                return r
+
+        if prompt is not None:
+            credential = tuple(prompt())
+            if credential[0] is None or self.is_rejected(url, credential):
+                return None
+            return self._try_credential(url, credential, **kwargs)
+
+        return None
@@ -21,29 +21,21 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING
 
 
-class DateSyncConf():
+class DateSyncConf(ConfRecord):
 
-    def __init__(self):
-        self._data = {}
-        self._data['uri_ntp'] = ''
-
-    def load_data(self, conf):
-        msg = 'DateSyncConf: Key "%s" not found in the configuration file.'
-        try:
-            self.set_uri_ntp(conf)
-        except KeyError as e:
-            print msg % ('uri_ntp',)
+    FIELDS = (
+        ('uri_ntp', STRING, ''),
+    )
 
     def validate(self):
-        valid = validation.is_domain(self._data['uri_ntp'])
+        valid = validation.is_domain(self._uri_ntp)
         return valid
 
     def get_uri_ntp(self):
-        return self._data['uri_ntp'].encode('utf-8')
+        return self._uri_ntp
 
     def set_uri_ntp(self, uri_ntp):
-        self._data['uri_ntp'] = uri_ntp
-        return self
-
+        return self._set('uri_ntp', uri_ntp)
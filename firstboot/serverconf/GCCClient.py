@@ -0,0 +1,148 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import threading
+import time
+import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+from ServerConf import Singleton
+from NetworkPolicy import NetworkPolicy, CircuitBreaker, CircuitOpenException
+
+
+@Singleton
+class GCCClient():
+    """
+    Process-wide HTTP client used for every request made against the
+    GECOS Control Center (autoconf, node list, validation PEM...).
+
+    A single requests.Session is shared by all the callers, so the
+    connections (and their TLS sessions) are kept alive and reused
+    between calls to the same host instead of doing a new handshake
+    on every request.
+
+    Every request is bound by the deadlines, retries and per-host
+    circuit breakers of the client NetworkPolicy.
+    """
+
+    # Number of hosts whose connection pools are kept.
+    POOL_CONNECTIONS = 4
+    # Number of connections kept alive for every host.
+    POOL_MAXSIZE = 4
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+        self._policy = NetworkPolicy()
+        self._breakers = {}
+
+    def get_policy(self):
+        return self._policy
+
+    def set_policy(self, policy):
+        with self._lock:
+            self._policy = policy
+            self._breakers = {}
+        return self
+
+    def get_breaker(self, url):
+        host = urlparse.urlparse(url).netloc
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self._policy.failure_threshold,
+                    self._policy.reset_timeout)
+            return self._breakers[host]
+
+    def get_session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS,
+                              pool_maxsize=self.POOL_MAXSIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    def get(self, url, **kwargs):
+        """
+        GET requests are idempotent, so they are retried when the
+        server can't be reached or is temporarily unavailable.
+        """
+        policy = self._policy
+        breaker = self.get_breaker(url)
+        timeout = kwargs.pop('timeout', policy.get_timeout())
+        # requests takes a single timeout for connect and read too.
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        deadline = time.time() + policy.deadline
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenException(urlparse.urlparse(url).netloc)
+            # No attempt may go past the deadline of the whole call,
+            # not even the ones without a timeout of their own.
+            remaining = max(deadline - time.time(), 0.1)
+            kwargs['timeout'] = tuple(remaining if t is None else min(t, remaining)
+                                      for t in timeout)
+            error = None
+            try:
+                r = self.get_session().get(url, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                breaker.record_failure()
+                error = e
+            else:
+                if r.status_code not in policy.RETRY_STATUS:
+                    breaker.record_success()
+                    return r
+                breaker.record_failure()
+
+            delay = policy.get_backoff(attempt)
+            attempt += 1
+            if attempt > policy.retries or time.time() + delay >= deadline:
+                if error is not None:
+                    raise error
+                return r
+            if error is None:
+                # Nobody will read this response, even if it was made
+                # with stream=True: read the (short) error body so the
+                # connection goes back to the pool.
+                r.content
+                r.close()
+            time.sleep(delay)
+
+    def close(self):
+        """
+        Drop every pooled connection. The next request will open a
+        new session.
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -21,100 +21,77 @@ __copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING, RAW, LIST
 
 
-class GCCConf():
-
-    def __init__(self):
-        self._data = {}
-        self._data['uri_gcc'] = ''
-        self._data['gcc_username'] = ''
-        self._data['gcc_nodename'] = ''
-        self._data['gcc_link'] = False
-        self._data['gcc_pwd_user'] = ''
-        self._data['selected_ou'] = ''
-        self._data['run'] = True
-        self._data['ou_username'] = []
-
-    def load_data(self, conf):
-        msg = 'ServerConf: Key "%s" not found in the configuration file.'
-        try:
-            self.set_uri_gcc(conf['uri_gcc'])
-        except KeyError as e:
-            print msg % ('uri_gcc',)
-        try:
-            self.set_gcc_username(conf['gcc_username'])
-        except KeyError as e:
-            print msg % ('gcc_username',)
-        try:
-            self.set_ou_username(conf['ou_username'])
-        except KeyError as e:
-            print msg % ('ou_username',)
-        try:
-            self.set_gcc_link(conf['gcc_link'])
-        except KeyError as e:
-            print msg % ('gcc_link',)
+class GCCConf(ConfRecord):
+
+    FIELDS = (
+        ('uri_gcc', STRING, ''),
+        ('gcc_username', STRING, ''),
+        ('gcc_nodename', STRING, ''),
+        ('gcc_link', RAW, False),
+        ('gcc_pwd_user', STRING, ''),
+        ('selected_ou', RAW, ''),
+        ('run', RAW, True),
+        ('ou_username', LIST, list),
+    )
 
     def validate(self):
-        valid = self._data['run'] == False or (validation.is_url(self._data['uri_gcc']) and self._data['gcc_username'] != '' and self._data['gcc_nodename'] != '' and self._data['gcc_link'] != None and self._data['gcc_pwd_user'] != '' and self._data['ou_username'] != None)
+        valid = self._run == False or (validation.is_url(self._uri_gcc) and self._gcc_username != '' and self._gcc_nodename != '' and self._gcc_link != None and self._gcc_pwd_user != '' and self._ou_username != None)
         return valid
 
     def get_uri_gcc(self):
-        return self._data['uri_gcc'].encode('utf-8')
+        return self._uri_gcc
 
     def set_uri_gcc(self, uri):
-        self._data['uri_gcc'] = uri
-        return self
+        return self._set('uri_gcc', uri)
 
     def get_gcc_username(self):
-        return self._data['gcc_username'].encode('utf-8')
+        return self._gcc_username
 
     def set_gcc_username(self, gcc_username):
-        self._data['gcc_username'] = gcc_username
-        return self
+        return self._set('gcc_username', gcc_username)
 
     def get_gcc_nodename(self):
-        return self._data['gcc_nodename'].encode('utf-8')
+        return self._gcc_nodename
 
     def set_gcc_nodename(self, gcc_nodename):
-        self._data['gcc_nodename'] = gcc_nodename
-        return self
+        return self._set('gcc_nodename', gcc_nodename)
 
     def set_selected_ou(self, selected_ou):
-        self._data['selected_ou'] = selected_ou
-        return self
+        return self._set('selected_ou', selected_ou)
 
     def get_selected_ou(self):
-        return self._data['selected_ou']
+        return self._selected_ou
 
     def get_gcc_link(self):
-        return self._data['gcc_link']
+        return self._gcc_link
 
     def set_gcc_link(self, gcc_link):
-        self._data['gcc_link'] = gcc_link
-        return self
+        return self._set('gcc_link', gcc_link)
 
     def get_gcc_pwd_user(self):
-        return self._data['gcc_pwd_user'].encode('utf-8')
+        return self._gcc_pwd_user
 
     def set_gcc_pwd_user(self, gcc_pwd_user):
-        self._data['gcc_pwd_user'] = gcc_pwd_user
-        return self
+        return self._set('gcc_pwd_user', gcc_pwd_user)
 
     def get_ou_username(self):
-        return self._data['ou_username']
+        return self._ou_username
 
     def set_run(self, run_action):
-        self._data['run'] = run_action
-        return self
+        return self._set('run', run_action)
 
     def get_run(self):
-        return self._data['run']
+        return self._run
     
     def add_ou_username(self, ou_username):
-        self._data['ou_username'].append(ou_username)
+        with self._writing():
+            old = list(self._ou_username)
+            self._ou_username.append(ou_username)
+            self._changed('ou_username', old, self._ou_username)
         return self
 
     def set_ou_username(self, ou_username):
-        self._data['ou_username'] = ou_username
-        return self
+        return self._set('ou_username', ou_username)
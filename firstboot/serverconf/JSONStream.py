@@ -0,0 +1,205 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import codecs
+import json
+
+
+class JSONArrayParser():
+    """
+    Incremental parser of a JSON document whose top level value is an
+    array, or an object with an array in its member key. The data is
+    fed in chunks and every element of the array is returned as soon
+    as it has been completely received, so the whole document never
+    needs to be kept in memory. The other members of the object are
+    kept in members.
+
+    An element is only taken once the delimiter after it has been
+    received, since a number or literal cut at the end of a chunk
+    could go on in the next one.
+
+    If the top level value is neither the parser waits for the whole
+    document and returns it as a single item when closed.
+    """
+
+    WHITESPACE = ' \t\n\r'
+
+    # States
+    START = 'start'
+    ARRAY = 'array'
+    KEY = 'key'
+    COLON = 'colon'
+    VALUE = 'value'
+    WHOLE = 'whole'
+    END = 'end'
+
+    def __init__(self, key=None):
+        self.members = {}
+        self._key = key
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._state = self.START
+        self._member = None
+        self._nested = False
+
+    def _skip(self, chars):
+        while self._pos < len(self._buffer) and \
+                self._buffer[self._pos] in chars:
+            self._pos += 1
+
+    def _at(self, chars):
+        return self._pos < len(self._buffer) and self._buffer[self._pos] in chars
+
+    def _decode(self, delimiters):
+        """
+        Returns a list with the value at the current position if it is
+        complete and followed by one of delimiters, or None.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except ValueError:
+            return None
+        after = end
+        while after < len(self._buffer) and self._buffer[after] in self.WHITESPACE:
+            after += 1
+        if after == len(self._buffer) or self._buffer[after] not in delimiters:
+            return None
+        self._pos = end
+        return [value]
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of data and returns the list of the elements that
+        were completed by it.
+        """
+        if isinstance(chunk, unicode):
+            self._buffer += chunk
+        else:
+            self._buffer += self._text.decode(chunk)
+
+        items = []
+        while self._step(items):
+            pass
+
+        # Drop the data that was already parsed.
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        return items
+
+    def _step(self, items):
+        """
+        Parses the next token, returns False if more data is needed.
+        """
+        state = self._state
+        if state in (self.WHOLE, self.END):
+            return False
+        self._skip(self.WHITESPACE)
+        if self._pos == len(self._buffer):
+            return False
+
+        if state == self.START:
+            if self._at('['):
+                self._state = self.ARRAY
+            elif self._at('{') and self._key is not None:
+                self._state = self.KEY
+            else:
+                self._state = self.WHOLE
+                return False
+            self._pos += 1
+
+        elif state == self.ARRAY:
+            if self._at(','):
+                self._pos += 1
+            elif self._at(']'):
+                self._pos += 1
+                self._state = self.KEY if self._nested else self.END
+            else:
+                value = self._decode(',]')
+                if value is None:
+                    return False
+                items.extend(value)
+
+        elif state == self.KEY:
+            if self._at(','):
+                self._pos += 1
+            elif self._at('}'):
+                self._pos += 1
+                self._state = self.END
+            else:
+                value = self._decode(':')
+                if value is None:
+                    return False
+                self._member = value[0]
+                self._state = self.COLON
+
+        elif state == self.COLON:
+            if not self._at(':'):
+                raise ValueError('Expected ":" after %r' % (self._member,))
+            self._pos += 1
+            self._state = self.VALUE
+
+        elif state == self.VALUE:
+            if self._member == self._key and self._at('['):
+                self._pos += 1
+                self._nested = True
+                self._state = self.ARRAY
+            else:
+                value = self._decode(',}')
+                if value is None:
+                    return False
+                self.members[self._member] = value[0]
+                self._state = self.KEY
+        return True
+
+    def close(self):
+        """
+        Returns the elements still pending once all the data was fed.
+        Raises ValueError if the document is not complete.
+        """
+        self._buffer += self._text.decode('', True)
+        if self._state == self.WHOLE:
+            return [json.loads(self._buffer)]
+        items = self.feed(u'')
+        if self._state == self.START:
+            # Empty document
+            return [json.loads(self._buffer)]
+        if self._state != self.END:
+            raise ValueError('Incomplete JSON document')
+        return items
+
+
+def iter_json_array(chunks, key=None, members=None):
+    """
+    Yields the elements of the JSON array received in chunks, or of
+    the array in the member key of the object received. The other
+    members are put in the members dict if one is given.
+    """
+    parser = JSONArrayParser(key)
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
+    if members is not None:
+        members.update(parser.members)
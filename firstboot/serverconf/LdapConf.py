@@ -21,80 +21,50 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING
 
 
-class LdapConf():
-
-    def __init__(self):
-        self._data = {}
-        self._data['uri'] = ''
-        self._data['base'] = ''
-        self._data['basegroup'] = ''
-        self._data['binddn'] = ''
-        self._data['bindpwd'] = ''
-
-    def load_data(self, conf):
-        msg = 'ServerConf: Key "%s" not found in the configuration file.'
-        try:
-            self.set_url(conf['uri'])
-        except KeyError as e:
-            print msg % ('uri',)
-        try:
-            self.set_basedn(conf['base'])
-        except KeyError as e:
-            print msg % ('base',)
-        try:
-            self.set_basedngroup(conf['basegroup'])
-        except KeyError as e:
-            print msg % ('basegroup',)
-        try:
-            self.set_binddn(conf['binddn'])
-        except KeyError as e:
-            print msg % ('binddn',)
-        try:
-            self.set_password(conf['bindpwd'])
-        except KeyError as e:
-            print msg % ('bindpwd',)
+class LdapConf(ConfRecord):
+
+    FIELDS = (
+        ('uri', STRING, ''),
+        ('base', STRING, ''),
+        ('basegroup', STRING, ''),
+        ('binddn', STRING, ''),
+        ('bindpwd', STRING, ''),
+    )
 
     def validate(self):
-        valid = validation.is_url(self._data['uri']) \
-            and not validation.is_empty(self._data['base'])
+        valid = validation.is_url(self._uri) \
+            and not validation.is_empty(self._base)
         return valid
 
     def get_url(self):
-        return self._data['uri'].encode('utf-8')
+        return self._uri
 
     def set_url(self, url):
-        self._data['uri'] = url
-        return self
+        return self._set('uri', url)
 
     def get_basedngroup(self):
-        return self._data['basegroup'].encode('utf-8')
+        return self._basegroup
 
     def set_basedngroup(self, basedngroup):
-        self._data['basegroup'] = basedngroup
-        return self
+        return self._set('basegroup', basedngroup)
 
     def get_basedn(self):
-        return self._data['base'].encode('utf-8')
+        return self._base
 
     def set_basedn(self, basedn):
-        self._data['base'] = basedn
-        return self
+        return self._set('base', basedn)
 
     def get_binddn(self):
-        return self._data['binddn'].encode('utf-8')
+        return self._binddn
 
     def set_binddn(self, binddn):
-        self._data['binddn'] = binddn
-        return self
+        return self._set('binddn', binddn)
 
     def get_password(self):
-        return self._data['bindpwd'].encode('utf-8')
+        return self._bindpwd
 
     def set_password(self, password):
-        self._data['bindpwd'] = password
-        return self
-
-    def __str__(self):
-        return str(self._data)
+        return self._set('bindpwd', password)
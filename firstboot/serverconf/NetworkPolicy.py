@@ -0,0 +1,124 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import random
+import threading
+import time
+
+from requests.exceptions import ConnectionError
+
+
+class NetworkPolicy():
+    """
+    Deadlines and retries applied to every request made by GCCClient.
+
+    connect_timeout and read_timeout are passed to requests. Idempotent
+    requests failing with a connection error, a timeout or one of
+    RETRY_STATUS are retried up to `retries` times, waiting an
+    exponential backoff with full jitter, as long as the whole call
+    doesn't take longer than `deadline` seconds.
+
+    After `failure_threshold` consecutive failures against a host its
+    circuit is opened and the next requests fail immediately during
+    `reset_timeout` seconds.
+    """
+
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, connect_timeout=5, read_timeout=15, retries=2,
+                 backoff_base=0.5, backoff_max=4, deadline=30,
+                 failure_threshold=3, reset_timeout=30):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def get_timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def get_backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, delay)
+
+    def __str__(self):
+        return str(self.__dict__)
+
+
+class CircuitOpenException(ConnectionError):
+    '''
+    Raised when a request is not sent because its host is known to
+    be down.
+    '''
+
+    def __init__(self, host):
+        ConnectionError.__init__(self,
+            'The server %s is not reachable, try again later.' % (host,))
+
+
+class CircuitBreaker():
+    """
+    Failure counter of a host. It's closed while the host answers,
+    opened after too many consecutive failures and half-opened (a
+    single trial request is allowed) once the reset timeout expires.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    def get_state(self):
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and \
+                    time.time() - self._opened_at >= self._reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or \
+                    self._failures >= self._failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.time()
@@ -0,0 +1,195 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class NodeIndex():
+    """
+    Local index of the workstations and OUs of a GECOS Control Center
+    as seen by a user, stored under `cache_dir` in a file named after
+    the GCC URL and the username.
+
+    The names are kept sorted so a prefix lookup is a binary search;
+    substring matches are looked up afterwards. The index is considered
+    stale `ttl` seconds after its last refresh, but it can still be
+    searched while a new copy is downloaded.
+    """
+
+    def __init__(self, uri_gcc, cache_dir, ttl=3600, username=None):
+        self._uri = uri_gcc
+        self._username = username
+        key = '%s\0%s' % (uri_gcc, username or '')
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        self._path = os.path.join(cache_dir, hashlib.sha1(key).hexdigest() + '.json')
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._updated = 0
+        self._keys = []
+        self._nodes = []
+        self._ou_keys = []
+        self._ous = []
+        self._refresh_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            fp = open(self._path, 'r')
+            data = json.loads(fp.read())
+            fp.close()
+            if data['uri'] != self._uri or data['username'] != self._username:
+                return
+            self._set_nodes(data['nodes'])
+            self._set_ous(data['ous'])
+            self._updated = data['updated']
+        except (IOError, ValueError, KeyError) as e:
+            logger.warning('Can not read the node index %s: %s' % (self._path, e))
+
+    def save(self):
+        with self._lock:
+            data = {
+                'uri': self._uri,
+                'username': self._username,
+                'updated': self._updated,
+                'nodes': self._nodes,
+                'ous': self._ous
+            }
+        try:
+            cache_dir = os.path.dirname(self._path)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            (fd, tmppath) = tempfile.mkstemp(dir=cache_dir)
+            fp = os.fdopen(fd, 'w')
+            fp.write(json.dumps(data))
+            fp.close()
+            os.rename(tmppath, self._path)
+        except (IOError, OSError) as e:
+            # The index keeps working from memory.
+            logger.warning('Can not write the node index %s: %s' % (self._path, e))
+
+    def _set_nodes(self, nodes):
+        nodes = sorted(nodes, key=lambda node: node[0].lower())
+        with self._lock:
+            self._nodes = nodes
+            self._keys = [node[0].lower() for node in nodes]
+
+    def _set_ous(self, ous):
+        ous = sorted(ous, key=lambda ou: ou[1].lower())
+        with self._lock:
+            self._ous = ous
+            self._ou_keys = [ou[1].lower() for ou in ous]
+
+    def get_updated(self):
+        return self._updated
+
+    def is_fresh(self):
+        return time.time() - self._updated < self._ttl
+
+    def is_refreshing(self):
+        return self._refresh_lock.locked()
+
+    def has_nodes(self):
+        return len(self._nodes) > 0
+
+    def update_nodes(self, nodes):
+        """
+        Replaces the workstations with nodes, an iterable of dicts with
+        the "name" and "node_chef_id" keys.
+        """
+        self._set_nodes([[n['name'], n['node_chef_id']] for n in nodes])
+        self._updated = time.time()
+        self.save()
+        return self
+
+    def update_ous(self, ous):
+        """
+        Replaces the OUs with ous, a list of [id, name] pairs.
+        """
+        ous = sorted([list(ou) for ou in ous], key=lambda ou: ou[1].lower())
+        if ous != self._ous:
+            self._set_ous(ous)
+            self.save()
+        return self
+
+    def refresh(self, fetch_nodes):
+        """
+        Downloads the workstations again with fetch_nodes(). If another
+        refresh is already running it waits for it instead of doing
+        the same download twice. Returns True if the index was
+        refreshed by this call.
+        """
+        updated = self._updated
+        with self._refresh_lock:
+            if self._updated != updated:
+                return False
+            self.update_nodes(fetch_nodes())
+        return True
+
+    def _match(self, rows, keys, text, limit):
+        text = text.lower()
+        matches = []
+        if len(text) == 0:
+            return rows[:limit]
+        start = bisect.bisect_left(keys, text)
+        end = start
+        while end < len(keys) and keys[end].startswith(text):
+            end += 1
+        matches = rows[start:end]
+        if limit is not None and len(matches) >= limit:
+            return matches[:limit]
+        for i in xrange(len(keys)):
+            if (i < start or i >= end) and text in keys[i]:
+                matches.append(rows[i])
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def search_nodes(self, text, limit=None):
+        """
+        Returns the workstations whose name starts with text followed
+        by the ones containing it, as dicts like the GCC node list.
+        """
+        with self._lock:
+            nodes, keys = self._nodes, self._keys
+        return [{'name': n[0], 'node_chef_id': n[1]}
+                for n in self._match(nodes, keys, text or '', limit)]
+
+    def search_ous(self, text, limit=None):
+        """
+        Returns the [id, name] pairs of the OUs whose name starts with
+        text followed by the ones containing it.
+        """
+        with self._lock:
+            ous, keys = self._ous, self._ou_keys
+        return self._match(ous, keys, text or '', limit)
@@ -0,0 +1,217 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import glob
+import grp
+import os
+import pwd
+import shutil
+import subprocess
+import tempfile
+from distutils.spawn import find_executable
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class PartiallyAppliedException(Exception):
+    """
+    Raised by ResourceApplier.apply() when it fails after changing
+    the system. remaining is the part of the resource still to be
+    applied, by chef-solo.
+    """
+
+    def __init__(self, remaining, error):
+        Exception.__init__(self, str(error))
+        self.remaining = remaining
+        self.error = error
+
+
+class ResourceApplier():
+    """
+    Applies a gecos_ws_mgmt resource from Python, doing what its
+    provider in the gecos_ws_mgmt cookbook does, so simple changes
+    don't need a chef-solo run.
+
+    Subclasses set section and name to the resource they handle and
+    implement apply(), raising an exception on failure. A failure
+    must leave the system as it was, otherwise apply() raises a
+    PartiallyAppliedException with what is left. The resources with
+    job_ids are left to chef-solo, whose provider reports the status
+    of the jobs.
+    """
+
+    section = None
+    name = None
+    # Commands the applier runs. Without them chef-solo is used, since
+    # its provider installs the packages first (e.g. ntpdate is not
+    # installed on a fresh system).
+    commands = []
+
+    def can_apply(self, res):
+        if res.get('job_ids'):
+            return False
+        return all(find_executable(command) for command in self.commands)
+
+    def apply(self, res):
+        raise NotImplementedError()
+
+    def _run(self, args):
+        logger.info('Running %s' % (' '.join(args),))
+        subprocess.check_call(args)
+
+
+class TzDateApplier(ResourceApplier):
+    """
+    gecos_ws_mgmt_tz_date: syncs the clock with the NTP server and
+    saves it in /etc/default/ntpdate.
+    """
+
+    section = 'misc_mgmt'
+    name = 'tz_date_res'
+    commands = ['ntpdate-debian']
+
+    NTPDATE = '/etc/default/ntpdate'
+
+    # templates/default/ntpdate.erb
+    TEMPLATE = """# The settings in this file are used by the program ntpdate-debian, but not
+# by the upstream program ntpdate.
+
+# Set to "yes" to take the server list from /etc/ntp.conf, from package ntp,
+# so you only have to keep it in one place.
+NTPDATE_USE_NTP_CONF=yes
+
+# List of NTP servers to use  (Separate multiple servers with spaces.)
+# Not used if NTPDATE_USE_NTP_CONF is yes.
+NTPSERVERS="%s"
+
+# Additional options to pass to ntpdate
+NTPOPTIONS=\"\""""
+
+    def apply(self, res):
+        # Syncing the clock doesn't change the configuration, and the
+        # file is replaced at once: a failure changes nothing.
+        server = res.get('server')
+        if not server:
+            return
+        self._run(['ntpdate-debian', '-u', server])
+        content = self.TEMPLATE % (server,)
+        if os.path.exists(self.NTPDATE):
+            fp = open(self.NTPDATE, 'r')
+            current = fp.read()
+            fp.close()
+            if current == content:
+                return
+        (fd, tmppath) = tempfile.mkstemp(dir=os.path.dirname(self.NTPDATE))
+        try:
+            fp = os.fdopen(fd, 'w')
+            fp.write(content)
+            fp.close()
+            os.chmod(tmppath, 0644)
+            os.rename(tmppath, self.NTPDATE)
+        except:
+            os.remove(tmppath)
+            raise
+
+
+class LocalUsersApplier(ResourceApplier):
+    """
+    gecos_ws_mgmt_local_users: creates, modifies or removes the local
+    users of users_list.
+    """
+
+    section = 'misc_mgmt'
+    name = 'local_users_res'
+    commands = ['useradd', 'usermod', 'userdel', 'gpasswd']
+
+    SKEL = '/etc/skel'
+
+    def _exists(self, username):
+        try:
+            pwd.getpwnam(username)
+            return True
+        except KeyError:
+            return False
+
+    def _group_exists(self, group):
+        try:
+            grp.getgrnam(group)
+            return True
+        except KeyError:
+            return False
+
+    def apply(self, res):
+        users = res.get('users_list', [])
+        for (done, user) in enumerate(users):
+            try:
+                self._apply_user(user)
+            except Exception as e:
+                if done == 0:
+                    raise
+                # The users managed so far are not done again.
+                remaining = dict(res)
+                remaining['users_list'] = users[done:]
+                raise PartiallyAppliedException(remaining, e)
+
+    def _apply_user(self, user):
+        username = user['user']
+        if user.get('actiontorun') == 'delete':
+            logger.info('Removing local user %s' % (username,))
+            if self._exists(username):
+                self._run(['userdel', username])
+        else:
+            logger.info('Managing local user %s' % (username,))
+            self._set_user(user)
+
+    def _set_user(self, user):
+        username = user['user']
+        home = '/home/' + username
+        options = ['-c', user.get('name') or '', '-d', home, '-s', '/bin/bash']
+        if user.get('password'):
+            options += ['-p', user['password']]
+        if self._exists(username):
+            self._run(['usermod'] + options + [username])
+        else:
+            self._run(['useradd'] + options + [username])
+
+        if not os.path.isdir(home):
+            self._create_home(username, home)
+
+        for group in user.get('groups', []):
+            if self._group_exists(group):
+                self._run(['gpasswd', '-a', username, group])
+            else:
+                logger.info('Group %s does not exist, ignoring..' % (group,))
+
+    def _create_home(self, username, home):
+        entry = pwd.getpwnam(username)
+        gid = entry.pw_gid
+        if self._group_exists(username):
+            gid = grp.getgrnam(username).gr_gid
+        os.makedirs(home)
+        # Only the dot files of the skeleton, like the provider does.
+        for path in glob.glob(os.path.join(self.SKEL, '.*')):
+            if os.path.isfile(path):
+                shutil.copy(path, home)
+        for dirpath, dirnames, filenames in os.walk(home):
+            for name in [dirpath] + [os.path.join(dirpath, f) for f in filenames]:
+                os.chown(name, entry.pw_uid, gid)
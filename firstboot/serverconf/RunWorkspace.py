@@ -0,0 +1,116 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class RunWorkspace():
+    """
+    Private directory for the files of a chef-solo run: solo JSON,
+    solo.rb and the configuration files given to the recipes.
+
+    The directory is created in the first usable of base_dirs, tmpfs
+    ones first, so secrets don't hit the disk. Files are named by the
+    hash of their content and written atomically, so the same content
+    is only written once. Everything is removed by cleanup(), also
+    when used as a context manager:
+
+        with RunWorkspace() as workspace:
+            path = workspace.write_json(json_solo)
+            ...
+    """
+
+    BASE_DIRS = ['/dev/shm', '/run', '/tmp']
+    PREFIX = 'gecosws-run-'
+
+    def __init__(self, base_dirs=None):
+        self._base_dirs = base_dirs or self.BASE_DIRS
+        self._path = None
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+
+    def get_path(self):
+        """
+        Returns the workspace directory, creating it on first use.
+        """
+        if self._path is None:
+            for base_dir in self._base_dirs:
+                if os.path.isdir(base_dir) and os.access(base_dir, os.W_OK):
+                    # mkdtemp makes it private (0700).
+                    self._path = tempfile.mkdtemp(prefix=self.PREFIX, dir=base_dir)
+                    break
+            else:
+                raise IOError('No directory to create the run workspace in')
+        return self._path
+
+    def write(self, content, suffix=''):
+        """
+        Writes content and returns its path. If the same content was
+        already written with this suffix, the path is returned at once.
+        """
+        name = hashlib.sha256(content).hexdigest() + suffix
+        with self._lock:
+            path = os.path.join(self.get_path(), name)
+            if not os.path.exists(path):
+                (fd, tmppath) = tempfile.mkstemp(dir=self._path, prefix='.')
+                fp = os.fdopen(fd, 'wb')
+                fp.write(content)
+                fp.close()
+                os.rename(tmppath, path)
+        return path
+
+    def write_json(self, data, suffix='.json'):
+        return self.write(json.dumps(data, indent=2, sort_keys=True), suffix)
+
+    def write_base64(self, encoded, suffix=''):
+        """
+        Writes the decoded content of a base64 blob. The same blob is
+        only decoded once.
+        """
+        key = (hashlib.sha256(encoded).hexdigest(), suffix)
+        path = self._blobs.get(key)
+        if path is None or not os.path.exists(path):
+            path = self.write(encoded.decode('base64'), suffix)
+            self._blobs[key] = path
+        return path
+
+    def cleanup(self):
+        with self._lock:
+            if self._path is not None:
+                shutil.rmtree(self._path, True)
+                self._path = None
+            self._blobs = {}
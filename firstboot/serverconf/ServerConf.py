@@ -21,16 +21,24 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 
+import threading
+import types
+
 import firstboot.serverconf
 from ChefConf import ChefConf
 from GCCConf import GCCConf
 from AuthConf import AuthConf
 from DateSyncConf import DateSyncConf
 from UsersConf import UsersConf
+from ChangeJournal import ChangeJournal
+from AutoconfSchema import AUTOCONF_LOADER
+
+import logging
+logger = logging.getLogger('firstboot')
 
 class Singleton:
     """
-    A non-thread-safe helper class to ease implementing singletons.
+    A helper class to ease implementing singletons.
     This should be used as a decorator -- not a metaclass -- to the
     class that should be a singleton.
 
@@ -47,6 +55,7 @@ class Singleton:
 
     def __init__(self, decorated):
         self._decorated = decorated
+        self._lock = threading.Lock()
 
     def Instance(self):
         """
@@ -58,7 +67,9 @@ class Singleton:
         try:
             return self._instance
         except AttributeError:
-            self._instance = self._decorated()
+            with self._lock:
+                if not hasattr(self, '_instance'):
+                    self._instance = self._decorated()
             return self._instance
 
     def __call__(self):
@@ -68,50 +79,134 @@ class Singleton:
         return isinstance(inst, self._decorated)
 
 
-@Singleton
 class ServerConf():
+    """
+    Configuration of the workstation. There is one per
+    ServerConfSession, get it with serverconf.get_server_conf().
+
+    Every change is made holding lock(), the writing() lock of its
+    journal, which is also held while copies and snapshots are taken.
+    Changes made from several threads should be grouped holding it.
+    """
 
     # Version of the configuration JSON file
 
+    # Section of the change journal -> attribute of its record. The
+    # version and organization are the 'server' section.
+    SECTIONS = {
+        'chef': '_chef_conf',
+        'gcc': '_gcc_conf',
+        'auth': '_auth_conf',
+        'ntp': '_ntp_conf',
+        'users': '_users_conf',
+    }
+    SERVER = 'server'
+
+    # Snapshots taken before and after loading the autoconf JSON
+    DEFAULTS = 'defaults'
+    AUTOCONF = 'autoconf'
+
     def __init__(self):
         self._data = {}
         self.VERSION = '0.2.0'
         self._data['version'] = self.VERSION
         self._data['organization'] = ''
-        self._chef_conf = ChefConf()
-        self._gcc_conf = GCCConf()
-        self._auth_conf = AuthConf()
-        self._ntp_conf = DateSyncConf()
-        self._users_conf = UsersConf()
+        self._journal = ChangeJournal()
+        # The records take it when they change.
+        self._lock = self._journal.writing()
+        self._chef_conf = ChefConf().attach(self._journal, 'chef')
+        self._gcc_conf = GCCConf().attach(self._journal, 'gcc')
+        self._auth_conf = AuthConf().attach(self._journal, 'auth')
+        self._ntp_conf = DateSyncConf().attach(self._journal, 'ntp')
+        self._users_conf = UsersConf().attach(self._journal, 'users')
+        # name -> {section: state}
+        self._snapshots = {}
+        # section -> (version, state) of its last snapshot
+        self._states = {}
+        self.save_snapshot(self.DEFAULTS)
+        self.save_snapshot(self.AUTOCONF)
 
     def load_data(self, conf):
-        msg = 'ServerConf: Key "%s" not found in the configuration file.'
-        try:
-            v = conf['version']
-            if v != self.VERSION:
-                print 'WARNING: ServerConf and AUTOCONFIG_JSON version mismatch!'
-        except KeyError as e:
-            print msg % ('version',)
-        try:
-            self.set_organization(conf['organization'])
-        except KeyError as e:
-            print msg % ('organization',)
-        try:
-            self._chef_conf.load_data(conf['chef'])
-        except KeyError as e:
-            print msg % ('chef',)
-        try:
-            self._gcc_conf.load_data(conf['gcc'])
-        except KeyError as e:
-            print msg % ('gcc',)
-        try:
-            self._auth_conf.load_data(conf['auth'])
-        except KeyError as e:
-            print msg % ('auth',)
-        try:
-            self._ntp_conf.load_data(conf['uri_ntp'])
-        except KeyError as e:
-            print msg % ('ntp',)
+        """
+        Loads the autoconf JSON and returns what is wrong with it, see
+        AutoconfSchema.
+        """
+        with self._lock:
+            errors = AUTOCONF_LOADER.load(conf, self)
+        for error in errors:
+            logger.warning('ServerConf: %s' % (error['message'],))
+        return errors
+
+    def lock(self):
+        return self._lock
+
+    def copy(self):
+        """
+        Returns a copy with its own journal and the same snapshots.
+        """
+        # Nothing of a new configuration would be kept, __init__ is
+        # not called.
+        server_conf = types.InstanceType(self.__class__)
+        server_conf.VERSION = self.VERSION
+        server_conf._journal = ChangeJournal()
+        server_conf._lock = server_conf._journal.writing()
+        with self._lock:
+            server_conf._data = dict(self._data)
+            for section, name in self.SECTIONS.items():
+                record = getattr(self, name).copy().attach(server_conf._journal, section)
+                setattr(server_conf, name, record)
+            server_conf._snapshots = dict(self._snapshots)
+            server_conf._states = {}
+        return server_conf
+
+    def save_snapshot(self, name):
+        """
+        Keeps the current configuration as name. The sections that
+        didn't change since the last snapshot share its state, so
+        taking a snapshot is cheap.
+        """
+        snapshot = {}
+        with self._lock:
+            for section in self.SECTIONS.keys() + [self.SERVER]:
+                version = self._journal.get_version(section)
+                cached = self._states.get(section)
+                if cached is None or cached[0] != version:
+                    if section == self.SERVER:
+                        state = dict(self._data)
+                    else:
+                        state = getattr(self, self.SECTIONS[section]).snapshot()
+                    cached = (version, state)
+                    self._states[section] = cached
+                snapshot[section] = cached[1]
+            self._snapshots[name] = snapshot
+        return self
+
+    def has_snapshot(self, name):
+        return name in self._snapshots
+
+    def restore_snapshot(self, name, sections=None):
+        """
+        Brings sections, or all of them, back to the snapshot name.
+        Only the fields that differ are set, in the current records,
+        and recorded in the journal.
+        """
+        snapshot = self._snapshots[name]
+        if sections is None:
+            sections = snapshot.keys()
+        with self._lock:
+            for section in sections:
+                state = snapshot[section]
+                if section == self.SERVER:
+                    for key, value in state.items():
+                        self._set_data(key, value)
+                    continue
+                record = getattr(self, self.SECTIONS[section])
+                if type(record) is state.cls:
+                    record.restore(state)
+                else:
+                    self._set_section(self.SECTIONS[section], section,
+                                      state.cls.from_snapshot(state))
+        return self
 
     def validate(self):
         valid = len(self._data['version']) > 0 \
@@ -124,16 +219,35 @@ class ServerConf():
     def get_version(self):
         return self._data['version'].encode('utf-8')
 
-    def set_version(self, version):
-        self._data['version'] = version
+    def get_journal(self):
+        return self._journal
+
+    def _set_data(self, name, value):
+        with self._lock:
+            old = self._data[name]
+            self._data[name] = value
+            if old != value:
+                self._journal.record('server', name, old, value)
         return self
 
+    def _set_section(self, name, section, conf):
+        with self._lock:
+            old = getattr(self, name)
+            setattr(self, name, conf)
+            if old is not conf:
+                old.attach(None, None)
+                conf.attach(self._journal, section)
+                if old != conf:
+                    self._journal.record(section, None, old.to_dict(), conf.to_dict())
+
+    def set_version(self, version):
+        return self._set_data('version', version)
+
     def get_organization(self):
         return self._data['organization'].encode('utf-8')
 
     def set_organization(self, organization):
-        self._data['organization'] = organization
-        return self
+        return self._set_data('organization', organization)
 
     def get_auth_conf(self):
         return self._auth_conf
@@ -151,21 +265,21 @@ class ServerConf():
         return self._users_conf
 
     def set_auth_conf(self, auth_conf):
-        self._auth_conf = auth_conf
+        self._set_section('_auth_conf', 'auth', auth_conf)
         return self
 
     def set_chef_conf(self, chef_conf):
-        self._chef_conf = chef_conf
+        self._set_section('_chef_conf', 'chef', chef_conf)
         return self
 
     def set_ntp_conf(self, ntp_conf):
-        self._ntp_conf = ntp_conf
+        self._set_section('_ntp_conf', 'ntp', ntp_conf)
         return self
 
     def set_gcc_conf(self, gcc_conf):
-        self._gcc_conf = gcc_conf
+        self._set_section('_gcc_conf', 'gcc', gcc_conf)
         return gcc_conf
 
     def set_users_conf(self, user_conf):
-        self._users_conf = user_conf
+        self._set_section('_users_conf', 'users', user_conf)
         return self
@@ -0,0 +1,120 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import threading
+
+from ServerConf import ServerConf
+
+
+class ServerConfSession():
+    """
+    Scope of a ServerConf.
+
+    The assistant uses the default session. Tests and headless runs
+    can create their own sessions and make one current for the calling
+    thread:
+
+        with ServerConfSession() as session:
+            serverconf.get_server_conf(content)
+            ...
+
+    Background workers should read a copy(), a consistent view of the
+    configuration that the UI can keep editing meanwhile. A worker
+    started from a session runs in it with run().
+    """
+
+    _DEFAULT = None
+    _DEFAULT_LOCK = threading.Lock()
+    _local = threading.local()
+
+    def __init__(self):
+        self._server_conf = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._get_stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._get_stack().remove(self)
+        return False
+
+    def run(self, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs) with the session current, e.g.
+        in a worker thread, and returns what it returns.
+        """
+        with self:
+            return func(*args, **kwargs)
+
+    def get_server_conf(self):
+        """
+        Returns the ServerConf of the session, created on first use.
+        """
+        server_conf = self._server_conf
+        if server_conf is None:
+            with self._lock:
+                if self._server_conf is None:
+                    self._server_conf = ServerConf()
+                server_conf = self._server_conf
+        return server_conf
+
+    def copy(self):
+        """
+        Returns a copy of the ServerConf of the session, taken with it
+        locked, and the journal version it was taken at.
+        """
+        server_conf = self.get_server_conf()
+        with server_conf.lock():
+            return (server_conf.copy(), server_conf.get_journal().get_version())
+
+    def reset(self):
+        """
+        Drops the ServerConf of the session, a new one is created on
+        next use.
+        """
+        with self._lock:
+            self._server_conf = None
+
+    @classmethod
+    def _get_stack(cls):
+        if not hasattr(cls._local, 'stack'):
+            cls._local.stack = []
+        return cls._local.stack
+
+    @classmethod
+    def get_default(cls):
+        with cls._DEFAULT_LOCK:
+            if cls._DEFAULT is None:
+                cls._DEFAULT = cls()
+            return cls._DEFAULT
+
+    @classmethod
+    def current(cls):
+        """
+        Returns the session of the calling thread: the last one
+        entered, or the default one.
+        """
+        stack = cls._get_stack()
+        if stack:
+            return stack[-1]
+        return cls.get_default()
@@ -0,0 +1,201 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import os
+import re
+
+import logging
+logger = logging.getLogger('firstboot')
+
+
+class SoloJSONValidator():
+    """
+    Checks a solo JSON document before chef-solo is run with it.
+
+    The attribute types of every gecos_ws_mgmt resource are read from
+    its definition in the cookbook (resources/<name>.rb). On top of
+    them, the rules the providers rely on but don't declare are
+    checked: required values, the domain of sssd_res, the entries of
+    users_list and the files the recipes read.
+
+    validate() returns every problem found, as messages of the form
+    "misc_mgmt.gcc_res.gcc_link: ...".
+    """
+
+    ROOT = 'gecos_ws_mgmt'
+
+    # JSON resource -> resources/<file>.rb
+    RESOURCE_FILES = {
+        'chef_conf_res': 'chef',
+    }
+
+    RUBY_TYPES = {
+        'String': (basestring,),
+        'TrueClass': (bool,),
+        'FalseClass': (bool,),
+        'Array': (list,),
+        'Hash': (dict,),
+        'Integer': (int, long),
+        'Fixnum': (int, long),
+    }
+
+    TYPE_NAMES = {basestring: 'string', bool: 'boolean', list: 'array',
+                  dict: 'object', int: 'integer', long: 'integer'}
+
+    RE_ATTRIBUTE = re.compile(r'^\s*attribute\s+:(\w+)\s*(?:,(.*))?$', re.M)
+    RE_KIND_OF = re.compile(r':kind_of\s*=>\s*(\[[^\]]*\]|\w+)')
+    RE_NAME_ATTRIBUTE = re.compile(r':name_attribute\s*=>\s*true')
+
+    USER_ACTIONS = ['create', 'modify', 'delete', '']
+
+    def __init__(self, resources_dir):
+        self._resources_dir = resources_dir
+        self._definitions = {}
+
+    def get_definition(self, resource):
+        """
+        Returns the attributes of resource as a dict of
+        name: (types, is_name_attribute), or None if it has no
+        definition.
+        """
+        if resource not in self._definitions:
+            name = self.RESOURCE_FILES.get(resource, re.sub(r'_res$', '', resource))
+            path = os.path.join(self._resources_dir, name + '.rb')
+            definition = None
+            if os.path.exists(path):
+                fp = open(path, 'r')
+                definition = self._parse(fp.read())
+                fp.close()
+            self._definitions[resource] = definition
+        return self._definitions[resource]
+
+    def _parse(self, content):
+        attributes = {}
+        for match in self.RE_ATTRIBUTE.finditer(content):
+            options = match.group(2) or ''
+            types = None
+            kind_of = self.RE_KIND_OF.search(options)
+            if kind_of:
+                names = re.findall(r'\w+', kind_of.group(1))
+                if all(name in self.RUBY_TYPES for name in names):
+                    types = sum([self.RUBY_TYPES[name] for name in names], ())
+            attributes[match.group(1)] = (types, self.RE_NAME_ATTRIBUTE.search(options) is not None)
+        return attributes
+
+    def validate(self, json_solo, check_files=True):
+        errors = []
+        run_list = json_solo.get('run_list')
+        if not isinstance(run_list, list) or len(run_list) == 0 or \
+                not all(isinstance(item, basestring) for item in run_list):
+            errors.append('run_list: must be a non empty list of recipes')
+        root = json_solo.get(self.ROOT)
+        if not isinstance(root, dict):
+            errors.append('%s: missing' % (self.ROOT,))
+            return errors
+        for section, resources in sorted(root.items()):
+            if not isinstance(resources, dict):
+                errors.append('%s: must be an object' % (section,))
+                continue
+            for resource, res in sorted(resources.items()):
+                path = '%s.%s' % (section, resource)
+                if not isinstance(res, dict):
+                    errors.append('%s: must be an object' % (path,))
+                    continue
+                self._check_types(path, resource, res, errors)
+                check = getattr(self, '_check_' + resource, None)
+                if check is not None:
+                    check(path, res, errors, check_files)
+        return errors
+
+    def _check_types(self, path, resource, res, errors):
+        definition = self.get_definition(resource)
+        if definition is None:
+            return
+        for name, (types, name_attribute) in sorted(definition.items()):
+            value = res.get(name)
+            if name_attribute and not value:
+                errors.append('%s.%s: is required' % (path, name))
+            elif value is not None and types is not None and not isinstance(value, types):
+                errors.append('%s.%s: %r is not a %s' % (path, name, value,
+                    ' or '.join(sorted(set(self.TYPE_NAMES[t] for t in types)))))
+
+    def _require(self, path, res, names, errors):
+        for name in names:
+            value = res.get(name)
+            if value is None or (isinstance(value, basestring) and not value.strip()):
+                errors.append('%s.%s: is required' % (path, name))
+
+    def _check_file(self, path, name, value, errors):
+        if isinstance(value, basestring) and value.startswith('file://'):
+            value = value[len('file://'):]
+        if not isinstance(value, basestring) or not os.path.isfile(value):
+            errors.append('%s.%s: file %s not found' % (path, name, value))
+
+    def _check_chef_conf_res(self, path, res, errors, check_files):
+        if res.get('chef_link') or res.get('chef_link_existing'):
+            self._require(path, res, ['chef_node_name'], errors)
+        if res.get('chef_link'):
+            self._require(path, res, ['chef_validation_pem'], errors)
+            if check_files and res.get('chef_validation_pem'):
+                self._check_file(path, 'chef_validation_pem', res['chef_validation_pem'], errors)
+
+    def _check_gcc_res(self, path, res, errors, check_files):
+        if res.get('gcc_link'):
+            self._require(path, res, ['gcc_nodename', 'gcc_username'], errors)
+
+    def _check_sssd_res(self, path, res, errors, check_files):
+        domain = res.get('domain')
+        if not isinstance(domain, dict):
+            errors.append('%s.domain: is required' % (path,))
+            return
+        if not res.get('enabled'):
+            return
+        domain_path = path + '.domain'
+        self._require(domain_path, domain, ['type', 'name'], errors)
+        if domain.get('type') == 'ad':
+            self._require(domain_path, domain, ['ad_user', 'ad_passwd'], errors)
+            for name in ['krb5_url', 'smb_url', 'sssd_url', 'mkhomedir_url']:
+                if check_files and res.get(name) is not None:
+                    self._check_file(path, name, res[name], errors)
+        elif domain.get('type') == 'ldap':
+            self._require(domain_path, domain, ['ldap_uri', 'search_base'], errors)
+
+    def _check_local_users_res(self, path, res, errors, check_files):
+        users = res.get('users_list')
+        if not isinstance(users, list):
+            return
+        for i, user in enumerate(users):
+            user_path = '%s.users_list[%d]' % (path, i)
+            if not isinstance(user, dict):
+                errors.append('%s: must be an object' % (user_path,))
+                continue
+            self._require(user_path, user, ['user'], errors)
+            for name in ['user', 'name', 'password', 'actiontorun']:
+                if user.get(name) is not None and not isinstance(user[name], basestring):
+                    errors.append('%s.%s: %r is not a string' % (user_path, name, user[name]))
+            groups = user.get('groups')
+            if groups is not None and (not isinstance(groups, list) or
+                    not all(isinstance(group, basestring) for group in groups)):
+                errors.append('%s.groups: must be a list of group names' % (user_path,))
+            if user.get('actiontorun') not in self.USER_ACTIONS + [None]:
+                errors.append('%s.actiontorun: %r is not one of %s' % (
+                    user_path, user.get('actiontorun'), ', '.join(self.USER_ACTIONS[:-1])))
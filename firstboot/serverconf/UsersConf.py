@@ -21,28 +21,37 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 import firstboot.validation as validation
+from ConfRecord import ConfRecord, STRING, RAW, LIST
 
-class Users():
-    def __init__(self):
-        self._data = {}
-        self._data['actiontorun'] = ''
-        self._data['groups'] =  []
-        self._data['name'] = ''
-        self._data['user'] = ''
-        self._data['password'] = ''
+class Users(ConfRecord):
+
+    FIELDS = (
+        ('actiontorun', STRING, ''),
+        ('groups', LIST, list),
+        ('name', RAW, ''),
+        ('user', RAW, ''),
+        ('password', RAW, ''),
+        ('deletehome', RAW, None),
+    )
+
+    # Fields given to the local_users_res resource.
+    SOLO_FIELDS = ['user', 'password', 'groups', 'actiontorun', 'name']
+    SOLO_DELETE_FIELDS = ['user', 'groups', 'actiontorun', 'deletehome']
 
     def get_actiontorun(self):
-        return self._data['actiontorun'].encode('utf-8')
+        return self._actiontorun
     
     def set_actiontorun(self, actiontorun):
-        self._data['actiontorun'] = actiontorun
-        return self
+        return self._set('actiontorun', actiontorun)
 
     def get_groups(self):
-        return self._data['groups']
+        return self._groups
 
     def add_group(self, group):
-        self._data['groups'].append(group)
+        with self._writing():
+            old = list(self._groups)
+            self._groups.append(group)
+            self._changed('groups', old, self._groups)
         return self
     
     def add_groups(self, groups):
@@ -50,69 +59,73 @@ class Users():
         return self
 
     def clear_groups(self):
-        self._data['groups'] = []
-        return self
+        return self._set('groups', [])
 
     def remove_group(self, group):
-        self._data['groups'].remove(group)
+        with self._writing():
+            old = list(self._groups)
+            self._groups.remove(group)
+            self._changed('groups', old, self._groups)
         return self
 
     def get_name(self):
-        return self._data['name']
+        return self._name
 
     def set_name(self, name):
-        self._data['name'] = name
-        return self
+        return self._set('name', name)
 
     def get_user(self):
-        return self._data['user']
+        return self._user
 
     def set_user(self, user):
-        self._data['user'] = user
-        return self
+        return self._set('user', user)
 
     def get_password(self):
-        return self._data['password']
+        return self._password
 
     def set_password(self, password):
-        self._data['password'] = password
-        return self
+        return self._set('password', password)
     
     def get_deletehome(self):
-        return self._data['deletehome']
+        return self._deletehome
 
     def set_deletehome(self, deletehome):
-        self._data['deletehome'] = deletehome
-        return self
+        return self._set('deletehome', deletehome)
 
-    def __str__(self):
-        return str(self._data)
+    def to_solo_json(self):
+        if self._actiontorun == 'delete':
+            return self.to_dict(self.SOLO_DELETE_FIELDS)
+        return self.to_dict(self.SOLO_FIELDS)
 
 
-class UsersConf():
+class UsersConf(ConfRecord):
 
-    def __init__(self):
-        self._data = {}
-        self._data['users_list'] = []
+    FIELDS = (
+        ('users_list', LIST, list),
+    )
 
     def validate(self):
         return True
 
     def get_users_list(self):
-        return self._data['users_list']
+        return self._users_list
 
     def add_user_to_list(self, user):
-        return self._data['users_list'].append(user)
+        with self._writing():
+            old = list(self._users_list)
+            self._users_list.append(user)
+            if isinstance(user, ConfRecord):
+                user.attach(self.get_journal(), self.get_section())
+            self._changed('users_list', old, self._users_list)
 
     def remove_user_from_list(self,user):
-        return self._data['users_list'].remove(user)
+        with self._writing():
+            old = list(self._users_list)
+            self._users_list.remove(user)
+            self._changed('users_list', old, self._users_list)
     
     def add_users_to_list(self, users):
         return [self.add_user_to_list(user) for user in users]
     
     def clear(self):
-        self._data['users_list'] = []
-        return self
-    
-    def __str__(self):
-        return str(self._data)
+        return self._set('users_list', [])
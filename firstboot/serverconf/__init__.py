@@ -21,30 +21,52 @@ __copyright__ = "Copyright (C) 2011, Junta de Andalucía <devmaster@guadalinex.o
 __license__ = "GPL-2"
 
 
+import copy
+import itertools
 import json
-import requests
 import os
 import subprocess
 import shlex
 import shutil
-import tempfile
+import threading
 import urllib
 import urllib2
 import urlparse
 
 
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 from firstboot_lib import firstbootconfig
+from firstboot_lib import TaskExecutor
 from ServerConf import ServerConf
+from ServerConfSession import ServerConfSession
+from GCCClient import GCCClient
+from NetworkPolicy import NetworkPolicy
+from JSONStream import iter_json_array
+from CredentialResolver import CredentialResolver
+from AutoConfCache import AutoConfCache
+from NodeIndex import NodeIndex
+from ChefSoloPlan import ChefSoloPlan
+from ChefSoloRunner import ChefSoloRunner
+from ChefSoloReport import ChefSoloReport
+from AppliedState import AppliedState
+from ChangePlanner import ChangePlanner
+from CookbookBundle import CookbookBundle
+from ResourceAppliers import TzDateApplier, LocalUsersApplier, PartiallyAppliedException
+from RunWorkspace import RunWorkspace
+from SoloJSONValidator import SoloJSONValidator
 from gi.repository import Gtk
 import gettext
 from firstboot_lib.firstbootconfig import get_prefix
 from gettext import gettext as _
 gettext.textdomain('gecosws-config-assistant')
 
+import logging
+logger = logging.getLogger('firstboot')
+
 
 __URLOPEN_TIMEOUT__ = 15
 __JSON_CACHE__ = '/tmp/json_cached'
+__JSON_PREFETCH__ = '/tmp/json_prefetched'
 __BIN_PATH__ = firstbootconfig.get_bin_path()
 __LDAP_CONF_SCRIPT__ = 'firstboot-ldapconf.sh'
 __CHEF_CONF_SCRIPT__ = 'firstboot-chefconf.sh'
@@ -53,88 +75,231 @@ __LDAP_FLAG__ = '/etc/gca-sssd.control'
 __AD_FLAG__ = __LDAP_FLAG__
 __CHEF_PEM__ = '/etc/chef/validation.pem'
 __AD_CONF_SCRIPT__ = 'firstboot-adconf.sh'
-
-CREDENTIAL_CACHED = {}
-ACTUAL_USER = ()
-
+__CHUNK_SIZE__ = 16384
+__NODES_PAGE_SIZE__ = 500
+__NODES_SHOWN__ = 200
+__SEARCH_DELAY__ = 300
+__NODE_INDEX_DIR__ = '/var/cache/gecosws-config-assistant'
+__NODE_INDEX_TTL__ = 3600
+__CHEF_ERROR_LINES__ = 10
+__CHEF_REPORT_RECIPES__ = 3
+__CHEF_DEADLINE__ = 3600
+__CHEF_STALL_TIMEOUT__ = 900
+__APPLIED_STATE__ = '/var/lib/gecosws-config-assistant/applied.json'
+__SOLO_RB__ = get_prefix() + '/share/gecosws-config-assistant/solo.rb'
+__COOKBOOK_PATH__ = get_prefix() + '/share/gecosws-config-assistant/cookbooks'
+__BUNDLE_DIR__ = '/var/cache/gecosws-config-assistant/bundles'
+
+AUTOCONF_CACHE = AutoConfCache(__JSON_CACHE__)
+# Autoconf file downloaded in the background. It's only used by the
+# explicit load, so it doesn't make the workstation look configured.
+PREFETCH_CACHE = AutoConfCache(__JSON_PREFETCH__)
+NODE_INDEXES = {}
+NODE_INDEXES_LOCK = threading.Lock()
+PREFETCH_TASKS = {}
+PREFETCH_LOCK = threading.Lock()
+PREFETCH_ENABLED = True
+# Chef-solo operations waiting for the next apply.
+CHEF_PLAN = ChefSoloPlan()
+CHEF_PROGRESS_LISTENERS = []
+# Reports of the chef-solo runs of the last commit.
+CHEF_REPORTS = []
+# The chef-solo run going on, if any.
+CHEF_RUNNER = None
+APPLIED_STATE = AppliedState(__APPLIED_STATE__)
+COOKBOOK_BUNDLE = CookbookBundle(__COOKBOOK_PATH__, __BUNDLE_DIR__)
+SOLO_VALIDATOR = SoloJSONValidator(os.path.join(__COOKBOOK_PATH__, 'gecos_ws_mgmt', 'resources'))
+# Resources applied from Python instead of chef-solo, by (section, name).
+RESOURCE_APPLIERS = {}
+GCCClient.Instance().set_policy(NetworkPolicy(read_timeout=__URLOPEN_TIMEOUT__))
+
+
+def get_gcc_client():
+    return GCCClient.Instance()
+
+def get_network_policy():
+    return get_gcc_client().get_policy()
+
+def set_network_policy(policy):
+    get_gcc_client().set_policy(policy)
+
+def get_content(response):
+    if hasattr(response,'text'):
+        return response.text
+    else:
+        return response.content
+
+def download_pem(url):
+    res = get_gcc_client().get(url)
+    if not res.ok:
+        raise LinkToChefException(_("Can not download pem file"))
+    return get_content(res)
+
+def get_credential_resolver():
+    return CredentialResolver.Instance()
+
+def _ask_credentials():
+    # It can be called from a background task, the dialog must be
+    # shown from the GTK main loop.
+    return TaskExecutor.run_in_main_loop(auth_dialog, _('Authentication Required'),
+        _('You need to enter your credentials to access the requested resource.'))
+
+def _check_authenticated(r):
+    if r is not None and r.status_code == 403:
+        r.close()
+        raise ServerConfException(_('Access to the requested resource is denied.'))
+    if r is None or not r.ok:
+        raise ServerConfException(_('Authentication is failed.'))
+    return r
+
+def _authenticated_get(url, headers=None):
+    request_headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
+    request_headers.update(headers or {})
+    r = get_credential_resolver().authenticated_get(url,
+        prompt=_ask_credentials, headers=request_headers)
+    return _check_authenticated(r)
 
 def validate_credentials(url):
-    global CREDENTIAL_CACHED
-    global ACTUAL_USER
-    url_parsed = urlparse.urlparse(url)
-    user = ''
-    password = ''
-    hostname = url_parsed.hostname
-    headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
+    return get_content(_authenticated_get(url))
 
-    validate = False
-    if hostname in CREDENTIAL_CACHED:
-        credentials = CREDENTIAL_CACHED[hostname]
-        for cred in credentials:
-            user, password = cred[0], cred[1]
-            r = requests.get(url, auth=(user,password), headers=headers)
-            if r.ok:
-                validate = True
-
-    if not validate:
-
-        user, password = auth_dialog(_('Authentication Required'),
-            _('You need to enter your credentials to access the requested resource.'))
-        r = requests.get(url, auth=(user,password), headers=headers)
-        if r.ok:
-            if not CREDENTIAL_CACHED.has_key(hostname):
-                CREDENTIAL_CACHED[hostname] = []
-            credentials = CREDENTIAL_CACHED[hostname]
-            credentials.append([user, password])
-            ACTUAL_USER = (user, password)
-        else:
-            raise ServerConfException(_('Authentication is failed.'))
-    if hasattr(r,'text'):
-        return r.text
-    else:  
-        return r.content
+def get_autoconf_cache():
+    return AUTOCONF_CACHE
+
+def get_autoconf_source():
+    return AUTOCONF_CACHE.last_source
 
 def json_is_cached():
-    return os.path.exists(__JSON_CACHE__)
+    return AUTOCONF_CACHE.exists()
 
 def clean_json_cached():
-    return os.remove(__JSON_CACHE__)
+    PREFETCH_CACHE.clean()
+    return AUTOCONF_CACHE.clean()
+
+def _fix_chef_uri(conf):
+    if conf["chef"]["chef_server_uri"] == "https://localhost/":
+        chef_uri = conf["gcc"]["uri_gcc"].split('//')[1].split(':')[0]
+        conf["chef"]["chef_server_uri"] = "https://" + chef_uri + '/'
+    return conf
 
 def get_json_content():
-    if json_is_cached():
-        fp = open(__JSON_CACHE__, 'r')
-        content = fp.read()
-        fp.close()
+    conf = AUTOCONF_CACHE.load()
+    if conf != None:
+        conf = _fix_chef_uri(conf)
+    return conf
 
-        conf = json.loads(content)
-        if conf["chef"]["chef_server_uri"] == "https://localhost/":
-            chef_uri = conf["gcc"]["uri_gcc"].split('//')[1].split(':')[0]
-            conf["chef"]["chef_server_uri"] = "https://" + chef_uri + '/'
-        return conf
+def _store_autoconf(url, r, cache=None):
+    cache = cache or AUTOCONF_CACHE
+    if r.status_code == 304:
+        cache.set_not_modified()
     else:
-        return None
+        cache.store(url, r.content, r.headers.get('ETag'),
+            r.headers.get('Last-Modified'))
 
 def get_json_autoconf(url):
-    try:
-        content = validate_credentials(url)
-    except Exception as e:
-        raise e
-    if json_is_cached():
-        clean_json_cached()
-    fp_cached = open(__JSON_CACHE__, 'w')
-    fp_cached.write(content)
-    fp_cached.close()
-    
-    conf = json.loads(content)
-    if conf["chef"]["chef_server_uri"] == "https://localhost/":
-        chef_uri = conf["gcc"]["uri_gcc"].split('//')[1].split(':')[0]
-        conf["chef"]["chef_server_uri"] = "https://" + chef_uri + '/'
-    return conf
+    headers = AUTOCONF_CACHE.get_validators(url)
+    # The prefetched file is taken if it didn't change since.
+    prefetched = not headers and PREFETCH_CACHE.get_validators(url)
+    r = _authenticated_get(url, prefetched or headers)
+    if prefetched and r.status_code == 304:
+        AUTOCONF_CACHE.store_from(PREFETCH_CACHE)
+    else:
+        _store_autoconf(url, r)
+    # The GCC credentials are usually the same ones, the workstation
+    # list can be downloaded while the user goes through the next pages.
+    _prefetch('gcc', prefetch_gcc)
+    return get_json_content()
+
+def set_prefetch_enabled(enabled):
+    '''
+    Turns the background downloads on or off, e.g. for tests that
+    count what is downloaded. Returns the previous setting.
+    '''
+    global PREFETCH_ENABLED
+    with PREFETCH_LOCK:
+        previous = PREFETCH_ENABLED
+        PREFETCH_ENABLED = enabled
+    return previous
+
+def _prefetch(key, func, *args):
+    # A stage is not run again while it's running or once it has
+    # succeeded, but it's retried if it failed or had nothing to do.
+    with PREFETCH_LOCK:
+        if not PREFETCH_ENABLED:
+            return None
+        task = PREFETCH_TASKS.get(key)
+        if task is not None and (not task.done() or
+                (task.exception() is None and task.result())):
+            return task
+        task = TaskExecutor.submit(func, *args)
+        PREFETCH_TASKS[key] = task
+        return task
+
+def prefetch_autoconf(url):
+    '''
+    Downloads the autoconf file into the prefetch cache without asking
+    the user for credentials. The ones already accepted by the server
+    are used, otherwise the file is requested anonymously.
+    Returns True if the cache was updated.
+    '''
+    headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
+    headers.update(PREFETCH_CACHE.get_validators(url))
+    credential = get_credential_resolver().get_credentials(url)
+    if credential != (None, None):
+        r = get_credential_resolver().authenticated_get(url, headers=headers)
+    else:
+        r = get_gcc_client().get(url, headers=headers)
+    if r is None or not (r.ok or r.status_code == 304):
+        return False
+    _store_autoconf(url, r, PREFETCH_CACHE)
+    _prefetch('gcc', prefetch_gcc)
+    return True
+
+def prefetch_gcc():
+    '''
+    Fills the index of the GCC found in the cached autoconf file: the
+    OUs it lists and, if the GCC credentials are already known, its
+    workstations. The validation PEM is part of the autoconf file.
+    Returns True if the workstations were indexed.
+    '''
+    conf = get_json_content() or PREFETCH_CACHE.load()
+    if conf is None or 'uri_gcc' not in conf.get('gcc', {}):
+        return False
+    uri_gcc = conf['gcc']['uri_gcc']
+    ous = conf['gcc'].get('ou_username')
+    if isinstance(ous, list):
+        # The OUs of the GCC user of the autoconf file.
+        get_node_index(uri_gcc, conf['gcc'].get('gcc_username')).update_ous(ous)
+    (username, password) = get_credential_resolver().get_credentials(uri_gcc)
+    if username is None:
+        return False
+    index = get_node_index(uri_gcc, username)
+    if index.has_nodes() and index.is_fresh():
+        return True
+    refresh_node_index(uri_gcc, username, password)
+    return True
+
+def start_prefetch(url):
+    '''
+    Starts downloading in the background everything the assistant will
+    ask for later: the autoconf file at url and then the GCC data.
+    It's meant to be called as soon as there is network connectivity.
+    '''
+    if url:
+        _prefetch(('autoconf', url), prefetch_autoconf, url)
+    return _prefetch('gcc', prefetch_gcc)
+
+def get_session():
+    '''
+    Returns the ServerConfSession of the calling thread.
+    '''
+    return ServerConfSession.current()
 
 def get_server_conf(content):
-    server_conf = ServerConf.Instance()
+    server_conf = get_session().get_server_conf()
     if content != None:
         server_conf.load_data(content)
+        # The unlink flows go back to it without reading the cache.
+        server_conf.save_snapshot(server_conf.AUTOCONF)
     return server_conf
 
 def create_pem(pem_string):
@@ -161,14 +326,8 @@ def create_chef_pem(chef_conf):
     return __CHEF_PEM__
 
 
-def create_conf_file(file_content):
-    (fd, filepath) = tempfile.mkstemp(dir='/tmp')
-    fp = os.fdopen(fd, "w+b")
-    if fp:
-        fp.write(file_content.decode('base64'))
-        fp.close()
-
-    return filepath
+def create_conf_file(file_content, workspace):
+    return workspace.write_base64(file_content)
 
 
 def ad_is_configured():
@@ -181,7 +340,13 @@ def ad_is_configured():
         raise e
 
 
-def create_solo_json(server_conf):
+def create_solo_json(server_conf, write_files=True, workspace=None):
+    '''
+    Builds the solo JSON that applies server_conf. The validation PEM
+    and the AD configuration files (in workspace) are written unless
+    write_files is False, then their attributes hold the hash of the
+    content they would have (see AppliedState).
+    '''
     json_solo = {}
     json_solo['run_list'] = ["recipe[ohai-gecos::default]", "recipe[chef-client::upstart_service]", "recipe[gecos_ws_mgmt::local]"]
     json_solo['gecos_ws_mgmt'] = {}
@@ -190,7 +355,10 @@ def create_solo_json(server_conf):
     if server_conf.get_ntp_conf().get_uri_ntp() != '':
         json_solo['gecos_ws_mgmt']['misc_mgmt']['tz_date_res'] = {'server':server_conf.get_ntp_conf().get_uri_ntp()}
     if server_conf.get_chef_conf().get_url() != '':
-        tmpfile = create_chef_pem(server_conf.get_chef_conf())
+        if write_files:
+            tmpfile = create_chef_pem(server_conf.get_chef_conf())
+        else:
+            tmpfile = APPLIED_STATE.hash_content(server_conf.get_chef_conf().get_pem().decode('base64'))
         chef_url = server_conf.get_chef_conf().get_url()
         chef_node_name = server_conf.get_chef_conf().get_node_name()
         chef_admin_name = server_conf.get_chef_conf().get_admin_name()
@@ -205,15 +373,21 @@ def create_solo_json(server_conf):
         if auth_type == 'ad':
             auth_prop = server_conf.get_auth_conf().get_auth_properties()
             sssd_ad_json  = {}
-            if auth_prop.get_specific_conf():
+            if auth_prop.get_specific_conf() and not write_files:
+                ad_prop = auth_prop.get_ad_properties()
+                sssd_ad_json = {'domain': {}}
+                for key, content in [('krb5_url', ad_prop.get_krb5_conf()), ('smb_url', ad_prop.get_smb_conf()),
+                                     ('sssd_url', ad_prop.get_sssd_conf()), ('mkhomedir_url', ad_prop.get_pam_conf())]:
+                    sssd_ad_json[key] = APPLIED_STATE.hash_content(content.decode('base64'))
+            elif auth_prop.get_specific_conf():
                 ad_prop = auth_prop.get_ad_properties()
-                krb5_file = create_conf_file(ad_prop.get_krb5_conf())
+                krb5_file = create_conf_file(ad_prop.get_krb5_conf(), workspace)
                 krb5_file = 'file://' + krb5_file
-                smb_file = create_conf_file(ad_prop.get_smb_conf())
+                smb_file = create_conf_file(ad_prop.get_smb_conf(), workspace)
                 smb_file = 'file://' + smb_file
-                sssd_file = create_conf_file(ad_prop.get_sssd_conf())
+                sssd_file = create_conf_file(ad_prop.get_sssd_conf(), workspace)
                 sssd_file = 'file://' + sssd_file
-                pam_file = create_conf_file(ad_prop.get_pam_conf())
+                pam_file = create_conf_file(ad_prop.get_pam_conf(), workspace)
                 pam_file = 'file://' + pam_file
                 sssd_ad_json = {'krb5_url': krb5_file, 'smb_url': smb_file, 'sssd_url': sssd_file, 'mkhomedir_url': pam_file, 'domain': {}}
             else:
@@ -246,14 +420,7 @@ def create_solo_json(server_conf):
 
     if server_conf.get_users_conf().get_users_list():
         users_conf = server_conf.get_users_conf().get_users_list()
-        array_users = [] 
-        for user in users_conf:
-            user_json = {}
-            if user.get_actiontorun() == 'delete':
-                user_json = {'user': user.get_user(),'groups': user.get_groups(), 'actiontorun': user.get_actiontorun(),'deletehome':user.get_deletehome()}
-            else:
-                user_json = {'user': user.get_user(), 'password': user.get_password(), 'groups': user.get_groups(), 'actiontorun': user.get_actiontorun(),'name':user.get_name()}
-            array_users.append(user_json)
+        array_users = [user.to_solo_json() for user in users_conf]
 
         users_json = {'users_list': array_users}
         json_solo['gecos_ws_mgmt']['misc_mgmt']['local_users_res'] = users_json
@@ -283,11 +450,14 @@ def gcc_is_configured():
         raise e
 
 
-def apply_changes():
-#TODO implements save the json to run chef solo and run it
-    server_conf = get_server_conf(None)
+def validate_solo_json(server_conf, json_solo, check_files=True):
+    '''
+    Returns the error messages of the sections of json_solo whose
+    configuration is not valid, followed by the problems found in
+    json_solo itself (see SoloJSONValidator). The files it references
+    are not looked for if check_files is False.
+    '''
     messages = []
-    json_solo = create_solo_json(server_conf)
     resources = json_solo['gecos_ws_mgmt']['misc_mgmt'].keys()
     for res in resources:
         if res == 'tz_date_res':
@@ -305,39 +475,272 @@ def apply_changes():
         if res == 'local_users_res':
             if not server_conf.get_users_conf().validate():
                 messages.append(_("The Local Users parameters are incorrect, please go to Users section"))
+    messages += SOLO_VALIDATOR.validate(json_solo, check_files)
+    return messages
+
+def _get_ad_files(server_conf):
+    auth_conf = server_conf.get_auth_conf()
+    if auth_conf.get_auth_type() != 'ad' or not auth_conf.get_auth_properties().get_specific_conf():
+        return {}
+    ad_prop = auth_conf.get_auth_properties().get_ad_properties()
+    return {'krb5_url': ad_prop.get_krb5_conf().decode('base64'),
+            'smb_url': ad_prop.get_smb_conf().decode('base64')}
+
+def plan_changes(force_full=False, session=None):
+    '''
+    Dry run of apply_changes: validates the configuration and returns
+    the error messages and the changes the apply would make in the
+    system (see ChangePlanner), including the pending unlink
+    operations. Nothing is written and chef-solo is not run.
+    '''
+    (server_conf, version) = (session or get_session()).copy()
+    json_solo = create_solo_json(server_conf, write_files=False)
+    messages = validate_solo_json(server_conf, json_solo, check_files=False)
     if len(messages) > 0:
-        display_errors(_("Configuration Error"),messages)
-        return 0    
-    (fd, filepath) = tempfile.mkstemp(dir='/tmp')
-    fp = os.fdopen(fd, "w+b")
-    if fp:
-        fp.write(json.dumps(json_solo,indent=2))
-        fp.close()
-    print filepath
-    run_chef_solo(filepath)
+        return (messages, [])
+    if not force_full:
+        json_solo = APPLIED_STATE.filter(json_solo)
+    plan = ChefSoloPlan()
+    for phase in CHEF_PLAN.get_phases():
+        plan.add(ChefSoloPlan.UNLINK, phase)
+    if APPLIED_STATE.has_resources(json_solo):
+        plan.add(ChefSoloPlan.APPLY, json_solo)
+    pem = None
+    if server_conf.get_chef_conf().get_pem():
+        pem = server_conf.get_chef_conf().get_pem().decode('base64')
+    changes = ChangePlanner().plan(plan.get_phases(), pem, _get_ad_files(server_conf))
+    return ([], changes)
+
+def apply_changes(force_full=False, session=None):
+#TODO implements save the json to run chef solo and run it
+    session = session or get_session()
+    # The reports of a previous apply are not the ones of this one,
+    # even if it fails before chef-solo is run.
+    del CHEF_REPORTS[:]
+    # The configuration can be edited while chef-solo runs.
+    (server_conf, version) = session.copy()
+    # The files of the run are kept until its resources are recorded,
+    # since they are fingerprinted by content.
+    with RunWorkspace() as workspace:
+        json_solo = create_solo_json(server_conf, workspace=workspace)
+        messages = validate_solo_json(server_conf, json_solo)
+        if len(messages) > 0:
+            display_errors(_("Configuration Error"),messages)
+            return 0    
+        # Only the resources changed since the last successful run are
+        # applied again, unless a full run is requested.
+        if not force_full:
+            json_solo = APPLIED_STATE.filter(json_solo)
+        # The simple resources don't need chef-solo.
+        (json_solo, native) = apply_native(json_solo)
+        # It replaces the apply of a commit that failed, if any.
+        CHEF_PLAN.discard(ChefSoloPlan.APPLY)
+        if APPLIED_STATE.has_resources(json_solo):
+            CHEF_PLAN.add(ChefSoloPlan.APPLY, json_solo)
+        # The pending unlink operations are run in the same commit.
+        if commit_chef_plan(workspace=workspace):
+            # Nothing is recorded unless the whole commit succeeded.
+            # The rest of a partially applied resource was run by
+            # chef-solo, the whole one is recorded.
+            APPLIED_STATE.record(json_solo)
+            APPLIED_STATE.record(native)
+            # What changed during the run is still to be applied.
+            session.get_server_conf().get_journal().clear_dirty(version=version)
+
+def register_applier(applier):
+    '''
+    Applies the resources handled by applier (see ResourceApplier)
+    from Python instead of chef-solo.
+    '''
+    RESOURCE_APPLIERS[(applier.section, applier.name)] = applier
 
-def run_chef_solo(fp):
+def unregister_applier(section, name):
+    RESOURCE_APPLIERS.pop((section, name), None)
+
+register_applier(TzDateApplier())
+register_applier(LocalUsersApplier())
+
+def apply_native(json_solo):
+    '''
+    Applies the resources of json_solo that have a registered applier.
+    Returns a copy of json_solo with the resources left to chef-solo
+    (the rest, the ones whose applier can not be used or failed and
+    what is left of the partially applied ones) and a solo JSON with
+    the applied ones, whole, to be recorded by the caller after the
+    chef-solo run.
+    '''
+    json_solo = copy.deepcopy(json_solo)
+    root = json_solo['gecos_ws_mgmt']
+    native = {'gecos_ws_mgmt': {}}
+    for (section, name), applier in sorted(RESOURCE_APPLIERS.items()):
+        res = root.get(section, {}).get(name)
+        if res is None or not applier.can_apply(res):
+            continue
+        try:
+            applier.apply(res)
+        except PartiallyAppliedException as e:
+            logger.warning('%s partially applied, using chef-solo for the rest: %s' % (name, e))
+            native['gecos_ws_mgmt'].setdefault(section, {})[name] = res
+            root[section][name] = e.remaining
+            continue
+        except Exception as e:
+            logger.warning('Can not apply %s, using chef-solo: %s' % (name, e))
+            continue
+        native['gecos_ws_mgmt'].setdefault(section, {})[name] = res
+        del root[section][name]
+    return (json_solo, native)
+
+def get_applied_state():
+    return APPLIED_STATE
+
+def get_chef_plan():
+    return CHEF_PLAN
+
+def commit_chef_plan(plan=None, workspace=None):
+    '''
+    Runs the operations collected in plan (the pending one by default)
+    with as few chef-solo runs as possible. Returns False as soon as
+    a run fails, leaving in plan the operations not done. The run files are written to workspace, or to a new
+    one removed at the end.
+    '''
+    if plan is None:
+        plan = CHEF_PLAN
+    if workspace is None:
+        with RunWorkspace() as workspace:
+            return commit_chef_plan(plan, workspace)
+    del CHEF_REPORTS[:]
+    for json_solo in plan.commit():
+        # Better to fail here than half way through the run.
+        errors = SOLO_VALIDATOR.validate(json_solo)
+        if len(errors) > 0:
+            display_errors(_("Configuration Error"), errors)
+            return False
+        filepath = workspace.write_json(json_solo)
+        if not run_chef_solo(filepath, json_solo['run_list'], workspace):
+            return False
+    return True
+
+def create_solo_rb(run_list, workspace):
+    '''
+    Returns the path of a solo.rb whose cookbook path only holds the
+    cookbooks needed by run_list, or the shared one if they can not
+    be staged.
+    '''
+    try:
+        cookbook_path = COOKBOOK_BUNDLE.get_bundle(run_list)
+        return workspace.write(COOKBOOK_BUNDLE.get_solo_rb(__SOLO_RB__, cookbook_path), '.rb')
+    except Exception as e:
+        logger.warning('Can not stage the cookbooks of %s: %s' % (run_list, e))
+        return __SOLO_RB__
+
+def _add_unlink(json_solo, plan):
+    # The unlinked resources must be applied again by the next run.
+    APPLIED_STATE.forget(json_solo)
+    # Without a plan the operation is run right now.
+    if plan is None:
+        commit_chef_plan(ChefSoloPlan().add(ChefSoloPlan.UNLINK, json_solo))
+    else:
+        plan.add(ChefSoloPlan.UNLINK, json_solo)
+
+def cancel_chef_solo():
+    '''
+    Stops the chef-solo run going on, if any. The pending runs of the
+    commit are not started.
+    '''
+    runner = CHEF_RUNNER
+    if runner is not None:
+        runner.cancel()
+        return True
+    return False
+
+def get_chef_reports():
+    '''
+    Returns the ChefSoloReport of every chef-solo run of the last
+    commit, in order.
+    '''
+    return list(CHEF_REPORTS)
+
+def get_chef_report_messages(reports=None):
+    '''
+    Summary of the given chef-solo reports (the ones of the last
+    commit by default) as results page messages: total time, changed
+    resources, slowest recipes and the failed resource.
+    '''
+    if reports is None:
+        reports = CHEF_REPORTS
+    messages = []
+    for report in reports:
+        if report.success:
+            text = _('Last configuration run: applied in %.1f seconds, %d resources changed') % (
+                report.get_total_time(), len(report.get_changed()))
+            messages.append({'type': 'info', 'message': text})
+        else:
+            text = _('Last configuration run: failed after %.1f seconds') % (report.get_total_time(),)
+            if report.failed_resource is not None:
+                text += ': ' + report.failed_resource
+            messages.append({'type': 'error', 'message': text})
+        for recipe, duration in report.get_recipe_times()[:__CHEF_REPORT_RECIPES__]:
+            messages.append({'type': 'info', 'message': '    %s: %.1fs' % (recipe, duration)})
+    return messages
+
+def add_chef_progress_listener(callback):
+    '''
+    callback(progress) is called in the main loop with the
+    ChefSoloProgress of every chef-solo run.
+    '''
+    CHEF_PROGRESS_LISTENERS.append(callback)
+
+def run_chef_solo(fp, run_list=None, workspace=None):
     try:
         envs = os.environ
         envs['LANG'] = 'es_ES.UTF-8'
-        solo_rb = get_prefix() + '/share/gecosws-config-assistant/solo.rb'
-        cmd = '"chef-solo" "-c" "%s" "-j" "%s"' % (solo_rb, fp)
+        solo_rb = __SOLO_RB__
+        if run_list is not None and workspace is not None:
+            solo_rb = create_solo_rb(run_list, workspace)
+        cmd = '"chef-solo" "-c" "%s" "-j" "%s" "-F" "doc"' % (solo_rb, fp)
         args = shlex.split(cmd)
-        log_chef_solo = open('/tmp/chef-solo', "w", 1)
-        log_chef_solo_err = open('/tmp/chef-solo-err', "w", 1)
-        process = subprocess.Popen(args, stdout=log_chef_solo, stderr=log_chef_solo_err, env=envs)
-        exit_code = os.waitpid(process.pid, 0)
-        output = process.communicate()[0]
-
-        if exit_code[1] != 0:
+        runner = ChefSoloRunner(args, envs, '/tmp/chef-solo',
+                                deadline=__CHEF_DEADLINE__,
+                                stall_timeout=__CHEF_STALL_TIMEOUT__)
+        for callback in CHEF_PROGRESS_LISTENERS:
+            runner.add_listener(callback)
+        global CHEF_RUNNER
+        CHEF_RUNNER = runner
+        try:
+            exit_code = runner.start().wait()
+        finally:
+            CHEF_RUNNER = None
+        report = runner.get_report()
+        CHEF_REPORTS.append(report)
+        logger.info('chef-solo run: %s' % (json.dumps(report.to_dict()),))
+
+        if report.outcome == ChefSoloRunner.CANCELLED:
+            display_errors(_("Configuration Error"),
+                           [_('The configuration was cancelled')])
+            return False
+        if report.outcome == ChefSoloRunner.TIMED_OUT:
+            messages = [_('chef-solo was stopped because it took too long')]
+            if runner.get_progress().resource is not None:
+                messages.append(_('Last resource: ') + runner.get_progress().resource)
+            display_errors(_("Configuration Error"), messages)
+            return False
+        if exit_code != 0:
             messages = [(_('An error has ocurred running chef-solo'))]
+            if report.failed_resource is not None:
+                messages.append(_('Failed resource: ') + report.failed_resource)
+                messages += report.error
+            else:
+                messages += runner.get_tail()[-__CHEF_ERROR_LINES__:]
             display_errors(_("Configuration Error"), messages)
+            return False
+        return True
 
     except Exception as e:
         display_errors(_("Configuration Error"), [e.message])
+        return False
          
 
-def unlink_from_sssd():
+def unlink_from_sssd(plan=None):
 #TODO implement unlink from ldap calling chef-solo
     server_conf = get_server_conf(None)
     json_solo = {}
@@ -348,16 +751,11 @@ def unlink_from_sssd():
     sssd_json['enabled'] = False
     sssd_json['domain'] = {}
     json_solo['gecos_ws_mgmt']['network_mgmt']['sssd_res'] = sssd_json
-    (fd, filepath) = tempfile.mkstemp(dir='/tmp')
-    fp = os.fdopen(fd, "w+b")
-    if fp:
-        fp.write(json.dumps(json_solo,indent=2))
-        fp.close()
-    run_chef_solo(filepath)
+    _add_unlink(json_solo, plan)
     return []
 
 
-def unlink_from_gcc(password):
+def unlink_from_gcc(password, plan=None):
 #TODO Implement unlink from gcc server
     server_conf = get_server_conf(None)
     json_solo = {}
@@ -368,15 +766,10 @@ def unlink_from_gcc(password):
     gcc_json = {}
     gcc_json = {'uri_gcc': gcc_conf.get_uri_gcc(), 'gcc_username' : gcc_conf.get_gcc_username(), 'gcc_pwd_user': password,'gcc_nodename': gcc_conf.get_gcc_nodename(),'gcc_link': gcc_conf.get_gcc_link(), 'gcc_selected_ou': 'without ou'}
     json_solo['gecos_ws_mgmt']['misc_mgmt']['gcc_res'] = gcc_json
-    (fd, filepath) = tempfile.mkstemp(dir='/tmp')
-    fp = os.fdopen(fd, "w+b")
-    if fp:
-        fp.write(json.dumps(json_solo,indent=2))
-        fp.close()
-    run_chef_solo(filepath)
+    _add_unlink(json_solo, plan)
     return []
 
-def unlink_from_chef():
+def unlink_from_chef(plan=None):
 #TODO Implement unlink from chef server
     server_conf = get_server_conf(None)
     json_solo = {}
@@ -393,12 +786,7 @@ def unlink_from_chef():
     chef_json = {'chef_server_url':chef_url, 'chef_node_name': chef_node_name, 'chef_validation_pem': __CHEF_PEM__, 'chef_link': chef_link, 'chef_admin_name': chef_admin_name}
     chef_json['chef_link'] = server_conf.get_chef_conf().get_chef_link()
     json_solo['gecos_ws_mgmt']['misc_mgmt']['chef_conf_res'] = chef_json
-    (fd, filepath) = tempfile.mkstemp(dir='/tmp')
-    fp = os.fdopen(fd, "w+b")
-    if fp:
-        fp.write(json.dumps(json_solo,indent=2))
-        fp.close()
-    run_chef_solo(filepath)
+    _add_unlink(json_solo, plan)
     return []
 #    try:
 #
@@ -477,43 +865,45 @@ def entry_ou(title, text):
     dialog.destroy()
     return retval
 
-def get_hostnames(uri_gcc, username_gcc, password_gcc):
-    #Implements code to call API rest to get node list
-    global CREDENTIAL_CACHED
-    global ACTUAL_USER
+def iter_hostnames(uri_gcc, username_gcc, password_gcc, prefix=None,
+                   page_size=__NODES_PAGE_SIZE__):
+    '''
+    Yields the workstations registered in the GCC as dicts with the
+    "name" and "node_chef_id" keys.
+
+    The list is requested page by page ("page" and "pagesize" query
+    parameters) and, when a name prefix is given, filtered by the server
+    ("name" parameter). Every page is parsed while it is downloaded. If
+    the server answers the whole list as a plain JSON array the prefix
+    is applied here.
+    '''
     uri_gcc = uri_gcc + '/computers/list/'
-    url_parsed = urlparse.urlparse(uri_gcc)
-    user = username_gcc
-    password = password_gcc
-    hostname = url_parsed.hostname
     headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
-    content = '' 
-    validate = False
-    if hostname in CREDENTIAL_CACHED:
-        credentials = CREDENTIAL_CACHED[hostname]
-        for cred in credentials:
-            user, password = cred[0], cred[1]
-            r = requests.get(uri_gcc, auth=(user,password), headers=headers)
-            if r.ok:
-                validate = True
-
-    if not validate:
-
-        r = requests.get(uri_gcc, auth=(user,password), headers=headers)
-        if r.ok:
-            if not CREDENTIAL_CACHED.has_key(hostname):
-                CREDENTIAL_CACHED[hostname] = []
-            credentials = CREDENTIAL_CACHED[hostname]
-            credentials.append([user, password])
-            ACTUAL_USER = (user, password)
-        else:
-            raise ServerConfException(_('Authentication is failed.'))
-    if hasattr(r,'text'):
-        content = r.text
-    else:  
-        content = r.content
-
-    arr_hostname = json.loads(content)
+    page = 1
+    pages = 1
+    while page <= pages:
+        params = {'page': page, 'pagesize': page_size}
+        if prefix:
+            params['name'] = prefix
+        r = get_credential_resolver().authenticated_get(uri_gcc,
+            credentials=[(username_gcc, password_gcc)], headers=headers,
+            params=params, stream=True)
+        _check_authenticated(r)
+        members = {}
+        try:
+            for node in iter_json_array(r.iter_content(__CHUNK_SIZE__), 'nodes', members):
+                if not prefix or node['name'].lower().startswith(prefix.lower()):
+                    yield node
+        finally:
+            r.close()
+        pages = members.get('pages', 1)
+        page += 1
+
+def get_hostnames(uri_gcc, username_gcc, password_gcc, prefix=None, limit=None):
+    #Implements code to call API rest to get node list
+    nodes = iter_hostnames(uri_gcc, username_gcc, password_gcc, prefix)
+    arr_hostname = list(itertools.islice(nodes, limit))
+    nodes.close()
 
     #Testing lines
     # arr_hostname = []
@@ -523,7 +913,46 @@ def get_hostnames(uri_gcc, username_gcc, password_gcc):
     # arr_hostname.append(hostname)
     return arr_hostname
 
-def select_node(title, text, hostnames):
+def get_node_index(uri_gcc, username_gcc):
+    '''
+    Returns the local index of the workstations and OUs of the GCC
+    that username_gcc can see.
+    '''
+    key = (uri_gcc, username_gcc)
+    with NODE_INDEXES_LOCK:
+        if key not in NODE_INDEXES:
+            NODE_INDEXES[key] = NodeIndex(uri_gcc, __NODE_INDEX_DIR__,
+                                          __NODE_INDEX_TTL__, username_gcc)
+        return NODE_INDEXES[key]
+
+def refresh_node_index(uri_gcc, username_gcc, password_gcc):
+    index = get_node_index(uri_gcc, username_gcc)
+    index.refresh(lambda: iter_hostnames(uri_gcc, username_gcc, password_gcc))
+    return index
+
+def search_hostnames(uri_gcc, username_gcc, password_gcc, prefix=None):
+    '''
+    Returns the first workstations whose name starts with prefix, followed
+    by the ones containing it, as many as the selection dialog shows.
+
+    The search is done in the local index. It's downloaded here the
+    first time; once its TTL expires it's refreshed in the background
+    while the old copy keeps answering.
+    '''
+    index = get_node_index(uri_gcc, username_gcc)
+    if not index.has_nodes():
+        refresh_node_index(uri_gcc, username_gcc, password_gcc)
+    elif not index.is_fresh() and not index.is_refreshing():
+        TaskExecutor.submit(refresh_node_index, uri_gcc, username_gcc,
+                            password_gcc)
+    return index.search_nodes(prefix, __NODES_SHOWN__)
+
+def _select_from_list(title, text, column_title, rows, search):
+    '''
+    Shows a filtered list of (label, value) rows and returns the value
+    of the selected one. search is called with the text typed in the
+    filter entry and must return the rows to show.
+    '''
     dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.INFO,
                                    Gtk.ButtonsType.OK_CANCEL)
     dialog.set_title(title)
@@ -532,69 +961,136 @@ def select_node(title, text, hostnames):
     dialog.set_icon_name('dialog-password')
     dialog.set_markup(text)
 
-    hboxws = Gtk.HBox()
-    lblws = Gtk.Label(_('Select Workstation'))
-    lblws.set_visible(True)
-    hboxws.pack_start(lblws, False, False, False)
-    ws_store = Gtk.ListStore(str, str)
-    for ws in hostnames:
-        ws_store.append([ws['name'], ws['node_chef_id']])
-
-    ws_combo = Gtk.ComboBox.new_with_model(ws_store)
+    hboxfilter = Gtk.HBox()
+    lblfilter = Gtk.Label(_('Search'))
+    lblfilter.show()
+    hboxfilter.pack_start(lblfilter, False, False, False)
+    txtfilter = Gtk.Entry()
+    txtfilter.set_activates_default(True)
+    txtfilter.show()
+    hboxfilter.pack_end(txtfilter, False, False, False)
+    hboxfilter.show()
+
+    store = Gtk.ListStore(str, str)
+    view = Gtk.TreeView(store)
     renderer_text = Gtk.CellRendererText()
-    ws_combo.pack_start(renderer_text, True)
-    ws_combo.add_attribute(renderer_text, "text", 0)    
-
-    ws_combo.show()
-    hboxws.pack_end(ws_combo, False, False, False)
-    hboxws.show()
-
-    dialog.get_message_area().pack_start(hboxws, False, False, False)
+    column = Gtk.TreeViewColumn(column_title, renderer_text, text=0)
+    view.append_column(column)
+    view.show()
+    scroll = Gtk.ScrolledWindow()
+    scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+    scroll.set_size_request(-1, 250)
+    scroll.add(view)
+    scroll.show()
+    lblerror = Gtk.Label()
+    lblerror.set_line_wrap(True)
+
+    def fill_store(rows):
+        store.clear()
+        for row in itertools.islice(rows, __NODES_SHOWN__):
+            store.append(list(row))
+
+    state = {'timeout': None, 'task': None}
+
+    def on_search_done(task, query):
+        # An older search that finished late is ignored.
+        if query != txtfilter.get_text():
+            return
+        try:
+            rows = task.result()
+        except Exception as e:
+            logger.warning('Search of %r failed: %s' % (query, e))
+            lblerror.set_text(_('The search failed: ') + str(e))
+            lblerror.show()
+            return
+        lblerror.hide()
+        fill_store(rows)
+
+    def run_search():
+        state['timeout'] = None
+        if state['task'] is not None:
+            state['task'].cancel()
+        query = txtfilter.get_text()
+        state['task'] = TaskExecutor.submit(search, query)
+        state['task'].add_done_callback(on_search_done, query)
+        return False
+
+    def on_filter_changed(entry):
+        # Wait for the user to stop typing before searching.
+        if state['timeout'] is not None:
+            GLib.source_remove(state['timeout'])
+        state['timeout'] = GLib.timeout_add(__SEARCH_DELAY__, run_search)
+
+    def on_row_activated(view, path, column):
+        dialog.response(Gtk.ResponseType.OK)
+
+    txtfilter.connect('changed', on_filter_changed)
+    view.connect('row-activated', on_row_activated)
+    fill_store(rows)
+
+    dialog.get_message_area().pack_start(hboxfilter, False, False, False)
+    dialog.get_message_area().pack_start(scroll, True, True, False)
+    dialog.get_message_area().pack_start(lblerror, False, False, False)
     result = dialog.run()
+    if state['timeout'] is not None:
+        GLib.source_remove(state['timeout'])
+    if state['task'] is not None:
+        state['task'].cancel()
     retval = None
     if result == Gtk.ResponseType.OK:
-        model = ws_combo.get_model()
-        retval = model[ws_combo.get_active()][1]
+        model, treeiter = view.get_selection().get_selected()
+        if treeiter is not None:
+            retval = model[treeiter][1]
     dialog.destroy()
     return retval
 
-def select_ou(title, text, ous):
-    dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.INFO,
-                                   Gtk.ButtonsType.OK_CANCEL)
-    dialog.set_title(title)
-    dialog.set_position(Gtk.WindowPosition.CENTER)
-    dialog.set_default_response(Gtk.ResponseType.OK)
-    dialog.set_icon_name('dialog-password')
-    dialog.set_markup(text)
+def _filter_by_name(items, text, get_name):
+    # Names starting with text first, then the ones containing it.
+    text = text.lower()
+    names = [(get_name(item).lower(), item) for item in items]
+    return [item for (name, item) in names if name.startswith(text)] + \
+        [item for (name, item) in names
+         if text in name and not name.startswith(text)]
 
-    hboxou = Gtk.HBox()
-    lblou = Gtk.Label(_('Select OU'))
-    lblou.set_visible(True)
-    hboxou.pack_start(lblou, False, False, False)
-    ou_store = Gtk.ListStore(str, str)
-    for ou in ous:
-        ou_store.append([ou[1], ou[0]])
+def select_node(title, text, hostnames, search=None):
+    '''
+    Lets the user pick a workstation and returns its node_chef_id.
 
-    ou_combo = Gtk.ComboBox.new_with_model(ou_store)
-    renderer_text = Gtk.CellRendererText()
-    ou_combo.pack_start(renderer_text, True)
-    ou_combo.add_attribute(renderer_text, "text", 0)    
+    hostnames is the initial list. If search is given, it is called
+    in a background task with the text typed in the filter entry and
+    must return the matching workstations; otherwise hostnames is
+    filtered locally.
+    '''
+    if search is None:
+        search = lambda prefix: _filter_by_name(hostnames, prefix,
+                                                lambda ws: ws['name'])
 
-    ou_combo.show()
-    hboxou.pack_end(ou_combo, False, False, False)
-    hboxou.show()
+    def to_rows(nodes):
+        return [(ws['name'], ws['node_chef_id']) for ws in nodes]
 
-    dialog.get_message_area().pack_start(hboxou, False, False, False)
-    result = dialog.run()
-    retval = None
-    if result == Gtk.ResponseType.OK:
-        model = ou_combo.get_model()
-        retval = model[ou_combo.get_active()][1]
-    dialog.destroy()
-    return retval
+    return _select_from_list(title, text, _('Select Workstation'),
+        to_rows(hostnames), lambda prefix: to_rows(search(prefix)))
+
+def select_ou(title, text, ous, search=None):
+    '''
+    Lets the user pick one of the [id, name] OUs and returns its id.
+    search works like in select_node.
+    '''
+    if search is None:
+        search = lambda prefix: _filter_by_name(ous, prefix,
+                                                lambda ou: ou[1])
+
+    def to_rows(ous):
+        return [(ou[1], ou[0]) for ou in ous]
+
+    return _select_from_list(title, text, _('Select OU'),
+        to_rows(ous), lambda prefix: to_rows(search(prefix)))
 
 
 def display_errors(title, messages):
+    return TaskExecutor.run_in_main_loop(_display_errors, title, messages)
+
+def _display_errors(title, messages):
     text = ''
     for message in messages:
         text += message + '\n'
@@ -649,6 +1145,45 @@ def message_box(title, text):
     dialog.destroy()
     return retval
 
+def confirm_changes(title, changes):
+    '''
+    Shows the changes computed by plan_changes and returns 1 if the
+    user accepts to apply them.
+    '''
+    dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.QUESTION,
+                                   Gtk.ButtonsType.OK_CANCEL)
+    dialog.set_title(title)
+    dialog.set_position(Gtk.WindowPosition.CENTER)
+    dialog.set_default_response(Gtk.ResponseType.OK)
+    dialog.set_markup(_('The following changes will be made in the system:'))
+
+    actions = {ChangePlanner.CREATE: _('Create'),
+               ChangePlanner.MODIFY: _('Modify'),
+               ChangePlanner.REMOVE: _('Remove')}
+    store = Gtk.ListStore(str, str, str)
+    for change in changes:
+        store.append([actions[change['action']], change['target'],
+                      change['detail'] or ''])
+    view = Gtk.TreeView(store)
+    for i, column_title in enumerate([_('Action'), _('Target'), _('Detail')]):
+        column = Gtk.TreeViewColumn(column_title, Gtk.CellRendererText(), text=i)
+        view.append_column(column)
+    view.show()
+    scroll = Gtk.ScrolledWindow()
+    scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+    scroll.set_size_request(500, 200)
+    scroll.add(view)
+    scroll.show()
+    dialog.get_message_area().pack_start(scroll, True, True, False)
+    result = dialog.run()
+
+    retval = 0
+    if result == Gtk.ResponseType.OK:
+        retval = 1
+
+    dialog.destroy()
+    return retval
+
 def auth_dialog(title, text):
     dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.INFO,
                                    Gtk.ButtonsType.OK_CANCEL)
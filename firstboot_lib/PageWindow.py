@@ -86,6 +86,7 @@ class PageWindow(Gtk.Window):
         self.fbe = FirstbootEntry.FirstbootEntry()
         self.builder = builder
         self.ui = builder.get_ui(self, True)
+        self.tasks = []
 
         self.page = builder.get_object(self.__gtype_name__)
         container = builder.get_object(self.__page_container__)
@@ -120,3 +121,30 @@ class PageWindow(Gtk.Window):
 
     def next_page(self, load_page_callback):
         pass
+
+    def run_task(self, func, args=(), callback=None):
+        """Runs func(*args) in a background thread while the main
+        window shows a busy state. Once finished, callback(task) is
+        called from the GTK main loop.
+        """
+        task = self.main_window.submit_task(func, args)
+        self.tasks.append(task)
+        self.main_window.set_busy(True)
+        task.add_done_callback(self._on_task_done, callback)
+        return task
+
+    def _on_task_done(self, task, callback):
+        # Dropped by cancel_tasks after it had finished.
+        if task not in self.tasks:
+            return
+        self.tasks.remove(task)
+        self.main_window.set_busy(False)
+        if callback is not None:
+            callback(task)
+
+    def cancel_tasks(self):
+        """Cancels the pending tasks, their callbacks won't be called."""
+        for task in self.tasks:
+            task.cancel()
+            self.main_window.set_busy(False)
+        self.tasks = []
@@ -0,0 +1,264 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+
+import sys
+import threading
+import Queue
+
+from gi.repository import GLib, GObject
+
+import logging
+logger = logging.getLogger('firstboot_lib')
+
+
+class TaskCancelledException(Exception):
+    '''
+    Raised when asking for the result of a cancelled task.
+    '''
+
+    def __init__(self, msg='The task was cancelled'):
+        Exception.__init__(self, msg)
+
+
+class Task():
+    """
+    Handle of a function submitted to a TaskExecutor.
+
+    The done callbacks are always called from the GTK main loop, so
+    they can safely update the user interface. They are not called
+    if the task was cancelled.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, func, args, kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._state = self.PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def cancel(self):
+        """
+        Cancels the task. A pending task will never run. A running
+        one can not be stopped: it finishes, but its result is
+        discarded and it's not done() until then.
+        Returns False if the task had already finished.
+        """
+        with self._lock:
+            if self._state == self.FINISHED:
+                return False
+            running = self._state == self.RUNNING
+            self._state = self.CANCELLED
+        if not running:
+            self._done.set()
+        return True
+
+    def cancelled(self):
+        return self._state == self.CANCELLED
+
+    def running(self):
+        return self._state == self.RUNNING
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits for the task and returns the value returned by the
+        function, raising the exception it raised if any.
+        """
+        self._done.wait(timeout)
+        if self.cancelled():
+            raise TaskCancelledException()
+        if self._exception is not None:
+            raise self._exception[0], self._exception[1], self._exception[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self._done.wait(timeout)
+        if self._exception is not None:
+            return self._exception[1]
+        return None
+
+    def add_done_callback(self, callback, *args):
+        """
+        Calls callback(task, *args) in the main loop once the task
+        has finished.
+        """
+        with self._lock:
+            self._callbacks.append((callback, args))
+            finished = self._state == self.FINISHED
+        if finished:
+            GLib.idle_add(self._invoke_callbacks, [(callback, args)])
+
+    def _invoke_callbacks(self, callbacks):
+        if self.cancelled():
+            return False
+        for callback, args in callbacks:
+            try:
+                callback(self, *args)
+            except Exception as e:
+                logger.exception(e)
+        return False
+
+    def _run(self):
+        with self._lock:
+            if self._state != self.PENDING:
+                return
+            self._state = self.RUNNING
+        try:
+            self._result = self._func(*self._args, **self._kwargs)
+        except Exception:
+            self._exception = sys.exc_info()
+        with self._lock:
+            cancelled = self._state == self.CANCELLED
+            if not cancelled:
+                self._state = self.FINISHED
+            callbacks = list(self._callbacks)
+        self._done.set()
+        if not cancelled and len(callbacks) > 0:
+            GLib.idle_add(self._invoke_callbacks, callbacks)
+
+
+class TaskExecutor():
+    """
+    Small thread pool that runs the slow operations (network requests,
+    external processes...) out of the GTK main loop.
+    """
+
+    def __init__(self, max_workers=4):
+        GObject.threads_init()
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        # Workers waiting for a task not submitted yet.
+        self._idle = 0
+        # Tasks queued while all the workers were busy.
+        self._backlog = 0
+
+    def submit(self, func, *args, **kwargs):
+        task = Task(func, args, kwargs)
+        with self._lock:
+            if self._idle > 0:
+                self._idle -= 1
+            elif len(self._workers) < self._max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+            else:
+                self._backlog += 1
+        self._queue.put(task)
+        return task
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            task._run()
+            with self._lock:
+                if self._backlog > 0:
+                    self._backlog -= 1
+                else:
+                    self._idle += 1
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+            self._workers = []
+            self._idle = 0
+            self._backlog = 0
+        for worker in workers:
+            self._queue.put(None)
+
+
+__MAIN_THREAD__ = threading.current_thread()
+__EXECUTOR__ = None
+__EXECUTOR_LOCK__ = threading.Lock()
+
+
+def get_executor():
+    global __EXECUTOR__
+    with __EXECUTOR_LOCK__:
+        if __EXECUTOR__ is None:
+            __EXECUTOR__ = TaskExecutor()
+        return __EXECUTOR__
+
+
+def submit(func, *args, **kwargs):
+    return get_executor().submit(func, *args, **kwargs)
+
+
+def spawn(func, *args, **kwargs):
+    """
+    Runs func in a thread of its own and returns its task. It's meant
+    for long or blocking work, like a chef-solo run or a task waiting
+    for other tasks, that must not hold a worker of the executor.
+    """
+    task = Task(func, args, kwargs)
+    thread = threading.Thread(target=task._run)
+    thread.daemon = True
+    thread.start()
+    return task
+
+
+def is_main_thread():
+    return threading.current_thread() is __MAIN_THREAD__
+
+
+def run_in_main_loop(func, *args, **kwargs):
+    """
+    Calls func in the GTK main loop and waits for its result. It's
+    meant for workers that need to show a dialog. When called from
+    the main thread the function is called directly.
+    """
+    if is_main_thread():
+        return func(*args, **kwargs)
+
+    done = threading.Event()
+    outcome = {}
+
+    def call():
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except Exception:
+            outcome['exception'] = sys.exc_info()
+        done.set()
+        return False
+
+    GLib.idle_add(call)
+    done.wait()
+    if 'exception' in outcome:
+        e = outcome['exception']
+        raise e[0], e[1], e[2]
+    return outcome['result']
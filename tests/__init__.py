@@ -2,12 +2,12 @@ import firstboot.serverconf
 import firstboot
 from firstboot.serverconf import *
 import json
+import os
 
 s = None
 conf = None
 
-fp = open('/home/damian/Proyectos/emergya/gecos/apps/gecosws-config-assistant/tests/autoconfig-gecos.json','r')
+fp = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'autoconfig-gecos.json'),'r')
 content = fp.read()
 conf = json.loads(content)
-s=ServerConf.Instance()
-s.load_data(conf)
+s=get_server_conf(conf)
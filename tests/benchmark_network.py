@@ -0,0 +1,251 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Benchmark of the serverconf network operations against the fake GCC.
+
+Every scenario runs get_json_autoconf, validate_credentials,
+get_hostnames and search_hostnames, with the node index removed before
+every call (cold) and kept (warm), a number of times with a given
+round-trip time, autoconf
+size (number of OUs), workstation count and number of credentials
+the CredentialResolver knows for the GCC, all but one of them
+rejected. Each scenario runs in its own process, so its peak RSS is
+measured alone. The background prefetch is disabled, so only the
+operation itself is counted.
+
+The results are written as JSON, and two result files can be compared:
+
+    python tests/benchmark_network.py -o before.json
+    ... change serverconf ...
+    python tests/benchmark_network.py -o after.json -c before.json
+"""
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import json
+import optparse
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.realpath(os.path.dirname(__file__)))
+
+from fakegcc import FakeGCC
+
+__BASE_SCENARIO__ = {'rtt': 0.0, 'ous': 10, 'nodes': 1000, 'credentials': 1}
+
+# The base scenario and the ones changing a single parameter of it.
+__SCENARIOS__ = [
+    ('base', {}),
+    ('rtt-20ms', {'rtt': 0.02}),
+    ('rtt-100ms', {'rtt': 0.1}),
+    ('ous-5000', {'ous': 5000}),
+    ('nodes-20000', {'nodes': 20000}),
+    ('nodes-100000', {'nodes': 100000}),
+    ('credentials-100', {'credentials': 100}),
+]
+
+__OPERATIONS__ = ['autoconf', 'autoconf-revalidate', 'validate', 'hostnames',
+                  'search-cold', 'search-warm']
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if len(samples) == 0:
+        return None
+    rank = int(round(p / 100.0 * len(samples) + 0.5)) - 1
+    return samples[max(0, min(rank, len(samples) - 1))]
+
+
+def clean_node_index(serverconf):
+    # Neither the index in memory nor the one on disk can answer.
+    serverconf.NODE_INDEXES = {}
+    if os.path.exists(serverconf.__NODE_INDEX_DIR__):
+        shutil.rmtree(serverconf.__NODE_INDEX_DIR__)
+
+
+def run_operation(serverconf, gcc, operation, iterations):
+    url = gcc.get_url('/auth/config/')
+    samples = []
+    clean_node_index(serverconf)
+    if operation == 'search-warm':
+        serverconf.search_hostnames(gcc.get_url(), gcc.username, gcc.password)
+    gcc.reset_stats()
+    for i in xrange(iterations):
+        if operation == 'autoconf':
+            serverconf.clean_json_cached()
+        if operation in ('hostnames', 'search-cold'):
+            clean_node_index(serverconf)
+        start = time.time()
+        if operation in ('autoconf', 'autoconf-revalidate'):
+            serverconf.get_json_autoconf(url)
+        elif operation == 'validate':
+            serverconf.validate_credentials(url)
+        elif operation == 'hostnames':
+            serverconf.get_hostnames(gcc.get_url(), gcc.username, gcc.password)
+        elif operation in ('search-cold', 'search-warm'):
+            serverconf.search_hostnames(gcc.get_url(), gcc.username, gcc.password, 'ws-0001')
+        samples.append(time.time() - start)
+    stats = gcc.get_stats()
+    return {
+        'operation': operation,
+        'iterations': iterations,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': sum(samples) / len(samples),
+        'bytes': stats['bytes'],
+        'requests': stats['requests'],
+        'connections': stats['connections'],
+    }
+
+
+def run_scenario(params, iterations):
+    from firstboot import serverconf
+    from firstboot.serverconf.AutoConfCache import AutoConfCache
+
+    gcc = FakeGCC(nodes=params['nodes'], ous=params['ous'],
+                  latency=params['rtt']).start()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        serverconf.set_prefetch_enabled(False)
+        serverconf.AUTOCONF_CACHE = AutoConfCache(os.path.join(tmpdir, 'json_cached'))
+        serverconf.PREFETCH_CACHE = AutoConfCache(os.path.join(tmpdir, 'json_prefetched'))
+        serverconf.__NODE_INDEX_DIR__ = os.path.join(tmpdir, 'nodes')
+        resolver = serverconf.get_credential_resolver()
+        resolver.clear()
+        url = gcc.get_url('/auth/config/')
+        for i in xrange(params['credentials'] - 1):
+            resolver.set_rejected(url, ('user-%d' % (i,), 'pwd'))
+        resolver.set_valid(url, (gcc.username, gcc.password))
+
+        # Warm up the imports and the connection pool.
+        serverconf.validate_credentials(url)
+        serverconf.get_json_autoconf(url)
+
+        results = [run_operation(serverconf, gcc, operation, iterations)
+                   for operation in __OPERATIONS__]
+    finally:
+        gcc.stop()
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def run_in_child(params, iterations):
+    # Run the scenario in a new process so peak RSS is its own.
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            output = {'results': run_scenario(params, iterations)}
+        except Exception as e:
+            output = {'error': '%s: %s' % (e.__class__.__name__, e)}
+        output['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(wfd, json.dumps(output))
+        os._exit(0)
+    os.close(wfd)
+    data = ''
+    while True:
+        chunk = os.read(rfd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    os.close(rfd)
+    os.waitpid(pid, 0)
+    return json.loads(data)
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, previous):
+    # Prints the ratio between the latencies of both reports.
+    old = {}
+    for scenario in previous['scenarios']:
+        for result in scenario.get('results', []):
+            old[(scenario['name'], result['operation'])] = result
+    for scenario in report['scenarios']:
+        for result in scenario.get('results', []):
+            before = old.get((scenario['name'], result['operation']))
+            if before is None:
+                continue
+            print >> sys.stderr, '%-16s %-20s p50 %6.2fx  p95 %6.2fx  bytes %6.2fx' % (
+                scenario['name'], result['operation'],
+                result['p50'] / max(before['p50'], 1e-9),
+                result['p95'] / max(before['p95'], 1e-9),
+                result['bytes'] / float(max(before['bytes'], 1)))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-i', '--iterations', type='int', default=20)
+    parser.add_option('-s', '--scenario', action='append', default=None,
+        help='Run only this scenario (can be repeated)')
+    parser.add_option('-o', '--output', default=None,
+        help='Write the JSON report to this file instead of stdout')
+    parser.add_option('-c', '--compare', default=None,
+        help='Previous JSON report to compare with')
+    (options, args) = parser.parse_args()
+
+    report = {
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenarios': []
+    }
+    for name, changes in __SCENARIOS__:
+        if options.scenario and name not in options.scenario:
+            continue
+        params = dict(__BASE_SCENARIO__)
+        params.update(changes)
+        scenario = {'name': name, 'params': params}
+        scenario.update(run_in_child(params, options.iterations))
+        report['scenarios'].append(scenario)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        fp = open(options.output, 'w')
+        fp.write(output)
+        fp.close()
+    else:
+        print output
+
+    if options.compare:
+        fp = open(options.compare, 'r')
+        compare(report, json.loads(fp.read()))
+        fp.close()
+
+
+if __name__ == '__main__':
+    main()
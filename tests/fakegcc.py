@@ -0,0 +1,326 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+
+# This file is part of Guadalinex
+#
+# This software is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this package; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Stand-in for the GECOS Control Center used to test the serverconf
+HTTP code offline. It serves the endpoints used by the assistant:
+
+    /auth/config/       autoconf file (basic auth, ETag validation)
+    /computers/list/    workstations (basic auth, "page", "pagesize"
+                        and "name" query parameters)
+    /validation.pem     Chef validation certificate
+
+The latency, bandwidth and errors of every response can be configured,
+and the server counts the requests, connections and bytes it serves.
+
+    server = FakeGCC(nodes=20000, latency=0.05).start()
+    url = server.get_url('/auth/config/')
+    ...
+    server.stop()
+
+It can also be run by hand: python tests/fakegcc.py --help
+"""
+
+__author__ = "David Amian <damian@emergya.com>"
+__copyright__ = "Copyright (C) 2014, Junta de Andalucía <devmaster@guadalinex.org>"
+__license__ = "GPL-2"
+
+import BaseHTTPServer
+import SocketServer
+import base64
+import copy
+import hashlib
+import json
+import math
+import optparse
+import os
+import random
+import threading
+import time
+import urlparse
+
+__AUTOCONF_FILE__ = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'autoconfig-gecos.json')
+
+
+def make_nodes(count, prefix='ws'):
+    """
+    Synthetic inventory of count workstations.
+    """
+    return [{'name': '%s-%06d' % (prefix, i),
+             'node_chef_id': hashlib.md5('%s%d' % (prefix, i)).hexdigest()}
+            for i in xrange(count)]
+
+
+def make_ous(count):
+    return [['ou_%d' % (i,), 'OU %d' % (i,)] for i in xrange(count)]
+
+
+class FakeGCCHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.gcc.count('connections')
+
+    def log_message(self, format, *args):
+        if self.server.gcc.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        gcc = self.server.gcc
+        gcc.count('requests')
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+
+        if gcc.latency > 0:
+            time.sleep(gcc.latency)
+
+        error = gcc.pop_error(url.path)
+        if error == FakeGCC.DROP:
+            self.close_connection = 1
+            return
+        if error is not None:
+            return self.send_body(error, 'text/plain', 'Injected error\n')
+
+        if url.path == '/auth/config/':
+            if not self.authenticate():
+                return
+            self.send_autoconf()
+        elif url.path == '/computers/list/':
+            if not self.authenticate():
+                return
+            self.send_nodes(query)
+        elif url.path == '/validation.pem':
+            self.send_body(200, 'application/x-pem-file', gcc.get_pem())
+        else:
+            self.send_body(404, 'text/plain', 'Not found\n')
+
+    def authenticate(self):
+        gcc = self.server.gcc
+        header = self.headers.getheader('Authorization') or ''
+        if header.startswith('Basic '):
+            credential = base64.b64decode(header[6:])
+            if credential == '%s:%s' % (gcc.username, gcc.password):
+                return True
+        gcc.count('rejected')
+        self.send_body(401, 'text/plain', 'Unauthorized\n',
+                       {'WWW-Authenticate': 'Basic realm="GCC"'})
+        return False
+
+    def send_autoconf(self):
+        body, etag = self.server.gcc.get_autoconf()
+        if self.headers.getheader('If-None-Match') == etag:
+            return self.send_body(304, None, '', {'ETag': etag})
+        self.send_body(200, 'application/json', body, {'ETag': etag})
+
+    def send_nodes(self, query):
+        gcc = self.server.gcc
+        nodes = gcc.nodes
+        prefix = query.get('name')
+        if prefix:
+            nodes = [n for n in nodes
+                     if n['name'].lower().startswith(prefix.lower())]
+        if not gcc.paged:
+            return self.send_body(200, 'application/json', json.dumps(nodes))
+        pagesize = max(int(query.get('pagesize', 100)), 1)
+        page = max(int(query.get('page', 1)), 1)
+        pages = max(int(math.ceil(len(nodes) / float(pagesize))), 1)
+        start = (page - 1) * pagesize
+        body = json.dumps({'nodes': nodes[start:start + pagesize],
+                           'page': page, 'pages': pages})
+        self.send_body(200, 'application/json', body)
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.server.gcc.write(self.wfile, body)
+
+
+class FakeGCCServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, gcc, address):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeGCCHandler)
+        self.gcc = gcc
+
+
+class FakeGCC():
+    """
+    Fake GCC server running in a background thread.
+
+    latency is the delay in seconds added to every response and
+    bandwidth, if given, the number of bytes per second the bodies are
+    sent at. Errors are injected with fail(); error_rate makes that
+    fraction of the requests fail with a 503, with a reproducible seed.
+    """
+
+    # Error that closes the connection without sending a response.
+    DROP = 'drop'
+
+    def __init__(self, username='admin', password='secret', nodes=100,
+                 ous=3, latency=0, bandwidth=None, paged=True,
+                 error_rate=0, seed=0, verbose=False):
+        self.username = username
+        self.password = password
+        if isinstance(nodes, int):
+            nodes = make_nodes(nodes)
+        self.nodes = nodes
+        self.ous = make_ous(ous)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.paged = paged
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self._random = random.Random(seed)
+        self._errors = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._autoconf = None
+
+        fp = open(__AUTOCONF_FILE__, 'r')
+        self._template = json.loads(fp.read())
+        fp.close()
+
+    def start(self, host='127.0.0.1', port=0):
+        self._server = FakeGCCServer(self, (host, port))
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def get_url(self, path=''):
+        host, port = self._server.server_address
+        return 'http://%s:%d%s' % (host, port, path)
+
+    def get_autoconf(self):
+        """
+        Returns the autoconf file pointing to this server and its ETag.
+        """
+        with self._lock:
+            if self._autoconf is None:
+                conf = copy.deepcopy(self._template)
+                conf['gcc']['uri_gcc'] = self.get_url()
+                conf['gcc']['gcc_username'] = self.username
+                conf['gcc']['ou_username'] = self.ous
+                body = json.dumps(conf, indent=4)
+                self._autoconf = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+            return self._autoconf
+
+    def set_autoconf(self, conf):
+        """
+        Replaces the served autoconf file, which changes its ETag.
+        """
+        with self._lock:
+            self._template = conf
+            self._autoconf = None
+
+    def get_pem(self):
+        return base64.b64decode(self._template['chef']['chef_validation'])
+
+    def fail(self, path, status=503, times=1):
+        """
+        Makes the next `times` requests to path fail with status, which
+        can be FakeGCC.DROP to close the connection instead.
+        """
+        with self._lock:
+            self._errors.setdefault(path, []).extend([status] * times)
+
+    def pop_error(self, path):
+        with self._lock:
+            errors = self._errors.get(path)
+            if errors:
+                return errors.pop(0)
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                return 503
+        return None
+
+    def write(self, wfile, body):
+        if not self.bandwidth:
+            wfile.write(body)
+            self.count('bytes', len(body))
+            return
+        # Send the body in 10 chunks per second.
+        chunk_size = max(int(self.bandwidth / 10), 1)
+        for start in xrange(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            wfile.write(chunk)
+            wfile.flush()
+            self.count('bytes', len(chunk))
+            time.sleep(len(chunk) / float(self.bandwidth))
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + value
+
+    def get_stats(self):
+        """
+        Returns the number of requests, connections, rejected requests
+        and body bytes served since the last reset.
+        """
+        with self._lock:
+            stats = {'requests': 0, 'connections': 0, 'rejected': 0, 'bytes': 0}
+            stats.update(self._stats)
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser()
+    parser.add_option('-p', '--port', type='int', default=8000)
+    parser.add_option('-n', '--nodes', type='int', default=100)
+    parser.add_option('-l', '--latency', type='float', default=0,
+        help='Delay added to every response, in seconds')
+    parser.add_option('-b', '--bandwidth', type='int', default=None,
+        help='Bytes per second')
+    parser.add_option('-e', '--error-rate', type='float', default=0,
+        help='Fraction of requests answered with a 503')
+    parser.add_option('--unpaged', action='store_true', default=False,
+        help='Answer the workstation list as a plain array')
+    (options, args) = parser.parse_args()
+
+    gcc = FakeGCC(nodes=options.nodes, latency=options.latency,
+                  bandwidth=options.bandwidth, error_rate=options.error_rate,
+                  paged=not options.unpaged, verbose=True)
+    gcc.start(port=options.port)
+    print 'Fake GCC listening on %s (%s/%s)' % (gcc.get_url(),
+                                                 gcc.username, gcc.password)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        gcc.stop()
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.AppliedState import AppliedState
+
+
+class TestAppliedState(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.state = AppliedState(os.path.join(self.tmpdir, 'applied.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        fp = open(path, 'wb')
+        fp.write(content)
+        fp.close()
+        return path
+
+    def test_dry_run_fingerprint(self):
+        pem = self.write('validation.pem', 'PEM')
+        krb5 = self.write('krb5.conf', '[libdefaults]')
+        applied = {'gecos_ws_mgmt': {
+            'misc_mgmt': {'chef_conf_res': {'chef_validation_pem': pem}},
+            'network_mgmt': {'sssd_res': {'krb5_url': 'file://' + krb5}}}}
+        self.state.record(applied)
+        # What the dry run gives for the same files.
+        planned = {'gecos_ws_mgmt': {
+            'misc_mgmt': {'chef_conf_res': {'chef_validation_pem': self.state.hash_content('PEM')}},
+            'network_mgmt': {'sssd_res': {'krb5_url': self.state.hash_content('[libdefaults]')}}}}
+        self.assertEqual([], self.state.get_changed(planned))
+
+        planned['gecos_ws_mgmt']['misc_mgmt']['chef_conf_res']['chef_validation_pem'] = \
+            self.state.hash_content('OTHER PEM')
+        self.assertEqual(['misc_mgmt/chef_conf_res'], self.state.get_changed(planned))
+
+
+if __name__ == '__main__':
+    unittest.main()
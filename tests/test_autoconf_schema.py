@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import copy
+import json
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ServerConf import ServerConf
+from firstboot.serverconf import AutoconfSchema
+
+__AUTOCONF_JSON__ = os.path.join(os.path.dirname(__file__), 'autoconfig-gecos.json')
+
+
+class TestAutoconfSchema(unittest.TestCase):
+    def setUp(self):
+        fp = open(__AUTOCONF_JSON__, 'r')
+        self.conf = json.load(fp)
+        fp.close()
+        self.server_conf = ServerConf()
+
+    def test_load(self):
+        self.assertEqual([], self.server_conf.load_data(self.conf))
+        self.assertEqual('My Organization', self.server_conf.get_organization())
+        self.assertEqual('http://URL_NTP_SERVER', self.server_conf.get_ntp_conf().get_uri_ntp())
+        self.assertEqual('ldap', self.server_conf.get_auth_conf().get_auth_type())
+        self.assertEqual('URL_LDAP', self.server_conf.get_auth_conf().get_ldap_conf().get_url())
+        self.assertEqual(True, self.server_conf.get_gcc_conf().get_gcc_link())
+
+    def test_errors(self):
+        conf = copy.deepcopy(self.conf)
+        conf['version'] = '0.1.0'
+        conf['gcc']['gcc_link'] = 'yes'
+        del conf['chef']['chef_server_uri']
+        conf['auth']['auth_properties']['port'] = 389
+        errors = dict((error['path'], error['error'])
+                      for error in self.server_conf.load_data(conf))
+        self.assertEqual({
+            'version': AutoconfSchema.INVALID,
+            'gcc.gcc_link': AutoconfSchema.INVALID,
+            'chef.chef_server_uri': AutoconfSchema.MISSING,
+            'auth.auth_properties.port': AutoconfSchema.UNKNOWN,
+        }, errors)
+        # The valid values are loaded anyway.
+        self.assertEqual('ADMIN_USER', self.server_conf.get_gcc_conf().get_gcc_username())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ChangeJournal import ChangeJournal
+from firstboot.serverconf.GCCConf import GCCConf
+
+
+class TestChangeJournal(unittest.TestCase):
+    def test_versions(self):
+        journal = ChangeJournal()
+        self.assertEqual(0, journal.get_version())
+        entry = journal.record('gcc', 'uri_gcc', '', 'http://gcc/')
+        self.assertEqual({'version': 1, 'section': 'gcc', 'field': 'uri_gcc',
+                          'old': '', 'new': 'http://gcc/'}, entry)
+        journal.record('chef', 'url', '', 'https://chef/')
+        journal.record('gcc', 'gcc_link', False, True)
+        self.assertEqual(3, journal.get_version())
+        self.assertEqual(3, journal.get_version('gcc'))
+        self.assertEqual(2, journal.get_version('chef'))
+        self.assertEqual(0, journal.get_version('auth'))
+
+        self.assertEqual([1, 2, 3], [e['version'] for e in journal.get_changes()])
+        self.assertEqual([3], [e['version'] for e in journal.get_changes(since=2)])
+        self.assertEqual([1, 3], [e['version'] for e in journal.get_changes(section='gcc')])
+
+    def test_max_entries(self):
+        journal = ChangeJournal(max_entries=2)
+        for i in range(5):
+            journal.record('ntp', 'server', i, i + 1)
+        self.assertEqual([4, 5], [e['version'] for e in journal.get_changes()])
+        self.assertEqual(5, journal.get_version('ntp'))
+
+    def test_dirty(self):
+        journal = ChangeJournal()
+        journal.record('gcc', 'uri_gcc', '', 'http://gcc/')
+        journal.record('chef', 'url', '', 'https://chef/')
+        self.assertEqual(set(['gcc', 'chef']), journal.get_dirty())
+        self.assertTrue(journal.is_dirty('gcc'))
+
+        journal.clear_dirty(['gcc'])
+        self.assertFalse(journal.is_dirty('gcc'))
+        self.assertTrue(journal.is_dirty('chef'))
+
+        # Changed after the version that was applied.
+        version = journal.get_version()
+        journal.record('chef', 'url', 'https://chef/', 'https://chef2/')
+        journal.record('gcc', 'uri_gcc', 'http://gcc/', 'http://gcc2/')
+        journal.clear_dirty(version=version)
+        self.assertEqual(set(['gcc', 'chef']), journal.get_dirty())
+        journal.clear_dirty(version=journal.get_version())
+        self.assertEqual(set(), journal.get_dirty())
+
+    def test_subscribers(self):
+        journal = ChangeJournal()
+        everything = []
+        gcc = []
+        journal.subscribe(everything.append)
+        journal.subscribe(gcc.append, 'gcc')
+        journal.record('gcc', 'uri_gcc', '', 'http://gcc/')
+        journal.record('chef', 'url', '', 'https://chef/')
+        self.assertEqual(['gcc', 'chef'], [e['section'] for e in everything])
+        self.assertEqual(['gcc'], [e['section'] for e in gcc])
+
+        journal.unsubscribe(gcc.append, 'gcc')
+        journal.record('gcc', 'gcc_link', False, True)
+        self.assertEqual(1, len(gcc))
+        self.assertEqual(3, len(everything))
+
+    def test_failing_subscriber(self):
+        journal = ChangeJournal()
+        entries = []
+        journal.subscribe(lambda entry: 1 / 0)
+        journal.subscribe(entries.append)
+        journal.record('gcc', 'uri_gcc', '', 'http://gcc/')
+        self.assertEqual(1, len(entries))
+
+    def test_attached_record(self):
+        journal = ChangeJournal()
+        gcc_conf = GCCConf().attach(journal, 'gcc')
+        gcc_conf.set_uri_gcc(u'http://gcc/')
+        # Setting the same value is not a change.
+        gcc_conf.set_uri_gcc('http://gcc/')
+        gcc_conf.add_ou_username('ou=1')
+        self.assertEqual([('uri_gcc', '', 'http://gcc/'), ('ou_username', [], ['ou=1'])],
+                         [(e['field'], e['old'], e['new']) for e in journal.get_changes()])
+
+        # Copies are not attached.
+        gcc_conf.copy().set_uri_gcc('http://other/')
+        self.assertEqual(2, journal.get_version())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ChefSoloPlan import ChefSoloPlan
+
+UNLINK_GCC = {'run_list': ['recipe[gecos_ws_mgmt::unlink_from_gcc]'],
+              'gecos_ws_mgmt': {'misc_mgmt': {'gcc_res': {'gcc_link': False}}}}
+UNLINK_SSSD = {'run_list': ['recipe[gecos_ws_mgmt::unlink_from_sssd]'],
+               'gecos_ws_mgmt': {'network_mgmt': {'sssd_res': {'enabled': False}}}}
+APPLY = {'run_list': ['recipe[gecos_ws_mgmt::local]'],
+         'gecos_ws_mgmt': {'misc_mgmt': {'tz_date_res': {'server': 'ntp.example'}}}}
+
+
+class TestChefSoloPlan(unittest.TestCase):
+    def test_merge_unlinks(self):
+        plan = ChefSoloPlan().add(ChefSoloPlan.UNLINK, UNLINK_GCC) \
+                             .add(ChefSoloPlan.UNLINK, UNLINK_SSSD)
+        phases = plan.get_phases()
+        self.assertEqual(1, len(phases))
+        self.assertEqual(UNLINK_GCC['run_list'] + UNLINK_SSSD['run_list'], phases[0]['run_list'])
+        self.assertEqual({'enabled': False}, phases[0]['gecos_ws_mgmt']['network_mgmt']['sssd_res'])
+
+    def test_merge_unlink_and_apply(self):
+        # The apply recipe reads every resource, so it can't see the
+        # unlinked gcc_res: the unlink runs first, on its own.
+        plan = ChefSoloPlan().add(ChefSoloPlan.APPLY, APPLY) \
+                             .add(ChefSoloPlan.UNLINK, UNLINK_GCC)
+        phases = plan.get_phases()
+        self.assertEqual([UNLINK_GCC['run_list'], APPLY['run_list']],
+                         [phase['run_list'] for phase in phases])
+
+        apply = {'run_list': APPLY['run_list'],
+                 'gecos_ws_mgmt': {'misc_mgmt': {'gcc_res': {'gcc_link': False}}}}
+        plan = ChefSoloPlan().add(ChefSoloPlan.UNLINK, UNLINK_GCC) \
+                             .add(ChefSoloPlan.APPLY, apply)
+        self.assertEqual(1, len(plan.get_phases()))
+
+    def test_commit(self):
+        plan = ChefSoloPlan().add(ChefSoloPlan.APPLY, APPLY) \
+                             .add(ChefSoloPlan.UNLINK, UNLINK_GCC)
+        self.assertEqual(2, len(list(plan.commit())))
+        self.assertTrue(plan.is_empty())
+
+    def test_commit_failed(self):
+        plan = ChefSoloPlan().add(ChefSoloPlan.APPLY, APPLY) \
+                             .add(ChefSoloPlan.UNLINK, UNLINK_GCC)
+        for json_solo in plan.commit():
+            # The first phase fails.
+            break
+        self.assertEqual(2, len(plan.get_phases()))
+
+        for json_solo in plan.commit():
+            if json_solo['run_list'] == APPLY['run_list']:
+                break
+        self.assertEqual([APPLY['run_list']],
+                         [phase['run_list'] for phase in plan.get_phases()])
+
+    def test_discard(self):
+        plan = ChefSoloPlan().add(ChefSoloPlan.APPLY, APPLY) \
+                             .add(ChefSoloPlan.UNLINK, UNLINK_GCC)
+        plan.discard(ChefSoloPlan.APPLY)
+        self.assertEqual([UNLINK_GCC['run_list']],
+                         [phase['run_list'] for phase in plan.get_phases()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ChefSoloReport import ChefSoloReport
+
+# chef-solo -F doc output of a run that failed
+__CHEF_LOG__ = os.path.join(os.path.dirname(__file__), 'chef-solo-doc.log')
+
+SUCCESS = """Starting Chef Client, version 11.8.2
+Converging 2 resources
+Recipe: gecos_ws_mgmt::local
+  * template[/etc/gcc.control] action create
+    - create new file /etc/gcc.control
+  * service[sssd] action restart
+    - restart service service[sssd]
+Chef Client finished, 2 resources updated
+"""
+
+
+class TestChefSoloReport(unittest.TestCase):
+    def read_log(self):
+        fp = open(__CHEF_LOG__, 'r')
+        lines = fp.readlines()
+        fp.close()
+        return lines
+
+    def test_failed_run(self):
+        report = ChefSoloReport.parse(self.read_log())
+        self.assertFalse(report.success)
+        self.assertEqual([
+            ('gecos_ws_mgmt_tz_date[localtime]', 'setup', 'gecos_ws_mgmt::local', 'up to date'),
+            ('package[ntpdate]', 'install', 'gecos_ws_mgmt::tz_date', 'up to date'),
+            ('template[/etc/default/ntpdate]', 'create', 'gecos_ws_mgmt::tz_date', 'updated'),
+            ('user[ana]', 'create', 'gecos_ws_mgmt::local_users', 'skipped'),
+            ('execute[gpasswd -a ana sudo]', 'run', 'gecos_ws_mgmt::local_users', 'failed')],
+            [(r['resource'], r['action'], r['recipe'], r['status']) for r in report.resources])
+        self.assertEqual(['template[/etc/default/ntpdate]'],
+                         [r['resource'] for r in report.get_changed()])
+        self.assertEqual('execute[gpasswd -a ana sudo]', report.failed_resource)
+
+    def test_error_excerpt(self):
+        report = ChefSoloReport.parse(self.read_log())
+        # From the exception to the resource dump, without the
+        # separators and the blank lines around.
+        self.assertEqual('Mixlib::ShellOut::ShellCommandFailed', report.error[0])
+        self.assertEqual('Ran gpasswd -a ana sudo returned 3', report.error[-1])
+        self.assertTrue("STDERR: gpasswd: user 'ana' does not exist" in report.error)
+        self.assertFalse(any(line.startswith('=====') for line in report.error))
+
+        report = ChefSoloReport()
+        report.EXCERPT_LINES = 3
+        for line in self.read_log():
+            report.feed(line)
+        report.finish()
+        self.assertEqual(3, len(report.error))
+
+    def test_durations(self):
+        report = ChefSoloReport()
+        times = [100.0, 101.0, 102.0, 103.0, 104.0, 105.0, 106.0, 110.0]
+        for (line, now) in zip(SUCCESS.splitlines(), times):
+            report.feed(line, now)
+        # Already ended by the last line.
+        report.finish(True, 120.0)
+        self.assertEqual([2.0, 5.0], [r['duration'] for r in report.resources])
+        self.assertEqual([('gecos_ws_mgmt::local', 7.0)], report.get_recipe_times())
+        self.assertEqual(10.0, report.get_total_time())
+        self.assertEqual(['service[sssd]', 'template[/etc/gcc.control]'],
+                         [r['resource'] for r in report.get_slowest()])
+
+    def test_exit_status_wins(self):
+        report = ChefSoloReport()
+        for line in SUCCESS.splitlines():
+            report.feed(line)
+        self.assertTrue(report.success)
+        # chef-solo said it finished, but exited with an error.
+        report.finish(False)
+        self.assertFalse(report.success)
+
+        report = ChefSoloReport()
+        for line in self.read_log():
+            report.feed(line)
+        report.finish(True)
+        self.assertTrue(report.success)
+
+    def test_without_end(self):
+        # Killed before it could say anything.
+        report = ChefSoloReport.parse(SUCCESS.splitlines()[:4])
+        self.assertTrue(report.success)
+        self.assertEqual(0.0, report.resources[0]['duration'])
+        report = ChefSoloReport.parse([])
+        self.assertEqual(0.0, report.get_total_time())
+
+    def test_to_dict(self):
+        data = ChefSoloReport.parse(self.read_log()).to_dict()
+        self.assertEqual(False, data['success'])
+        self.assertEqual('execute[gpasswd -a ana sudo]', data['failed_resource'])
+        self.assertEqual(['template[/etc/default/ntpdate]'], data['changed'])
+        self.assertFalse(any('started' in r for r in data['resources']))
+        self.assertTrue(data['error'].startswith('Mixlib::ShellOut::ShellCommandFailed\n'))
+
+if __name__ == '__main__':
+    unittest.main()
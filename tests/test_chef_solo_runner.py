@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import signal
+import subprocess
+import time
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ChefSoloRunner import ChefSoloRunner, _make_preexec
+
+OUTPUT = """Starting Chef Client, version 11.8.2
+Compiling Cookbooks...
+Converging 3 resources
+Recipe: gecos_ws_mgmt::local
+  * template[/etc/gcc.control] action create
+    - update content in file /etc/gcc.control
+  * package[ntpdate] action install (up to date)
+[2014-05-12T10:00:00+02:00] INFO: Processing execute[ntpdate] action run (gecos_ws_mgmt::tz_date line 20)
+Chef Client finished, 2 resources updated
+"""
+
+
+def is_alive(pid):
+    # Zombies are dead, whoever has to reap them.
+    try:
+        fp = open('/proc/%d/stat' % (pid,))
+    except IOError:
+        return False
+    state = fp.read().rsplit(')', 1)[1].split()[0]
+    fp.close()
+    return state != 'Z'
+
+
+def wait_dead(pid, timeout=5):
+    deadline = time.time() + timeout
+    while is_alive(pid) and time.time() < deadline:
+        time.sleep(0.1)
+
+
+class TestChefSoloRunner(unittest.TestCase):
+    def spawn(self, runner, args, **kwargs):
+        # The process the runner would have started.
+        runner._process = subprocess.Popen(args, preexec_fn=_make_preexec(), **kwargs)
+        self.addCleanup(self.reap, runner._process)
+        return runner._process
+
+    def reap(self, process):
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    def test_progress(self):
+        runner = ChefSoloRunner(['chef-solo'])
+        resources = []
+        runner.add_listener(lambda progress: resources.append(progress.resource))
+        lines = OUTPUT.splitlines()
+        for line in lines[:5]:
+            runner._parse(line)
+        progress = runner.get_progress()
+        self.assertEqual(3, progress.total)
+        self.assertEqual(0, progress.completed)
+        self.assertEqual('template[/etc/gcc.control] (create)', progress.resource)
+
+        for line in lines[5:8]:
+            runner._parse(line)
+        self.assertEqual(2, progress.completed)
+        self.assertEqual('execute[ntpdate] (run)', progress.resource)
+
+        runner._parse(lines[8])
+        self.assertEqual(3, progress.completed)
+        self.assertEqual(None, progress.resource)
+        self.assertEqual(1.0, progress.get_fraction())
+        self.assertEqual(['template[/etc/gcc.control] (create)',
+                          'package[ntpdate] (install)',
+                          'execute[ntpdate] (run)', None], resources)
+        self.assertEqual(lines, runner.get_tail())
+
+    def test_unknown_total(self):
+        runner = ChefSoloRunner(['chef-solo'])
+        runner._parse('  * service[sssd] action restart')
+        self.assertEqual(None, runner.get_progress().get_fraction())
+
+    def test_deadline(self):
+        runner = ChefSoloRunner(['chef-solo'], deadline=60, stall_timeout=30)
+        process = self.spawn(runner, ['sleep', '30'])
+        runner._on_timer()
+        self.assertEqual(None, process.poll())
+
+        runner.get_progress().started -= 61
+        runner._on_timer()
+        self.assertEqual(ChefSoloRunner.TIMED_OUT, runner._outcome)
+        self.assertEqual(-signal.SIGTERM, process.wait())
+
+    def test_stall(self):
+        runner = ChefSoloRunner(['chef-solo'], deadline=60, stall_timeout=30)
+        process = self.spawn(runner, ['sleep', '30'])
+        runner.get_progress().last_output = time.time() - 31
+        runner._on_timer()
+        self.assertEqual(ChefSoloRunner.TIMED_OUT, runner._outcome)
+        self.assertEqual(-signal.SIGTERM, process.wait())
+
+    def test_recent_output(self):
+        runner = ChefSoloRunner(['chef-solo'], stall_timeout=30)
+        process = self.spawn(runner, ['sleep', '30'])
+        runner.get_progress().started -= 3600
+        runner._on_timer()
+        self.assertEqual(None, runner._outcome)
+        self.assertEqual(None, process.poll())
+
+    def test_cancel_escalation(self):
+        runner = ChefSoloRunner(['chef-solo'])
+        # Ignores SIGTERM, like a resource stuck in the kernel.
+        process = self.spawn(runner, ['sh', '-c', 'trap "" TERM; sleep 30 & wait'])
+        time.sleep(0.2)
+        runner._stop(ChefSoloRunner.CANCELLED)
+        time.sleep(0.2)
+        self.assertEqual(None, process.poll())
+        # A second stop doesn't change the outcome.
+        runner._stop(ChefSoloRunner.TIMED_OUT)
+        self.assertEqual(ChefSoloRunner.CANCELLED, runner._outcome)
+
+        runner._kill()
+        self.assertEqual(-signal.SIGKILL, process.wait())
+
+    def test_kill_group(self):
+        runner = ChefSoloRunner(['chef-solo'])
+        process = self.spawn(runner, ['sh', '-c', 'sleep 30 & echo $!; wait'],
+                             stdout=subprocess.PIPE)
+        child = int(process.stdout.readline())
+        runner._stop(ChefSoloRunner.CANCELLED)
+        process.wait()
+        # What chef-solo started is stopped with it.
+        wait_dead(child)
+        self.assertFalse(is_alive(child))
+
+    def test_parent_death_signal(self):
+        # The assistant dies without running its atexit handlers.
+        (rfd, wfd) = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            child = subprocess.Popen(['sleep', '30'], preexec_fn=_make_preexec())
+            os.write(wfd, str(child.pid))
+            os._exit(0)
+        os.close(wfd)
+        child = int(os.read(rfd, 32))
+        os.close(rfd)
+        os.waitpid(pid, 0)
+        wait_dead(child)
+        self.assertFalse(is_alive(child))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import copy
+import threading
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ChangeJournal import ChangeJournal
+from firstboot.serverconf.GCCConf import GCCConf
+from firstboot.serverconf.ServerConf import ServerConf
+from firstboot.serverconf.UsersConf import UsersConf, Users
+
+
+def make_users():
+    users_conf = UsersConf()
+    users_conf.add_user_to_list(Users().set_user('ana').add_groups(['sudo', 'cdrom']))
+    return users_conf
+
+
+class TestConfRecord(unittest.TestCase):
+    def test_strings(self):
+        gcc_conf = GCCConf().set_uri_gcc(u'http://gcc/\xf1')
+        # Kept UTF-8 encoded, like GTK gives them.
+        self.assertEqual('http://gcc/\xc3\xb1', gcc_conf.get_uri_gcc())
+        self.assertEqual(GCCConf().set_uri_gcc('http://gcc/\xc3\xb1'), gcc_conf)
+
+    def test_eq_hash(self):
+        a = make_users()
+        b = make_users()
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(1, len(set([a, b])))
+        b.get_users_list()[0].add_group('audio')
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(hash(a), hash(b))
+        # Same values, other kind of record.
+        self.assertNotEqual(GCCConf(), UsersConf())
+
+    def test_copy(self):
+        users_conf = make_users()
+        for other in [users_conf.copy(), copy.copy(users_conf), copy.deepcopy(users_conf)]:
+            self.assertEqual(users_conf, other)
+            # Nested records and lists are copied too.
+            self.assertFalse(other.get_users_list() is users_conf.get_users_list())
+            self.assertFalse(other.get_users_list()[0] is users_conf.get_users_list()[0])
+            other.get_users_list()[0].add_group('audio')
+            self.assertEqual(['sudo', 'cdrom'], users_conf.get_users_list()[0].get_groups())
+
+    def test_copy_not_attached(self):
+        journal = ChangeJournal()
+        users_conf = make_users().attach(journal, 'users')
+        users_conf.get_users_list()[0].add_group('audio')
+        self.assertEqual(1, journal.get_version('users'))
+        other = users_conf.copy()
+        other.get_users_list()[0].add_group('video')
+        other.add_user_to_list(Users().set_user('bob'))
+        self.assertEqual(1, journal.get_version('users'))
+
+    def test_to_dict(self):
+        users_conf = make_users()
+        self.assertEqual({'users_list': [{'actiontorun': '', 'groups': ['sudo', 'cdrom'],
+                                          'name': '', 'user': 'ana', 'password': '',
+                                          'deletehome': None}]}, users_conf.to_dict())
+        self.assertEqual({'uri_gcc': ''}, GCCConf().to_dict(['uri_gcc']))
+
+    def test_locked_copy(self):
+        # A copy is never taken in the middle of a change.
+        server_conf = ServerConf()
+        gcc_conf = server_conf.get_gcc_conf()
+        changing = threading.Event()
+        copies = []
+
+        def take_copy():
+            changing.wait()
+            copies.append(server_conf.copy())
+
+        thread = threading.Thread(target=take_copy)
+        thread.start()
+        with server_conf.lock():
+            changing.set()
+            gcc_conf.set_uri_gcc('http://gcc/')
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            gcc_conf.set_gcc_username('admin')
+        thread.join()
+        self.assertEqual('http://gcc/', copies[0].get_gcc_conf().get_uri_gcc())
+        self.assertEqual('admin', copies[0].get_gcc_conf().get_gcc_username())
+        # The copy has its own journal and lock.
+        self.assertFalse(copies[0].lock() is server_conf.lock())
+        self.assertEqual(0, copies[0].get_journal().get_version())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import json
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.CookbookBundle import CookbookBundle
+
+COOKBOOKS = {
+    'gecos_ws_mgmt/metadata.rb': "name 'gecos_ws_mgmt'\ndepends 'apt'\ndepends \"sssd\"\n",
+    'gecos_ws_mgmt/recipes/local.rb': "include_recipe 'apt'\n",
+    'gecos_ws_mgmt/templates/default/ntpdate.erb': 'NTPSERVERS="<%= @server %>"\n',
+    'gecos_ws_mgmt/spec/local_spec.rb': "describe 'local' do\nend\n",
+    'apt/metadata.json': json.dumps({'name': 'apt', 'dependencies': {}}),
+    'apt/recipes/default.rb': "execute 'apt-get update'\n",
+    # Named after its metadata, not its directory.
+    'sssd-cookbook/metadata.rb': "name 'sssd'\ndepends 'apt'\n",
+    'sssd-cookbook/recipes/default.rb': "package 'sssd'\n",
+    'unused/metadata.rb': "name 'unused'\n",
+    'unused/recipes/default.rb': "log 'unused'\n",
+}
+
+
+class TestCookbookBundle(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cookbooks = os.path.join(self.tmpdir, 'cookbooks')
+        for relpath, content in COOKBOOKS.items():
+            self.write(os.path.join(self.cookbooks, relpath), content)
+        self.cache = os.path.join(self.tmpdir, 'bundles')
+        self.bundle = CookbookBundle(self.cookbooks, self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, content):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fp = open(path, 'w')
+        fp.write(content)
+        fp.close()
+
+    def test_closure(self):
+        self.assertEqual(['apt', 'gecos_ws_mgmt', 'sssd'],
+                         self.bundle.get_closure(['recipe[gecos_ws_mgmt::local]']))
+        self.assertEqual(['apt', 'sssd'], self.bundle.get_closure(['sssd', 'recipe[apt]']))
+        self.assertRaises(ValueError, self.bundle.get_closure, ['recipe[missing::default]'])
+
+    def test_bundle(self):
+        path = self.bundle.get_bundle(['recipe[gecos_ws_mgmt::local]'])
+        self.assertTrue(os.path.isfile(os.path.join(path, 'gecos_ws_mgmt', 'recipes', 'local.rb')))
+        self.assertTrue(os.path.isfile(os.path.join(path, 'gecos_ws_mgmt', 'templates',
+                                                    'default', 'ntpdate.erb')))
+        self.assertTrue(os.path.isfile(os.path.join(path, 'sssd', 'metadata.rb')))
+        self.assertTrue(os.path.isfile(os.path.join(path, 'apt', 'metadata.json')))
+        # Only what chef-solo loads, of the cookbooks needed.
+        self.assertFalse(os.path.exists(os.path.join(path, 'gecos_ws_mgmt', 'spec')))
+        self.assertFalse(os.path.exists(os.path.join(path, 'unused')))
+
+        self.assertEqual(path, self.bundle.get_bundle(['recipe[gecos_ws_mgmt::local]']))
+        # An updated cookbook is staged again.
+        self.write(os.path.join(self.cookbooks, 'apt/recipes/default.rb'), "log 'updated'\n")
+        self.assertNotEqual(path, self.bundle.get_bundle(['recipe[gecos_ws_mgmt::local]']))
+
+    def test_prune(self):
+        self.bundle.KEEP = 2
+        paths = []
+        for (i, run_list) in enumerate([['apt'], ['sssd'], ['unused']]):
+            paths.append(os.path.dirname(self.bundle.get_bundle(run_list)))
+            os.utime(paths[-1], (1000 + i, 1000 + i))
+        self.assertEqual([False, True, True], [os.path.isdir(path) for path in paths])
+
+        # The bundles in use are kept.
+        self.bundle.get_bundle(['sssd'])
+        self.bundle.get_bundle(['recipe[gecos_ws_mgmt::local]'])
+        self.assertTrue(os.path.isdir(paths[1]))
+        self.assertFalse(os.path.isdir(paths[2]))
+
+    def test_solo_rb(self):
+        solo_rb = os.path.join(self.tmpdir, 'solo.rb')
+        self.write(solo_rb, 'file_cache_path "/var/chef"\ncookbook_path "/usr/share/cookbooks"\n')
+        self.assertEqual('file_cache_path "/var/chef"\ncookbook_path "/tmp/bundle"\n',
+                         self.bundle.get_solo_rb(solo_rb, '/tmp/bundle'))
+
+        self.write(solo_rb, 'file_cache_path "/var/chef"\n')
+        self.assertEqual('cookbook_path "/tmp/bundle"\nfile_cache_path "/var/chef"\n',
+                         self.bundle.get_solo_rb(solo_rb, '/tmp/bundle'))
+
+        self.assertEqual('cookbook_path "/tmp/bundle"\n',
+                         self.bundle.get_solo_rb(os.path.join(self.tmpdir, 'missing.rb'),
+                                                 '/tmp/bundle'))
+
+if __name__ == '__main__':
+    unittest.main()
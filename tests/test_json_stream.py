@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import json
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.JSONStream import iter_json_array
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestJSONStream(unittest.TestCase):
+    def assertStreamed(self, expected, data, key=None, members=None):
+        for size in range(1, len(data) + 1):
+            found = {}
+            items = list(iter_json_array(chunked(data, size), key, found))
+            self.assertEqual(expected, items, 'chunk size %d' % size)
+            self.assertEqual(members or {}, found, 'chunk size %d' % size)
+
+    def test_chunk_boundaries(self):
+        self.assertStreamed([1, 3.5], '[1, 3.5]')
+        self.assertStreamed([-12, 1e-3, True, None, u'a,]'], '[-12,1e-3, true ,null,"a,]"]')
+        self.assertStreamed([{u'name': u'\xf1u'}], '[{"name": "\xc3\xb1u"}]')
+
+    def test_paged_object(self):
+        nodes = [{'name': 'ws-%d' % i} for i in range(3)]
+        data = json.dumps({'pages': 2.5, 'nodes': nodes, 'page': 1})
+        self.assertStreamed(nodes, data, 'nodes', {'pages': 2.5, 'page': 1})
+
+    def test_not_streamed(self):
+        self.assertStreamed([{u'nodes': [1]}], '{"nodes": [1]}')
+        self.assertStreamed([12.5], '12.5')
+
+    def test_incomplete(self):
+        self.assertRaises(ValueError, list, iter_json_array(['[1, 3.']))
+        self.assertRaises(ValueError, list, iter_json_array(['{"nodes": [1', ']'], 'nodes'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.NodeIndex import NodeIndex
+
+
+class TestNodeIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_per_user(self):
+        uri = 'http://gcc.example/'
+        NodeIndex(uri, self.tmpdir, username='admin').update_nodes(
+            [{'name': 'ws-1', 'node_chef_id': '1'}])
+        self.assertTrue(NodeIndex(uri, self.tmpdir, username='admin').has_nodes())
+        self.assertFalse(NodeIndex(uri, self.tmpdir, username='other').has_nodes())
+
+    def test_search_ous(self):
+        index = NodeIndex('http://gcc.example/', self.tmpdir, username='admin')
+        index.update_ous([['3', 'Sales'], ['1', 'admin-ou'], ['2', 'Accounting']])
+        self.assertEqual([['2', 'Accounting'], ['1', 'admin-ou'], ['3', 'Sales']],
+                         index.search_ous('a'))
+        self.assertEqual([['3', 'Sales']], index.search_ous('s'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import json
+import shutil
+import stat
+import tempfile
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.RunWorkspace import RunWorkspace
+
+
+class TestRunWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.missing = os.path.join(self.tmpdir, 'missing')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        fp = open(path, 'rb')
+        content = fp.read()
+        fp.close()
+        return content
+
+    def test_base_dir(self):
+        workspace = RunWorkspace([self.missing, self.tmpdir])
+        path = workspace.get_path()
+        self.assertEqual(self.tmpdir, os.path.dirname(path))
+        self.assertEqual(0700, stat.S_IMODE(os.stat(path).st_mode))
+        self.assertEqual(path, workspace.get_path())
+        workspace.cleanup()
+        self.assertRaises(IOError, RunWorkspace([self.missing]).get_path)
+
+    def test_write(self):
+        workspace = RunWorkspace([self.tmpdir])
+        path = workspace.write('secret', '.pem')
+        self.assertTrue(path.endswith('.pem'))
+        self.assertEqual('secret', self.read(path))
+        self.assertEqual(path, workspace.write('secret', '.pem'))
+        self.assertNotEqual(path, workspace.write('secret', '.key'))
+        self.assertNotEqual(path, workspace.write('other', '.pem'))
+        # Written aside and renamed, no temporary file is left.
+        self.assertEqual([], [name for name in os.listdir(workspace.get_path())
+                              if name.startswith('.')])
+        workspace.cleanup()
+
+    def test_write_json(self):
+        workspace = RunWorkspace([self.tmpdir])
+        path = workspace.write_json({'run_list': ['recipe[gecos_ws_mgmt::local]']})
+        self.assertTrue(path.endswith('.json'))
+        self.assertEqual({'run_list': ['recipe[gecos_ws_mgmt::local]']},
+                         json.loads(self.read(path)))
+        workspace.cleanup()
+
+    def test_write_base64(self):
+        workspace = RunWorkspace([self.tmpdir])
+        path = workspace.write_base64('secret'.encode('base64'), '.pem')
+        self.assertEqual('secret', self.read(path))
+        # Written again if it was removed meanwhile.
+        os.remove(path)
+        self.assertEqual(path, workspace.write_base64('secret'.encode('base64'), '.pem'))
+        self.assertTrue(os.path.exists(path))
+        workspace.cleanup()
+
+    def test_cleanup(self):
+        with RunWorkspace([self.tmpdir]) as workspace:
+            path = workspace.get_path()
+            workspace.write('secret')
+        self.assertFalse(os.path.exists(path))
+
+        try:
+            with RunWorkspace([self.tmpdir]) as workspace:
+                path = workspace.get_path()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(os.path.exists(path))
+
+        # A new directory is created once cleaned up.
+        self.assertTrue(os.path.exists(workspace.write('secret')))
+        workspace.cleanup()
+        self.assertEqual([], os.listdir(self.tmpdir))
+
+if __name__ == '__main__':
+    unittest.main()
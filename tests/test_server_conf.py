@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ServerConf import ServerConf
+from firstboot.serverconf.GCCConf import GCCConf
+
+
+class TestServerConfSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.conf = ServerConf()
+        self.conf.set_organization('Junta')
+        self.conf.get_gcc_conf().set_uri_gcc('http://gcc/')
+        self.conf.get_chef_conf().set_url('https://chef/')
+        self.conf.save_snapshot(ServerConf.AUTOCONF)
+
+    def test_restore_sections(self):
+        self.conf.get_gcc_conf().set_uri_gcc('http://other/')
+        self.conf.get_gcc_conf().set_gcc_username('admin')
+        self.conf.get_chef_conf().set_url('https://other/')
+        self.conf.restore_snapshot(ServerConf.AUTOCONF, ['gcc'])
+        self.assertEqual('http://gcc/', self.conf.get_gcc_conf().get_uri_gcc())
+        self.assertEqual('', self.conf.get_gcc_conf().get_gcc_username())
+        # The sections not given are left alone.
+        self.assertEqual('https://other/', self.conf.get_chef_conf().get_url())
+
+        self.conf.restore_snapshot(ServerConf.DEFAULTS, ['chef', ServerConf.SERVER])
+        self.assertEqual('', self.conf.get_chef_conf().get_url())
+        self.assertEqual('', self.conf.get_organization())
+        self.assertEqual('http://gcc/', self.conf.get_gcc_conf().get_uri_gcc())
+
+    def test_restore_records_changes(self):
+        journal = self.conf.get_journal()
+        gcc_conf = self.conf.get_gcc_conf()
+        gcc_conf.set_uri_gcc('http://other/')
+        version = journal.get_version()
+        self.conf.restore_snapshot(ServerConf.AUTOCONF)
+        # Only the field that differs is set, in the same record.
+        self.assertEqual([('gcc', 'uri_gcc', 'http://other/', 'http://gcc/')],
+                         [(e['section'], e['field'], e['old'], e['new'])
+                          for e in journal.get_changes(since=version)])
+        self.assertTrue(self.conf.get_gcc_conf() is gcc_conf)
+
+    def test_restore_replaced_section(self):
+        self.conf.set_gcc_conf(GCCConf().set_uri_gcc('http://other/'))
+        self.conf.restore_snapshot(ServerConf.AUTOCONF, ['gcc'])
+        self.assertEqual('http://gcc/', self.conf.get_gcc_conf().get_uri_gcc())
+        # Still attached to the journal.
+        version = self.conf.get_journal().get_version('gcc')
+        self.conf.get_gcc_conf().set_uri_gcc('http://new/')
+        self.assertEqual(version + 1, self.conf.get_journal().get_version('gcc'))
+
+    def test_shared_states(self):
+        self.conf.get_ntp_conf().set_uri_ntp('ntp.example.org')
+        self.conf.save_snapshot('edited')
+        autoconf = self.conf._snapshots[ServerConf.AUTOCONF]
+        edited = self.conf._snapshots['edited']
+        # The sections that didn't change share their state.
+        self.assertTrue(autoconf['gcc'] is edited['gcc'])
+        self.assertFalse(autoconf['ntp'] is edited['ntp'])
+
+        self.conf.get_ntp_conf().set_uri_ntp('')
+        self.conf.restore_snapshot('edited', ['ntp'])
+        self.assertEqual('ntp.example.org', self.conf.get_ntp_conf().get_uri_ntp())
+
+    def test_snapshots_of_copy(self):
+        copy = self.conf.copy()
+        self.assertTrue(copy.has_snapshot(ServerConf.AUTOCONF))
+        copy.get_gcc_conf().set_uri_gcc('http://other/')
+        copy.restore_snapshot(ServerConf.AUTOCONF, ['gcc'])
+        self.assertEqual('http://gcc/', copy.get_gcc_conf().get_uri_gcc())
+        # A snapshot of the copy is not one of the original.
+        copy.save_snapshot('copy')
+        self.assertFalse(self.conf.has_snapshot('copy'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import threading
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.ServerConfSession import ServerConfSession
+
+
+class TestServerConfSession(unittest.TestCase):
+    def test_independent_sessions(self):
+        with ServerConfSession() as session:
+            self.assertTrue(ServerConfSession.current() is session)
+            session.get_server_conf().get_ntp_conf().set_uri_ntp('ntp.example.org')
+            with ServerConfSession() as other:
+                self.assertEqual('', other.get_server_conf().get_ntp_conf().get_uri_ntp())
+            self.assertTrue(ServerConfSession.current() is session)
+        self.assertTrue(ServerConfSession.current() is ServerConfSession.get_default())
+
+    def test_session_per_thread(self):
+        sessions = []
+        with ServerConfSession():
+            thread = threading.Thread(target=lambda: sessions.append(ServerConfSession.current()))
+            thread.start()
+            thread.join()
+        self.assertTrue(sessions[0] is ServerConfSession.get_default())
+
+    def test_run_in_session(self):
+        sessions = []
+        with ServerConfSession() as session:
+            thread = threading.Thread(target=session.run,
+                args=(lambda: sessions.append(ServerConfSession.current()),))
+            thread.start()
+            thread.join()
+        self.assertTrue(sessions[0] is session)
+
+    def test_copy(self):
+        session = ServerConfSession()
+        server_conf = session.get_server_conf()
+        server_conf.get_gcc_conf().set_uri_gcc('http://gcc/')
+        (copy, version) = session.copy()
+        server_conf.get_gcc_conf().set_uri_gcc('http://other/')
+        self.assertEqual('http://gcc/', copy.get_gcc_conf().get_uri_gcc())
+        self.assertEqual(server_conf.get_journal().get_version() - 1, version)
+        # Editing the copy doesn't touch the session.
+        copy.get_gcc_conf().set_gcc_username('admin')
+        self.assertEqual('', server_conf.get_gcc_conf().get_gcc_username())
+        self.assertFalse(server_conf.get_journal().get_changes(since=version + 1))
+
+    def test_reset(self):
+        session = ServerConfSession()
+        server_conf = session.get_server_conf()
+        session.reset()
+        self.assertFalse(session.get_server_conf() is server_conf)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot.serverconf.SoloJSONValidator import SoloJSONValidator
+
+# As in the resources directory of the gecos_ws_mgmt cookbook.
+RESOURCES = {
+    'gcc.rb': """actions :setup
+default_action :setup
+
+attribute :gcc_link, :kind_of => [TrueClass, FalseClass]
+attribute :gcc_nodename, :kind_of => String
+attribute :gcc_username, :kind_of => String
+attribute :uri_gcc, :kind_of => String
+attribute :job_ids, :kind_of => Array
+""",
+    'chef.rb': """actions :setup
+attribute :chef_server_url, :kind_of => String, :name_attribute => true
+attribute :chef_node_name, :kind_of => String
+attribute :chef_link, :kind_of => [ TrueClass, FalseClass ]
+attribute :chef_validation_pem, :kind_of => String
+""",
+    'tz_date.rb': """actions :setup
+attribute :server, :kind_of => String
+attribute :retries, :kind_of => Integer
+attribute :extra, :kind_of => Custom
+attribute :support_os
+""",
+}
+
+
+def solo(section, resource, res):
+    return {'run_list': ['recipe[gecos_ws_mgmt::local]'],
+            'gecos_ws_mgmt': {section: {resource: res}}}
+
+
+class TestSoloJSONValidator(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name, content in RESOURCES.items():
+            fp = open(os.path.join(self.tmpdir, name), 'w')
+            fp.write(content)
+            fp.close()
+        self.validator = SoloJSONValidator(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_definition(self):
+        definition = self.validator.get_definition('gcc_res')
+        self.assertEqual(((bool, bool), False), definition['gcc_link'])
+        self.assertEqual(((basestring,), False), definition['gcc_nodename'])
+        self.assertEqual(((list,), False), definition['job_ids'])
+        # chef_conf_res is defined in chef.rb
+        definition = self.validator.get_definition('chef_conf_res')
+        self.assertEqual(((basestring,), True), definition['chef_server_url'])
+        self.assertEqual(((bool, bool), False), definition['chef_link'])
+        # Unknown or missing types are not checked.
+        definition = self.validator.get_definition('tz_date_res')
+        self.assertEqual(((int, long), False), definition['retries'])
+        self.assertEqual((None, False), definition['extra'])
+        self.assertEqual((None, False), definition['support_os'])
+        self.assertEqual(None, self.validator.get_definition('sssd_res'))
+
+    def test_types(self):
+        errors = self.validator.validate(solo('misc_mgmt', 'gcc_res',
+            {'gcc_link': 0, 'uri_gcc': u'http://gcc/', 'job_ids': []}))
+        self.assertEqual(['misc_mgmt.gcc_res.gcc_link: 0 is not a boolean'], errors)
+        errors = self.validator.validate(solo('misc_mgmt', 'tz_date_res',
+            {'server': 'ntp.example', 'retries': '3', 'extra': object()}))
+        self.assertEqual(["misc_mgmt.tz_date_res.retries: '3' is not a integer"], errors)
+
+    def test_required(self):
+        errors = self.validator.validate(solo('misc_mgmt', 'chef_conf_res',
+            {'chef_server_url': '', 'chef_link': True, 'chef_node_name': ' '}))
+        self.assertEqual(['misc_mgmt.chef_conf_res.chef_server_url: is required',
+                          'misc_mgmt.chef_conf_res.chef_node_name: is required',
+                          'misc_mgmt.chef_conf_res.chef_validation_pem: is required'], errors)
+
+    def test_files(self):
+        res = {'chef_server_url': 'https://chef/', 'chef_link': True,
+               'chef_node_name': 'ws-1', 'chef_validation_pem': os.path.join(self.tmpdir, 'missing.pem')}
+        errors = self.validator.validate(solo('misc_mgmt', 'chef_conf_res', res))
+        self.assertEqual(1, len(errors))
+        self.assertEqual([], self.validator.validate(solo('misc_mgmt', 'chef_conf_res', res),
+                                                     check_files=False))
+        res['chef_validation_pem'] = 'file://' + os.path.join(self.tmpdir, 'gcc.rb')
+        self.assertEqual([], self.validator.validate(solo('misc_mgmt', 'chef_conf_res', res)))
+
+    def test_document(self):
+        self.assertEqual(['run_list: must be a non empty list of recipes',
+                          'gecos_ws_mgmt: missing'], self.validator.validate({'run_list': []}))
+        errors = self.validator.validate({'run_list': ['recipe[gecos_ws_mgmt::local]'],
+                                          'gecos_ws_mgmt': {'misc_mgmt': {'gcc_res': []},
+                                                            'network_mgmt': None}})
+        self.assertEqual(['misc_mgmt.gcc_res: must be an object',
+                          'network_mgmt: must be an object'], errors)
+
+    def test_users(self):
+        errors = self.validator.validate(solo('misc_mgmt', 'local_users_res', {'users_list': [
+            {'user': 'ana', 'groups': ['sudo'], 'actiontorun': 'create'},
+            {'user': '', 'groups': 'sudo', 'actiontorun': 'purge'},
+            'bob']}))
+        self.assertEqual([
+            'misc_mgmt.local_users_res.users_list[1].user: is required',
+            'misc_mgmt.local_users_res.users_list[1].groups: must be a list of group names',
+            "misc_mgmt.local_users_res.users_list[1].actiontorun: 'purge' is not one of create, modify, delete",
+            'misc_mgmt.local_users_res.users_list[2]: must be an object'], errors)
+
+    def test_sssd(self):
+        res = {'enabled': True, 'domain': {'type': 'ad', 'name': 'example.com', 'ad_user': 'admin'}}
+        errors = self.validator.validate(solo('network_mgmt', 'sssd_res', res))
+        self.assertEqual(['network_mgmt.sssd_res.domain.ad_passwd: is required'], errors)
+        res['enabled'] = False
+        self.assertEqual([], self.validator.validate(solo('network_mgmt', 'sssd_res', res)))
+        del res['domain']
+        self.assertEqual(['network_mgmt.sssd_res.domain: is required'],
+                         self.validator.validate(solo('network_mgmt', 'sssd_res', res)))
+
+if __name__ == '__main__':
+    unittest.main()
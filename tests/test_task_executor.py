@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# This file is in the public domain
+### END LICENSE
+
+import sys
+import os.path
+import threading
+import time
+import unittest
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from firstboot_lib import TaskExecutor
+
+
+class MainLoop():
+    # Stands for GLib: the idle callbacks are run by dispatch().
+
+    def __init__(self):
+        self.pending = []
+
+    def idle_add(self, func, *args):
+        self.pending.append((func, args))
+
+    def dispatch(self):
+        (pending, self.pending) = (self.pending, [])
+        for func, args in pending:
+            func(*args)
+
+
+class TestTaskExecutor(unittest.TestCase):
+    def setUp(self):
+        self.glib = TaskExecutor.GLib
+        self.loop = MainLoop()
+        TaskExecutor.GLib = self.loop
+        self.executor = TaskExecutor.TaskExecutor(max_workers=1)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+        TaskExecutor.GLib = self.glib
+
+    def block(self, value=None):
+        self.started.set()
+        self.release.wait()
+        return value
+
+    def test_result(self):
+        task = self.executor.submit(lambda a, b=0: a + b, 1, b=2)
+        self.assertEqual(3, task.result(5))
+        self.assertEqual(None, task.exception())
+        task = self.executor.submit(lambda: 1 / 0)
+        self.assertRaises(ZeroDivisionError, task.result, 5)
+        self.assertTrue(isinstance(task.exception(), ZeroDivisionError))
+
+    def test_cancel_pending(self):
+        calls = []
+        first = self.executor.submit(self.block)
+        second = self.executor.submit(calls.append, 'second')
+        self.assertTrue(second.cancel())
+        self.assertTrue(second.done())
+        self.assertRaises(TaskExecutor.TaskCancelledException, second.result)
+        self.release.set()
+        first.result(5)
+        self.assertEqual('third', self.executor.submit(lambda: 'third').result(5))
+        self.assertEqual([], calls)
+
+    def test_cancel_running(self):
+        calls = []
+        task = self.executor.submit(self.block, 'value')
+        task.add_done_callback(lambda task: calls.append(task))
+        self.started.wait(5)
+        self.assertTrue(task.running())
+        self.assertTrue(task.cancel())
+        # It's done once the function returns.
+        self.assertFalse(task.done())
+        self.release.set()
+        self.assertRaises(TaskExecutor.TaskCancelledException, task.result, 5)
+        self.assertTrue(task.done())
+        self.loop.dispatch()
+        self.assertEqual([], calls)
+
+    def test_cancel_finished(self):
+        task = self.executor.submit(lambda: 'value')
+        task.result(5)
+        self.assertFalse(task.cancel())
+        self.assertEqual('value', task.result())
+
+    def test_callbacks(self):
+        calls = []
+        task = self.executor.submit(self.block, 'value')
+        task.add_done_callback(lambda task, name: calls.append((name, task.result())), 'before')
+        self.release.set()
+        task.result(5)
+        # Only called from the main loop.
+        self.assertEqual([], calls)
+        task.add_done_callback(lambda task, name: calls.append((name, task.result())), 'after')
+        self.loop.dispatch()
+        self.assertEqual([('after', 'value'), ('before', 'value')], sorted(calls))
+
+    def test_failing_callback(self):
+        calls = []
+        task = self.executor.submit(lambda: 'value')
+        task.add_done_callback(lambda task: 1 / 0)
+        task.add_done_callback(lambda task: calls.append(task))
+        task.result(5)
+        self.loop.dispatch()
+        self.assertEqual([task], calls)
+
+    def test_idle_worker(self):
+        executor = TaskExecutor.TaskExecutor(max_workers=2)
+        executor.submit(lambda: None).result(5)
+        for i in range(50):
+            if executor._idle == 1:
+                break
+            time.sleep(0.01)
+        # The idle worker takes it, no new thread is started.
+        executor.submit(lambda: None).result(5)
+        self.assertEqual(1, len(executor._workers))
+        executor.shutdown()
+
+    def test_spawn(self):
+        # It runs even with every worker busy.
+        self.executor.submit(self.block)
+        self.started.wait(5)
+        task = TaskExecutor.spawn(lambda: threading.current_thread().name)
+        self.assertNotEqual(threading.current_thread().name, task.result(5))
+
+    def test_run_in_main_loop(self):
+        self.assertEqual(2, TaskExecutor.run_in_main_loop(lambda a: a * 2, 1))
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            TaskExecutor.run_in_main_loop(lambda a: a * 2, 2)))
+        thread.start()
+        for i in range(50):
+            if self.loop.pending:
+                break
+            time.sleep(0.01)
+        self.loop.dispatch()
+        thread.join(5)
+        self.assertEqual([4], results)
+
+if __name__ == '__main__':
+    unittest.main()